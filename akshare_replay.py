@@ -0,0 +1,135 @@
+import datetime
+import functools
+import glob
+import hashlib
+import json
+import os
+import threading
+
+from env_config import get_env_str
+from instrumentation import count
+from lazy_import import lazy_module
+
+# ================= 配置区域 =================
+AKSHARE_REPLAY_MODE = get_env_str("AKSHARE_REPLAY_MODE", "off").lower()  # off / record / replay
+AKSHARE_FIXTURE_DIR = get_env_str("AKSHARE_FIXTURE_DIR", "fixtures/akshare")
+REPLAY_MODES = ("off", "record", "replay")
+
+pd = lazy_module("pandas")
+
+_write_lock = threading.Lock()
+
+
+class FixtureMissingError(LookupError):
+    """回放模式下找不到对应的录制数据 (回放模式从不访问网络)"""
+
+
+# ================= 录制文件 =================
+def fixture_key(func_name, args, kwargs):
+    """函数名 + 参数的规范化 JSON 作为键，返回 (摘要, 调用描述)"""
+    call = {'func': func_name, 'args': list(args), 'kwargs': dict(sorted(kwargs.items()))}
+    canonical = json.dumps(call, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16], call
+
+
+def fixture_paths(fixture_dir, func_name, digest):
+    base = os.path.join(fixture_dir, func_name, digest)
+    return f"{base}.pkl.gz", f"{base}.json"
+
+
+def save_fixture(fixture_dir, func_name, args, kwargs, result):
+    digest, call = fixture_key(func_name, args, kwargs)
+    data_path, meta_path = fixture_paths(fixture_dir, func_name, digest)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+    call['recorded_at'] = datetime.datetime.now().astimezone().isoformat()
+    with _write_lock:
+        pd.to_pickle(result, f"{data_path}.tmp", compression="gzip")
+        os.replace(f"{data_path}.tmp", data_path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(call, f, ensure_ascii=False, indent=2, default=str)
+    return data_path
+
+
+def _without_dates(kwargs):
+    return {key: value for key, value in kwargs.items() if "date" not in key}
+
+
+def find_fixture(fixture_dir, func_name, args, kwargs):
+    """
+    先按完整参数精确匹配；找不到时退回到除日期参数 (start_date/end_date 等) 外都相同的最近一次录制，
+    这样按“今天”计算结束日期的请求在录制之后的日子里也能回放。
+    """
+    digest, call = fixture_key(func_name, args, kwargs)
+    data_path, _ = fixture_paths(fixture_dir, func_name, digest)
+    if os.path.exists(data_path):
+        return data_path
+
+    wanted_args = json.loads(json.dumps(call['args'], default=str))
+    wanted_kwargs = json.loads(json.dumps(_without_dates(call['kwargs']), ensure_ascii=False, default=str))
+    candidates = []
+    for meta_path in glob.glob(os.path.join(fixture_dir, func_name, "*.json")):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta['args'] == wanted_args and _without_dates(meta['kwargs']) == wanted_kwargs:
+            candidates.append((meta.get('recorded_at', ""), meta_path[:-len(".json")] + ".pkl.gz"))
+    candidates = [item for item in candidates if os.path.exists(item[1])]
+    return max(candidates)[1] if candidates else None
+
+
+# ================= akshare 代理 =================
+class ReplayableAkshare:
+    """
+    akshare 的代理：off 模式直接透传；record 模式调用真实接口并把返回值写成压缩录制文件；
+    replay 模式只读录制文件，不导入 akshare 也不访问网络。
+    """
+
+    def __init__(self, mode=None, fixture_dir=None):
+        mode = AKSHARE_REPLAY_MODE if mode is None else mode
+        if mode not in REPLAY_MODES:
+            print(f"Invalid AKSHARE_REPLAY_MODE: {mode}. Using default off.")
+            mode = "off"
+        self.__dict__['_mode'] = mode
+        self.__dict__['_fixture_dir'] = AKSHARE_FIXTURE_DIR if fixture_dir is None else fixture_dir
+        self.__dict__['_module'] = lazy_module("akshare")
+
+    def configure(self, mode=None, fixture_dir=None):
+        if mode is not None:
+            self.__dict__['_mode'] = mode
+        if fixture_dir is not None:
+            self.__dict__['_fixture_dir'] = fixture_dir
+
+    @property
+    def mode(self):
+        return self.__dict__['_mode']
+
+    def _record(self, name, func, *args, **kwargs):
+        result = func(*args, **kwargs)
+        save_fixture(self.__dict__['_fixture_dir'], name, args, kwargs, result)
+        count("akshare_recorded")
+        return result
+
+    def _replay(self, name, *args, **kwargs):
+        path = find_fixture(self.__dict__['_fixture_dir'], name, args, kwargs)
+        if path is None:
+            count("akshare_replay_misses")
+            raise FixtureMissingError(f"没有录制数据: {name}(args={args}, kwargs={kwargs})")
+        count("akshare_replay_hits")
+        return pd.read_pickle(path, compression="gzip")
+
+    def __getattr__(self, name):
+        mode = self.__dict__['_mode']
+        if mode == "replay":
+            return functools.partial(self._replay, name)
+        attr = getattr(self.__dict__['_module'], name)
+        if mode == "record" and callable(attr):
+            return functools.partial(self._record, name, attr)
+        return attr
+
+    def __setattr__(self, attr, value):
+        setattr(self.__dict__['_module'], attr, value)
+
+    def __repr__(self):
+        return f"<akshare proxy (mode={self.__dict__['_mode']}, fixtures={self.__dict__['_fixture_dir']})>"
+
+
+ak = ReplayableAkshare()
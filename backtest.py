@@ -0,0 +1,232 @@
+import numpy as np
+import pandas as pd
+
+import monitor
+from env_config import get_env_float, get_env_str
+from history_cache import load_history, records_to_frame
+from indicators import macd_batch
+from signals import DEATH_CROSS, GOLD_CROSS, macd_crosses, rolling_mean
+from strategy_engine import ACTION_BUY, ACTION_HOLD, ACTION_NAMES, ACTION_SELL
+
+# ================= 配置区域 =================
+BACKTEST_CODE = get_env_str("BACKTEST_CODE", monitor.ETF_CODE)
+BACKTEST_STRATEGIES = get_env_str("BACKTEST_STRATEGIES", "ma250_take_profit,macd_cross,ma250_macd")
+BACKTEST_FEE_RATE = get_env_float("BACKTEST_FEE_RATE", 0.0001)  # 佣金费率 (按成交额)
+BACKTEST_MIN_FEE = get_env_float("BACKTEST_MIN_FEE", 0.0)  # 单笔最低佣金
+BACKTEST_SLIPPAGE = get_env_float("BACKTEST_SLIPPAGE", 0.001)  # 滑点 (买入价上浮 / 卖出价下浮的比例)
+BACKTEST_OUTPUT = get_env_str("BACKTEST_OUTPUT", "")
+
+
+# ================= 策略 =================
+# 每个策略是 (bar, account, params) -> 动作 的函数；bar 为当日收盘价 / 均线 / MACD 交叉，
+# account 为该策略自己的账户。策略只做决定，成交、费用和统计统一由 run_backtest 处理。
+def ma250_take_profit(bar, account, params):
+    """与 calculate_ma250_strategy 同规则：空仓且跌破均线时满仓买入，收益率达到目标时清仓"""
+    if account['shares'] == 0:
+        return ACTION_BUY if bar['price'] < bar['ma'] else ACTION_HOLD
+    if bar['price'] / account['avg_cost'] - 1 >= params['sell_target']:
+        return ACTION_SELL
+    return ACTION_HOLD
+
+
+def macd_cross(bar, account, params):
+    """按推送口径交易 MACD 交叉：死叉买入，金叉卖出"""
+    if bar['cross'] == DEATH_CROSS and account['shares'] == 0:
+        return ACTION_BUY
+    if bar['cross'] == GOLD_CROSS and account['shares'] > 0:
+        return ACTION_SELL
+    return ACTION_HOLD
+
+
+def ma250_macd(bar, account, params):
+    """组合：均线下方出现死叉才买入，达到止盈目标或出现金叉时卖出"""
+    if account['shares'] == 0:
+        return ACTION_BUY if bar['cross'] == DEATH_CROSS and bar['price'] < bar['ma'] else ACTION_HOLD
+    if bar['cross'] == GOLD_CROSS or bar['price'] / account['avg_cost'] - 1 >= params['sell_target']:
+        return ACTION_SELL
+    return ACTION_HOLD
+
+
+STRATEGIES = {
+    'ma250_take_profit': ma250_take_profit,
+    'macd_cross': macd_cross,
+    'ma250_macd': ma250_macd,
+}
+
+
+# ================= 成交与账户 =================
+def commission(value, fee_rate, min_fee):
+    return max(value * fee_rate, min_fee) if value > 0 else 0.0
+
+
+def buy_fill(cash, price, lot_size, fee_rate, min_fee, slippage):
+    """满仓买入：按滑点后的价格、整手数量成交，保证成交额加佣金不超过现金；返回 (股数, 成交价, 佣金)"""
+    fill = price * (1 + slippage)
+    shares = int(cash / (fill * (1 + fee_rate)) / lot_size) * lot_size
+    while shares > 0 and shares * fill + commission(shares * fill, fee_rate, min_fee) > cash:
+        shares -= lot_size
+    return shares, fill, commission(shares * fill, fee_rate, min_fee)
+
+
+def new_account(initial_capital):
+    return {
+        'cash': float(initial_capital),
+        'shares': 0,
+        'avg_cost': 0.0,
+        'cost_basis': 0.0,  # 含佣金的买入总成本，用于统计每笔交易盈亏
+        'equity': float(initial_capital),
+        'peak': float(initial_capital),
+        'max_drawdown': 0.0,
+        'trades': 0,
+        'wins': 0,
+        'fees': 0.0,
+    }
+
+
+def execute(account, action, price, params, fee_rate, min_fee, slippage):
+    """执行策略给出的动作；返回成交记录 (shares, fill, fee)，未成交时返回 None"""
+    if action == ACTION_BUY and account['shares'] == 0:
+        shares, fill, fee = buy_fill(account['cash'], price, params['lot_size'], fee_rate, min_fee, slippage)
+        if shares == 0:
+            return None
+        account['cash'] -= shares * fill + fee
+        account['shares'] = shares
+        account['avg_cost'] = fill
+        account['cost_basis'] = shares * fill + fee
+        account['fees'] += fee
+        return shares, fill, fee
+    if action == ACTION_SELL and account['shares'] > 0:
+        shares = account['shares']
+        fill = price * (1 - slippage)
+        fee = commission(shares * fill, fee_rate, min_fee)
+        proceeds = shares * fill - fee
+        account['cash'] += proceeds
+        account['trades'] += 1
+        account['wins'] += proceeds > account['cost_basis']
+        account['fees'] += fee
+        account['shares'] = 0
+        account['avg_cost'] = 0.0
+        account['cost_basis'] = 0.0
+        return shares, fill, fee
+    return None
+
+
+def mark_to_market(account, price):
+    """按收盘价更新净值，峰值和最大回撤随之增量更新，不需要事后再遍历净值曲线"""
+    equity = account['cash'] + account['shares'] * price
+    account['equity'] = equity
+    if equity > account['peak']:
+        account['peak'] = equity
+    elif account['peak'] > 0:
+        account['max_drawdown'] = max(account['max_drawdown'], 1.0 - equity / account['peak'])
+    return equity
+
+
+# ================= 回测 =================
+def prepare_bars(close, params):
+    """指标只算一次，所有策略共用"""
+    dif, dea, _ = macd_batch(close, params['fast'], params['slow'], params['signal'])
+    return {
+        'price': close,
+        'ma': rolling_mean(close, params['ma_period']),
+        'cross': macd_crosses(dif, dea),
+    }
+
+
+def run_backtest(close, params, strategies=None, fee_rate=None, min_fee=None, slippage=None):
+    """
+    对同一段收盘价逐日推进一次，每天依次让各策略决策、成交并更新净值 / 回撤。
+    增加策略只增加每天的一次函数调用，不增加对数据的遍历。
+    返回 {策略名: {'account': 期末账户, 'equity': 净值数组, 'trades': 成交列表}}。
+    """
+    strategies = STRATEGIES if strategies is None else strategies
+    fee_rate = BACKTEST_FEE_RATE if fee_rate is None else fee_rate
+    min_fee = BACKTEST_MIN_FEE if min_fee is None else min_fee
+    slippage = BACKTEST_SLIPPAGE if slippage is None else slippage
+
+    close = np.asarray(close, dtype=np.float64)
+    columns = prepare_bars(close, params)
+    # 逐日循环里按 Python 列表读取，避免逐元素构造 NumPy 标量
+    prices, mas, crosses = columns['price'].tolist(), columns['ma'].tolist(), columns['cross'].tolist()
+    runs = {
+        name: {'decide': decide, 'account': new_account(params['initial_capital']),
+               'equity': np.empty(len(close)), 'trades': []}
+        for name, decide in strategies.items()
+    }
+
+    for i, price in enumerate(prices):
+        bar = {'price': price, 'ma': mas[i], 'cross': crosses[i]}
+        for run in runs.values():
+            account = run['account']
+            action = run['decide'](bar, account, params)
+            if action != ACTION_HOLD:
+                fill = execute(account, action, price, params, fee_rate, min_fee, slippage)
+                if fill is not None:
+                    run['trades'].append((i, action) + fill)
+            run['equity'][i] = mark_to_market(account, price)
+
+    return {name: {key: run[key] for key in ('account', 'equity', 'trades')} for name, run in runs.items()}
+
+
+def summarize(results, initial_capital):
+    rows = []
+    for name, result in results.items():
+        account = result['account']
+        rows.append({
+            'strategy': name,
+            'final_equity': account['equity'],
+            'total_return': account['equity'] / initial_capital - 1,
+            'max_drawdown': account['max_drawdown'],
+            'round_trips': account['trades'],
+            'win_rate': account['wins'] / account['trades'] if account['trades'] else np.nan,
+            'fees': account['fees'],
+            'holding': account['shares'] > 0,
+        })
+    return pd.DataFrame(rows)
+
+
+def trades_frame(results, dates):
+    frames = []
+    for name, result in results.items():
+        if not result['trades']:
+            continue
+        index, action, shares, fill, fee = map(np.asarray, zip(*result['trades']))
+        frames.append(pd.DataFrame({
+            'strategy': name,
+            'date': np.asarray(dates)[index],
+            'action': ACTION_NAMES[action],
+            'shares': shares,
+            'price': fill,
+            'fee': fee,
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['strategy', 'date', 'action', 'shares', 'price', 'fee'])
+    return pd.concat(frames, ignore_index=True).sort_values(['date', 'strategy'], kind='stable')
+
+
+def load_history_frame(code):
+    records, _ = load_history(monitor.HISTORY_CACHE_DIR, monitor.to_tencent_symbol(code), "qfq")
+    if records is not None and len(records):
+        return records_to_frame(records)
+    return monitor.get_tencent_data_with_retry(code)
+
+
+if __name__ == "__main__":
+    names = [name.strip() for name in BACKTEST_STRATEGIES.split(",") if name.strip()]
+    unknown = [name for name in names if name not in STRATEGIES]
+    if unknown:
+        raise SystemExit(f"未知策略: {', '.join(unknown)} (可选: {', '.join(STRATEGIES)})")
+
+    df = load_history_frame(BACKTEST_CODE)
+    if df is None or len(df) == 0:
+        raise SystemExit("❌ 历史数据获取失败")
+    params = monitor.current_strategy_params(BACKTEST_CODE)
+    print(f"回测 {BACKTEST_CODE}: {len(df)} 根K线, 策略 {', '.join(names)}, "
+          f"佣金 {BACKTEST_FEE_RATE:.4%} (最低 {BACKTEST_MIN_FEE:.2f}), 滑点 {BACKTEST_SLIPPAGE:.3%}")
+
+    results = run_backtest(df['close'].to_numpy(), params, {name: STRATEGIES[name] for name in names})
+    print(summarize(results, params['initial_capital']).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    trades = trades_frame(results, df['date'].dt.strftime('%Y-%m-%d'))
+    if BACKTEST_OUTPUT:
+        trades.to_csv(BACKTEST_OUTPUT, index=False)
+        print(f"成交明细已写入 {BACKTEST_OUTPUT}")
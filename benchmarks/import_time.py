@@ -0,0 +1,107 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+# 用 python -X importtime 测量入口模块的导入耗时，并检查重量级依赖没有被提前导入。
+# 基线记录的是导入耗时与同一台机器上空解释器启动 (python -c pass) 耗时的比值，
+# 不受 CI 机器快慢影响；绝对毫秒数只用于展示
+# 用法: python benchmarks/import_time.py            对比已提交的基线并检查延迟导入
+#       python benchmarks/import_time.py --update   用本次测量结果更新基线 (需一并提交)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_DIR, "benchmarks", "import_time_baseline.json")
+TOLERANCE = float(os.environ.get("IMPORT_TIME_TOLERANCE", "1.5"))
+TOP_N = 10
+REPEAT = int(os.environ.get("IMPORT_TIME_REPEAT", "5"))  # 取多次测量中的最小值，降低冷缓存 / 抖动的影响
+
+# 入口模块 -> 导入阶段不允许出现的重量级模块 (必须延迟到真正使用时)
+ENTRY_MODULES = {
+    'monitor': ('akshare', 'matplotlib', 'numba', 'scipy'),
+    'chart_monitor': ('akshare', 'matplotlib', 'pandas', 'numpy', 'requests'),
+    'run_all': ('akshare', 'matplotlib', 'numba', 'pandas', 'numpy', 'requests', 'scipy'),
+}
+
+LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)\s*$")
+
+
+def measure(module):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} 失败:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append((name, int(self_us), int(cumulative_us), len(indent) - 1))
+    total_us = next(cumulative for name, _, cumulative, depth in imports if name == module and depth == 0)
+    return total_us / 1000.0, imports
+
+
+def measure_best(module, repeat=REPEAT):
+    return min((measure(module) for _ in range(max(1, repeat))), key=lambda result: result[0])
+
+
+def startup_ms(repeat=REPEAT):
+    """空解释器启动 (python -c pass) 的墙钟耗时，取多次中的最小值，作为本机速度的参照"""
+    samples = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], cwd=REPO_DIR, check=True)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return min(samples)
+
+
+def main():
+    update = "--update" in sys.argv[1:]
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    failures = []
+    report = {}
+    reference_ms = startup_ms()
+    print(f"⏱️ 空解释器启动: {reference_ms:.1f} ms")
+    for module, forbidden in ENTRY_MODULES.items():
+        total_ms, imports = measure_best(module)
+        ratio = total_ms / max(reference_ms, 1e-3)
+        report[module] = round(ratio, 2)
+        print(f"\n📦 import {module}: {total_ms:.1f} ms = 启动耗时的 {ratio:.2f} 倍 ({len(imports)} 个模块)")
+        for name, self_us, _, _ in sorted(imports, key=lambda item: item[1], reverse=True)[:TOP_N]:
+            print(f"  {self_us / 1000.0:8.1f} ms  {name}")
+
+        loaded = {name.split(".")[0] for name, _, _, _ in imports}
+        eager = sorted(loaded.intersection(forbidden))
+        if eager:
+            failures.append(f"{module} 在导入阶段加载了重量级模块: {', '.join(eager)}")
+
+        limit = baseline.get(module)
+        if limit is None and not update:
+            failures.append(f"{module} 没有导入耗时基线，请运行 --update 并提交 {os.path.relpath(BASELINE_PATH, REPO_DIR)}")
+        elif limit is not None and not update and ratio > limit * TOLERANCE:
+            failures.append(f"{module} 导入耗时为启动耗时的 {ratio:.2f} 倍，超过基线 {limit:.2f} 倍的 {TOLERANCE:.1f} 倍")
+
+    if update:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\n✅ 基线已更新: {BASELINE_PATH}")
+
+    if failures:
+        print("\n❌ 导入耗时检查未通过:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\n✅ 导入耗时检查通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+# 离线基准：用合成行情测量策略与图表流水线的吞吐量和峰值内存，不访问网络
+# 用法: python benchmarks/run_benchmarks.py              完整规模 (1k~1M 根K线, 1~5000 个标的)
+#       python benchmarks/run_benchmarks.py --quick      小规模冒烟
+#       python benchmarks/run_benchmarks.py --update     用本次结果更新基线
+# 基线按“用例耗时 / 校准负载耗时”比较，校准负载在同一台机器上运行，机器快慢不影响比较结果；
+# 基线与本次运行的 numba 状态 (STRATEGY_JIT) 不同时不具可比性，只提示不判定回退
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import chart_monitor  # noqa: E402
+import monitor  # noqa: E402
+from history_cache import HistoryStore, clean_records, frame_to_records, splice_delta  # noqa: E402
+from synthetic_data import SEED, random_walk_closes  # noqa: E402
+
+BASELINE_PATH = os.path.join(REPO_DIR, "benchmarks", "benchmark_baseline.json")
+TOLERANCE = float(os.environ.get("BENCHMARK_TOLERANCE", "1.5"))
+REPEAT = int(os.environ.get("BENCHMARK_REPEAT", "3"))
+MIN_SECONDS = float(os.environ.get("BENCHMARK_MIN_SECONDS", "0.005"))  # 更快的用例计时抖动太大，只展示不判定
+
+FULL_BARS = (1_000, 10_000, 100_000, 1_000_000)
+FULL_CODES = (1, 100, 1_000, 5_000)
+QUICK_BARS = (1_000, 10_000)
+QUICK_CODES = (1, 100)
+UNIVERSE_BARS = 1_000  # 多标的场景下每个标的的K线数
+DAILY_MAX_BARS = 100_000  # pandas 时间戳上限约 2262 年，按日期处理的用例 (合并、图表) 不能无限长
+LEAD_LAG_MAX_BARS = 10_000  # 滞后扫描按 (滞后 × 日期) 计算，单独设规模上限，不随图表用例放大
+MERGE_OVERLAP = 20  # 模拟增量拉取时与缓存重叠的K线数
+ENVIRONMENT_KEY = "_environment"  # 基线文件中记录测量环境的条目
+
+
+# ================= 合成行情 =================
+def synthetic_closes(codes, bars, seed=SEED):
+    """形状 (codes, bars) 的收盘价矩阵"""
+    return random_walk_closes((codes, bars), seed)
+
+
+def synthetic_dates(bars):
+    # 超过约 10 万个交易日后按分钟递增，保证日期唯一且有序 (只用于不关心日期的指标/策略用例)
+    freq = "B" if bars <= 100_000 else "min"
+    return pd.date_range("1900-01-01", periods=bars, freq=freq).strftime("%Y-%m-%d %H:%M" if freq == "min" else "%Y-%m-%d")
+
+
+def synthetic_histories(codes, bars, seed=SEED):
+    dates = synthetic_dates(bars)
+    return [pd.DataFrame({'date': dates, 'close': closes}) for closes in synthetic_closes(codes, bars, seed)]
+
+
+def synthetic_chart_series(bars, seed=SEED):
+    """截至今天的逐日序列，模拟 chart_monitor.get_data 的返回值"""
+    end = pd.Timestamp(datetime.date.today())
+    index = pd.date_range(end=end, periods=bars, freq="D")
+    closes = synthetic_closes(3, bars, seed)
+    return {
+        'HSTECH': pd.Series(closes[0] * 2000, index=index),
+        'CAD': pd.Series(closes[1] * 3000, index=index),
+        'OIL': pd.Series(closes[2] * 25, index=index),
+    }
+
+
+# ================= 被测流水线 =================
+def run_macd(histories):
+    for df in histories:
+        monitor.calculate_macd(df.copy(), monitor.FAST_PERIOD, monitor.SLOW_PERIOD, monitor.SIGNAL_PERIOD)
+
+
+def run_ma250_strategy(histories):
+    for df in histories:
+        monitor.calculate_ma250_strategy(df)
+
+
+def make_merge_inputs(histories):
+    # 缓存 (除最后一根外的全部K线) + 增量拉取 (重叠窗口 + 最新一根)，实时价作为下一交易日拼接
+    inputs = []
+    for df in histories:
+        records = frame_to_records(df)
+        inputs.append((records[:-1], records[-MERGE_OVERLAP - 1:].copy(), records['date'][-1] + 1))
+    return inputs
+
+
+def run_merge(inputs):
+    for cached, delta, spot_date in inputs:
+        store = HistoryStore(splice_delta(cached, clean_records(delta)), validate=False)
+        store.upsert_last(spot_date, 3.0)
+        store.to_frame()
+
+
+def run_chart(series, workdir):
+    # 图表用例只测绘图流水线，滞后扫描由 lead_lag 用例单独测量
+    cwd = os.getcwd()
+    original_get_data, original_lead_lag = chart_monitor.get_data, chart_monitor.CHART_LEAD_LAG
+    chart_monitor.get_data = lambda symbol, type: series[symbol]
+    chart_monitor.CHART_LEAD_LAG = False
+    os.chdir(workdir)
+    try:
+        if chart_monitor.generate_chart() is None:
+            raise RuntimeError("generate_chart 未生成图片")
+    finally:
+        os.chdir(cwd)
+        chart_monitor.get_data = original_get_data
+        chart_monitor.CHART_LEAD_LAG = original_lead_lag
+
+
+def run_lead_lag(series):
+    if chart_monitor.run_lead_lag(series['HSTECH'], series['CAD'] / series['OIL']) is None:
+        raise RuntimeError("滞后相关分析未返回结果")
+
+
+def build_cases(bars_list, codes_list):
+    """返回 [(用例名, 处理的K线总数, 准备函数, 运行函数)]；准备阶段不计时"""
+    cases = []
+    for bars in bars_list:
+        cases.append((f"calculate_macd/bars={bars}/codes=1", bars,
+                      lambda bars=bars: synthetic_histories(1, bars), run_macd))
+        cases.append((f"calculate_ma250_strategy/bars={bars}/codes=1", bars,
+                      lambda bars=bars: synthetic_histories(1, bars), run_ma250_strategy))
+        if bars <= DAILY_MAX_BARS:
+            cases.append((f"merge_history/bars={bars}/codes=1", bars,
+                          lambda bars=bars: make_merge_inputs(synthetic_histories(1, bars)), run_merge))
+            workdir = tempfile.mkdtemp(prefix="bench_chart_")
+            cases.append((f"generate_chart/bars={bars}", bars,
+                          lambda bars=bars: synthetic_chart_series(bars),
+                          lambda series, workdir=workdir: run_chart(series, workdir)))
+        if bars <= LEAD_LAG_MAX_BARS:
+            cases.append((f"lead_lag/bars={bars}", bars,
+                          lambda bars=bars: synthetic_chart_series(bars), run_lead_lag))
+    for codes in codes_list:
+        if codes == 1:
+            continue
+        total = codes * UNIVERSE_BARS
+        cases.append((f"calculate_macd/bars={UNIVERSE_BARS}/codes={codes}", total,
+                      lambda codes=codes: synthetic_histories(codes, UNIVERSE_BARS), run_macd))
+        cases.append((f"calculate_ma250_strategy/bars={UNIVERSE_BARS}/codes={codes}", total,
+                      lambda codes=codes: synthetic_histories(codes, UNIVERSE_BARS), run_ma250_strategy))
+        cases.append((f"merge_history/bars={UNIVERSE_BARS}/codes={codes}", total,
+                      lambda codes=codes: make_merge_inputs(synthetic_histories(codes, UNIVERSE_BARS)), run_merge))
+    return cases
+
+
+# ================= 测量 =================
+def calibration_workload():
+    """固定的参照负载 (pandas 指数均线 + 纯 Python 循环)，反映机器的单核速度"""
+    closes = pd.Series(synthetic_closes(1, 200_000, SEED)[0])
+    closes.ewm(span=26, adjust=False).mean()
+    total = 0.0
+    for value in closes.tolist():
+        total += value
+    return total
+
+
+def calibrate(repeat):
+    seconds = []
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        calibration_workload()
+        seconds.append(time.perf_counter() - start)
+    return min(seconds)
+
+
+def jit_enabled():
+    import strategy_engine
+
+    return strategy_engine._get_kernel() is not None
+
+
+def measure(prepare, run, repeat):
+    """预热一次 (numba 编译、图表骨架等)，取 repeat 次中的最短耗时；峰值内存单独跑一次测量"""
+    data = prepare()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run(data)
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run(data)
+            seconds.append(time.perf_counter() - start)
+        tracemalloc.start()
+        try:
+            run(data)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return min(seconds), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略与图表流水线的离线基准测试")
+    parser.add_argument("--quick", action="store_true", help="只跑小规模用例")
+    parser.add_argument("--update", action="store_true", help="用本次结果更新基线")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    args = parser.parse_args()
+
+    bars_list, codes_list = (QUICK_BARS, QUICK_CODES) if args.quick else (FULL_BARS, FULL_CODES)
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    failures = []
+    report = dict(baseline) if args.update else {}
+    calibration = calibrate(args.repeat)
+    environment = {
+        'calibration_seconds': round(calibration, 6),
+        'jit': jit_enabled(),
+        'python': ".".join(map(str, sys.version_info[:3])),
+    }
+    reference_env = baseline.get(ENVIRONMENT_KEY, {})
+    comparable = reference_env.get('jit') == environment['jit']
+    print(f"校准负载 {calibration * 1000:.1f}ms, numba {'开启' if environment['jit'] else '关闭'}, "
+          f"Python {environment['python']}")
+    if baseline and not comparable and not args.update:
+        print(f"⚠️ 基线记录于 numba {'开启' if reference_env.get('jit') else '关闭'} 的环境，本次只展示不判定回退")
+    print(f"{'用例':<48} {'耗时':>10} {'吞吐 (K线/秒)':>16} {'峰值内存':>10} {'对比基线':>10}")
+    for name, total_bars, prepare, run in build_cases(bars_list, codes_list):
+        if args.filter not in name:
+            continue
+        seconds, peak = measure(prepare, run, args.repeat)
+        result = {
+            'seconds': round(seconds, 6),
+            'bars_per_second': round(total_bars / max(seconds, 1e-9), 1),
+            'peak_mib': round(peak / 1024 / 1024, 2),
+            'relative': round(seconds / calibration, 4),
+        }
+        report[name] = result
+
+        reference = baseline.get(name)
+        ratio_text = "-"
+        if reference is not None and 'relative' in reference:
+            ratio = result['relative'] / max(reference['relative'], 1e-9)
+            ratio_text = f"{ratio:.2f}x"
+            if not args.update and comparable and ratio > TOLERANCE and seconds >= MIN_SECONDS:
+                failures.append(f"{name} 相对耗时 {result['relative']:.3f} 超过基线 {reference['relative']:.3f} "
+                                f"的 {TOLERANCE:.1f} 倍")
+        print(f"{name:<48} {seconds * 1000:>8.1f}ms {result['bars_per_second']:>16,.0f} "
+              f"{result['peak_mib']:>8.1f}MB {ratio_text:>10}")
+
+    if args.update:
+        report[ENVIRONMENT_KEY] = environment
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\n✅ 基线已更新: {BASELINE_PATH}")
+
+    if failures:
+        print("\n❌ 基准测试出现性能回退:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+    print("\n✅ 基准测试完成")
+
+
+if __name__ == "__main__":
+    main()
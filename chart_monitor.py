@@ -1,16 +1,21 @@
-import akshare as ak
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import datetime
-import requests
 import os
-import base64
 import sys
-import pytz # 需要用到时区
+from concurrent.futures import ThreadPoolExecutor
+import clock
+from akshare_replay import ak
 from env_config import get_env_float, get_env_int, get_env_str
+from instrumentation import format_timings, run_session, snapshot, stage, stages_since
+from lazy_import import lazy_module
+
+def _use_agg_backend():
+    import matplotlib
+    matplotlib.use('Agg')
+
+# 重量级依赖延迟到第一次使用时再导入，盘中时间锁直接退出时不再付出导入开销
+np = lazy_module("numpy")
+pd = lazy_module("pandas")
+plt = lazy_module("matplotlib.pyplot", on_load=_use_agg_backend)
+mdates = lazy_module("matplotlib.dates", on_load=_use_agg_backend)
 
 # ================= 配置区域 =================
 WXPUSHER_TOKEN = os.environ.get('WXPUSHER_TOKEN', '')
@@ -29,6 +34,27 @@ ratio_factor = anchor_ratio / anchor_hstech
 hstech_ylim_top = get_env_float("CHART_HSTECH_YLIM_TOP", 9500)
 hstech_ylim_bottom = get_env_float("CHART_HSTECH_YLIM_BOTTOM", 2500)
 
+# 本地行情缓存
+CHART_CACHE_DIR = get_env_str("CHART_CACHE_DIR", ".etf_cache/chart")
+CHART_USE_LAST_GOOD = get_env_str("CHART_USE_LAST_GOOD", "1") != "0"
+
+# 输出参数
+CHART_FORMAT = get_env_str("CHART_FORMAT", "png").lower()
+CHART_DPI = get_env_int("CHART_DPI", 100)
+CHART_MIME_TYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+INTERP_MARGIN_DAYS = 31
+CHART_STAGES = ("fetch_data", "lead_lag", "preprocess", "render", "save_image")  # generate_chart 打印耗时的阶段
+
+# 滞后相关分析 (lead_lag.py)：每次生成图表时扫描最优滞后并写入推送；
+# CHART_AUTO_LAG / CHART_AUTO_ANCHOR 开启后图表改用最优滞后 / 拟合的锚定比例
+CHART_LEAD_LAG = get_env_str("CHART_LEAD_LAG", "1") != "0"
+CHART_AUTO_LAG = get_env_str("CHART_AUTO_LAG", "0") != "0"
+CHART_AUTO_ANCHOR = get_env_str("CHART_AUTO_ANCHOR", "0") != "0"
+
+_figure_cache = {}
+_last_render = {}
+_stale_sources = {}  # 本次运行中回退到本地缓存的数据: 代码 -> 缓存截至日期
+
 # ================= 核心功能函数 =================
 
 def upload_to_imgbb(file_path):
@@ -36,160 +62,281 @@ def upload_to_imgbb(file_path):
         print("❌ 错误: 未配置 IMGBB_KEY")
         return None
 
-    url = "https://api.imgbb.com/1/upload"
-    try:
-        print("正在上传图片到 ImgBB...")
-        with open(file_path, "rb") as file:
-            payload = {
-                "key": IMGBB_KEY,
-                "image": base64.b64encode(file.read()),
-            }
-            response = requests.post(url, payload)
-            json_res = response.json()
-            
-            if response.status_code == 200 and json_res.get('success'):
-                img_url = json_res['data']['url']
-                print(f"✅ 图片上传成功: {img_url}")
-                return img_url
-            else:
-                print(f"❌ ImgBB 上传失败: {response.text}")
-                return None
-    except Exception as e:
-        print(f"❌ 上传请求出错: {e}")
+    from notifier import upload_to_imgbb as upload_image
+
+    content_type = CHART_MIME_TYPES.get(os.path.splitext(file_path)[1].lstrip('.').lower())
+    if content_type is None:
+        print(f"❌ ImgBB 不支持该图片格式: {file_path}")
         return None
 
+    print("正在上传图片到 ImgBB...")
+    img_url = upload_image(IMGBB_KEY, file_path, content_type)
+    if img_url:
+        print(f"✅ 图片上传成功: {img_url}")
+    return img_url
+
 def send_wxpusher_image(img_url, summary):
-    url = "http://wxpusher.zjiecode.com/api/send/message"
-    today = datetime.datetime.now().strftime('%Y-%m-%d')
+    from dispatcher import DISPATCH_ENABLED, enqueue, flush
+    from notifier import send_wxpusher_message
+
+    today = clock.now_cn().strftime('%Y-%m-%d')
+    lead_lag_text = f"<p>{_last_render['lead_lag_summary']}</p>" if _last_render.get('lead_lag_summary') else ""
+    stale = _last_render.get('stale') or {}
+    stale_text = ""
+    if stale:
+        summary = f"{summary} (部分数据未更新)"
+        stale_text = (
+            "<p style='color:orange'><b>⚠️ 数据未更新</b>: 以下数据获取失败，图表使用本地缓存 — "
+            + "，".join(f"{symbol} 截至 {as_of}" for symbol, as_of in sorted(stale.items()))
+            + "</p>"
+        )
     content = (
         f"<h1>{summary}</h1><br>"
         f"📅 日期: {today}<br>"
-        f"<p>恒生科技 vs 铜油比 (滞后{lag_days}天)</p>"
+        f"{stale_text}"
+        f"<p>恒生科技 vs 铜油比 (滞后{_last_render.get('lag', lag_days)}天)</p>"
+        f"{lead_lag_text}"
         f"<hr>"
         f"<img src='{img_url}' width='100%' /><br>"
         f"<p style='font-size:12px; color:gray;'>由 GitHub Actions 自动生成</p>"
     )
-    data = {
-        "appToken": WXPUSHER_TOKEN,
-        "content": content,
-        "summary": summary,
-        "contentType": 2, 
-        "uids": [WXPUSHER_UID],
-    }
-    requests.post(url, json=data)
-    print("✅ 微信推送成功")
+    def deliver(title, html):
+        return send_wxpusher_message(WXPUSHER_TOKEN, WXPUSHER_UID, title, html)
+
+    if DISPATCH_ENABLED:
+        # 与 monitor 共用发件箱：重复内容不再推送，失败的消息留待下次运行补发
+        enqueue(summary, content)
+        if flush(deliver)['sent']:
+            print("✅ 微信推送成功")
+    elif deliver(summary, content):
+        print("✅ 微信推送成功")
 
 # ================= 数据获取与绘图 =================
+def fetch_upstream(symbol, type):
+    """从上游拉取完整日线，返回 date/close 两列"""
+    if type == 'index':
+        df = ak.stock_hk_index_daily_sina(symbol=symbol)
+    elif type == 'future':
+        df = ak.futures_foreign_hist(symbol=symbol)
+    else:
+        raise ValueError(f"未知数据类型: {type}")
+    return df[['date', 'close']]
+
+def records_to_series(records):
+    series = pd.Series(np.asarray(records['close'], dtype=float),
+                       index=pd.DatetimeIndex(records['date'], name='Date'), name='Close')
+    return series[series.index >= pd.to_datetime(fetch_start_date)]
+
 def get_data(symbol, type='future'):
+    """
+    获取收盘价序列并写入本地行情缓存：新数据只把缓存之后的尾部拼接上去，
+    重叠窗口不一致 (上游修订) 时整体替换；上游失败时回退到缓存中的最近一次成功数据。
+    """
+    from history_cache import frame_to_records, load_history, save_history, splice_delta
+
+    cached, _ = load_history(CHART_CACHE_DIR, symbol, type)
     try:
-        df = None
-        if type == 'index':
-            df = ak.stock_hk_index_daily_sina(symbol=symbol)
-            df = df[['date', 'close']].rename(columns={'date': 'Date', 'close': 'Close'})
-        elif type == 'future':
-            df = ak.futures_foreign_hist(symbol=symbol)
-            df = df[['date', 'close']].rename(columns={'date': 'Date', 'close': 'Close'})
-
-        if df is not None:
-            df['Date'] = pd.to_datetime(df['Date'])
-            df.set_index('Date', inplace=True)
-            df['Close'] = pd.to_numeric(df['Close'])
-            return df[df.index >= pd.to_datetime(fetch_start_date)]['Close']
+        df = fetch_upstream(symbol, type).copy()
+        df['close'] = pd.to_numeric(df['close'])
+        df = df.dropna(subset=['close'])
+        fetched = frame_to_records(df)
+        fetched = fetched[np.argsort(fetched['date'], kind='stable')]
+        merged = splice_delta(cached, fetched) if cached is not None and len(cached) else None
+        if merged is None:
+            merged = fetched
+        try:
+            save_history(CHART_CACHE_DIR, symbol, type, merged, fetch_start_date)
+        except Exception as e:
+            print(f"⚠️ {symbol} 缓存写入失败: {e}")
+        return records_to_series(merged)
     except Exception as e:
         print(f"❌ {symbol} 获取失败: {e}")
+        if CHART_USE_LAST_GOOD and cached is not None and len(cached):
+            print(f"♻️ {symbol} 使用本地缓存的最近一次成功数据 (截至 {cached['date'][-1]})")
+            _stale_sources[symbol] = str(cached['date'][-1])
+            return records_to_series(cached)
+        return None
+
+def copper_oil_ratio(lme_copper, brent_oil):
+    futures_df = pd.concat([lme_copper, brent_oil], axis=1, keys=['LME_Copper', 'Brent_Oil'])
+    futures_df = futures_df.ffill().bfill()
+    return futures_df['LME_Copper'] / futures_df['Brent_Oil']
+
+def run_lead_lag(hstech, raw_ratio):
+    """在两条序列共同覆盖的逐日索引上做滞后扫描；数据不足时返回 None"""
+    from lead_lag import analyze_lead_lag
+
+    start = max(hstech.index.min(), raw_ratio.index.min())
+    end = min(hstech.index.max(), raw_ratio.index.max())
+    daily_idx = pd.date_range(start=start, end=end, freq='D')
+    if len(daily_idx) < 2:
         return None
+    return analyze_lead_lag(
+        interpolate_daily(hstech, daily_idx),
+        interpolate_daily(raw_ratio, daily_idx),
+        fit_lag=None if CHART_AUTO_LAG else lag_days,
+    )
+
+def interpolate_daily(series, daily_idx):
+    """把序列按时间线性插值到逐日索引上，只在 daily_idx 覆盖的窗口内计算"""
+    series = series[~series.index.duplicated(keep='last')].sort_index()
+    previous = series[series.index < daily_idx[0]].tail(1)
+    window = series[(series.index >= daily_idx[0]) & (series.index <= daily_idx[-1])]
+    points = pd.concat([previous, window])
+    combined = points.reindex(points.index.union(daily_idx)).interpolate(method='time')
+    return combined.reindex(daily_idx)
+
+def get_figure():
+    """
+    图表骨架 (坐标轴、配色、y 轴范围、日期刻度、网格) 只构建一次并缓存，
+    之后重绘只更新曲线数据、x 轴范围、标题和今日竖线。
+    """
+    if _figure_cache:
+        return _figure_cache['fig'], _figure_cache['ax1'], _figure_cache['ax2'], _figure_cache['artists']
+
+    style = 'seaborn-v0_8-whitegrid' if 'seaborn-v0_8-whitegrid' in plt.style.available else 'bmh'
+    with plt.style.context(style):
+        fig, ax1 = plt.subplots(figsize=(12, 8))
+
+        color1 = '#004c6d'
+        hstech_line, = ax1.plot([], [], color=color1, linewidth=1.8, label='Hang Seng TECH', alpha=0.95)
+        ax1.set_ylabel('Hang Seng TECH Index', color=color1, fontsize=12, fontweight='bold')
+        ax1.tick_params(axis='y', labelcolor=color1)
+        ax1.set_ylim(hstech_ylim_bottom, hstech_ylim_top)
+
+        ax2 = ax1.twinx()
+        color2 = '#d62728'
+        ratio_line, = ax2.plot([], [], color=color2, linewidth=1.5, linestyle='-',
+                               label=f'LME/Brent Ratio (+{lag_days}d)', alpha=0.9)
+        ax2.set_ylabel(f'LME Copper / Brent Ratio', color=color2, fontsize=12, fontweight='bold')
+        ax2.tick_params(axis='y', labelcolor=color2)
+        ax2.set_ylim(hstech_ylim_bottom * ratio_factor, hstech_ylim_top * ratio_factor)
+
+        today_line = ax1.axvline(pd.Timestamp.now(), color='black', linestyle='--', linewidth=1.5)
+        title = ax1.set_title(f'HSTECH vs Copper/Oil (+{lag_days}d)', fontsize=14)
+
+        date_fmt = mdates.DateFormatter('%y-%m-%d')
+        ax1.xaxis.set_major_formatter(date_fmt)
+        ax1.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
+        ax1.tick_params(axis='x', labelrotation=90, labelsize=10)
+        ax1.grid(True, which='major', axis='x', linestyle='--', alpha=0.5)
+        fig.subplots_adjust(bottom=0.15)
+
+    _figure_cache.update({
+        'fig': fig,
+        'ax1': ax1,
+        'ax2': ax2,
+        'artists': {'hstech': hstech_line, 'ratio': ratio_line, 'today': today_line, 'title': title},
+    })
+    return fig, ax1, ax2, _figure_cache['artists']
 
 def generate_chart():
     print("正在获取数据...")
-    hstech = get_data("HSTECH", type='index')
-    lme_copper = get_data("CAD", type='future')
-    brent_oil = get_data("OIL", type='future')
+    # run_all 下策略检查在同一进程并发记录阶段，这里只打印本次出图的阶段
+    timings_before = snapshot()['stages']
+    _stale_sources.clear()
+    # 三个数据源互不依赖，并发获取
+    with stage("fetch_data"):
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            hstech_future = executor.submit(get_data, "HSTECH", 'index')
+            copper_future = executor.submit(get_data, "CAD", 'future')
+            oil_future = executor.submit(get_data, "OIL", 'future')
+            hstech = hstech_future.result()
+            lme_copper = copper_future.result()
+            brent_oil = oil_future.result()
 
     if hstech is None or lme_copper is None or brent_oil is None:
         print("❌ 数据获取失败")
         return None
 
-    futures_df = pd.concat([lme_copper, brent_oil], axis=1, keys=['LME_Copper', 'Brent_Oil'])
-    futures_df = futures_df.ffill().bfill()
-    raw_ratio = futures_df['LME_Copper'] / futures_df['Brent_Oil']
-
-    shifted_dates = raw_ratio.index + pd.Timedelta(days=lag_days)
-    ratio_shifted = pd.Series(raw_ratio.values, index=shifted_dates)
-
-    min_date = min(hstech.index.min(), ratio_shifted.index.min())
-    max_date = max(hstech.index.max(), ratio_shifted.index.max())
-    full_idx = pd.date_range(start=min_date, end=max_date, freq='D')
-
-    plot_hstech = hstech.reindex(full_idx).interpolate(method='linear')
-    plot_ratio = ratio_shifted.reindex(full_idx).interpolate(method='linear')
-
-    plot_hstech = plot_hstech[plot_hstech.index >= pd.to_datetime(view_start_date)]
-    plot_ratio = plot_ratio[plot_ratio.index >= pd.to_datetime(view_start_date)]
-    
-    today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    plot_hstech = plot_hstech[plot_hstech.index <= today]
-
-    ratio_ylim_bottom = hstech_ylim_bottom * ratio_factor
-    ratio_ylim_top = hstech_ylim_top * ratio_factor
-
-    plt.style.use('seaborn-v0_8-whitegrid' if 'seaborn-v0_8-whitegrid' in plt.style.available else 'bmh')
-    fig, ax1 = plt.subplots(figsize=(12, 8))
-
-    color1 = '#004c6d'
-    ax1.plot(plot_hstech.index, plot_hstech, color=color1, linewidth=1.8, label='Hang Seng TECH', alpha=0.95)
-    ax1.set_ylabel('Hang Seng TECH Index', color=color1, fontsize=12, fontweight='bold')
-    ax1.tick_params(axis='y', labelcolor=color1)
-    ax1.set_ylim(hstech_ylim_bottom, hstech_ylim_top)
-
-    ax2 = ax1.twinx()
-    color2 = '#d62728'
-    ax2.plot(plot_ratio.index, plot_ratio, color=color2, linewidth=1.5, linestyle='-',
-             label=f'LME/Brent Ratio (+{lag_days}d)', alpha=0.9)
-    ax2.set_ylabel(f'LME Copper / Brent Ratio', color=color2, fontsize=12, fontweight='bold')
-    ax2.tick_params(axis='y', labelcolor=color2)
-    ax2.set_ylim(ratio_ylim_bottom, ratio_ylim_top)
-
-    if plot_ratio.index[0] <= today <= plot_ratio.index[-1]:
-        ax1.axvline(today, color='black', linestyle='--', linewidth=1.5)
-
-    plt.title(f'HSTECH vs Copper/Oil (+{lag_days}d)', fontsize=14)
-    ax1.set_xlim(left=pd.to_datetime(view_start_date), right=plot_ratio.index[-1])
-
-    lines1, labels1 = ax1.get_legend_handles_labels()
-    lines2, labels2 = ax2.get_legend_handles_labels()
-    ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper left')
-
-    date_fmt = mdates.DateFormatter('%y-%m-%d')
-    ax1.xaxis.set_major_formatter(date_fmt)
-    ax1.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-    plt.setp(ax1.get_xticklabels(), rotation=90, ha='center', fontsize=10)
-    ax1.grid(True, which='major', axis='x', linestyle='--', alpha=0.5)
-    plt.subplots_adjust(bottom=0.15)
-
-    filename = "chart_push.png"
-    plt.savefig(filename, dpi=100)
-    plt.close()
+    chart_lag, chart_factor = lag_days, ratio_factor
+    _last_render.clear()
+    _last_render['stale'] = dict(_stale_sources)
+    if CHART_LEAD_LAG:
+        with stage("lead_lag"):
+            try:
+                from lead_lag import format_summary
+
+                result = run_lead_lag(hstech, copper_oil_ratio(lme_copper, brent_oil))
+            except Exception as e:
+                print(f"⚠️ 滞后相关分析失败: {e}")
+                result = None
+        if result is not None:
+            _last_render['lead_lag_summary'] = format_summary(result, lag_days)
+            print(f"🔍 {_last_render['lead_lag_summary']}")
+            if CHART_AUTO_LAG:
+                chart_lag = result['best_lag']
+            if CHART_AUTO_ANCHOR:
+                chart_factor = result['ratio_factor']
+    _last_render['lag'] = chart_lag
+
+    with stage("preprocess"):
+        view_start = pd.to_datetime(view_start_date)
+        lag = pd.Timedelta(days=chart_lag)
+        # 先裁剪再重采样：只保留可视窗口及其之前一小段 (用于边界插值) 的数据点
+        margin = pd.Timedelta(days=INTERP_MARGIN_DAYS)
+        lme_copper = lme_copper[lme_copper.index >= view_start - lag - margin]
+        brent_oil = brent_oil[brent_oil.index >= view_start - lag - margin]
+        hstech = hstech[hstech.index >= view_start - margin]
+
+        raw_ratio = copper_oil_ratio(lme_copper, brent_oil)
+        ratio_shifted = pd.Series(raw_ratio.values, index=raw_ratio.index + lag)
+
+        max_date = max(hstech.index.max(), ratio_shifted.index.max())
+        view_idx = pd.date_range(start=view_start, end=max_date, freq='D')
+        plot_hstech = interpolate_daily(hstech, view_idx)
+        plot_ratio = interpolate_daily(ratio_shifted, view_idx)
+
+        today = clock.now_cn().replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+        plot_hstech = plot_hstech[plot_hstech.index <= today]
+
+    with stage("render"):
+        fig, ax1, ax2, artists = get_figure()
+        artists['hstech'].set_data(plot_hstech.index, plot_hstech.values)
+        artists['ratio'].set_data(plot_ratio.index, plot_ratio.values)
+        artists['ratio'].set_label(f'LME/Brent Ratio (+{chart_lag}d)')
+        artists['title'].set_text(f'HSTECH vs Copper/Oil (+{chart_lag}d)')
+        ax2.set_ylim(hstech_ylim_bottom * chart_factor, hstech_ylim_top * chart_factor)
+        ax1.set_xlim(left=view_start, right=plot_ratio.index[-1])
+
+        show_today = plot_ratio.index[0] <= today <= plot_ratio.index[-1]
+        artists['today'].set_xdata([today, today])
+        artists['today'].set_visible(show_today)
+
+        lines1, labels1 = ax1.get_legend_handles_labels()
+        lines2, labels2 = ax2.get_legend_handles_labels()
+        ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper left')
+
+    with stage("save_image"):
+        filename = f"chart_push.{CHART_FORMAT}"
+        fig.savefig(filename, dpi=CHART_DPI)
+
+    print("⏱️ 各阶段耗时: " + format_timings(stages_since(timings_before, CHART_STAGES)))
     return filename
 
-if __name__ == "__main__":
-    # 【核心修改】时间锁逻辑
-    # 1. 获取当前北京时间
-    tz_cn = pytz.timezone('Asia/Shanghai')
-    now_cn = datetime.datetime.now(tz_cn)
-    
+def run_chart():
+    filename = generate_chart()
+    if filename:
+        with stage("upload_imgbb"):
+            img_url = upload_to_imgbb(filename)
+        if img_url:
+            with stage("send_wxpusher"):
+                send_wxpusher_image(img_url, "每日图表: 恒生科技趋势")
+
+def is_chart_time(now_cn):
+    """时间锁：盘中 (15点之前) 不发图"""
     print(f"当前北京时间: {now_cn.strftime('%H:%M')}")
-    
-    # 2. 判断是否是盘中（15点之前）
-    # 如果现在的小时数小于 15 (比如 14点)，说明是盘中，直接退出，不发图
     if now_cn.hour < 15:
         print("🕒 处于盘中时间 (<15:00)，跳过图表发送。")
-        sys.exit(0) # 正常退出，不报错
-        
+        return False
     print("🕒 处于收盘后 (>15:00)，开始生成图表...")
+    return True
 
-    # 3. 只有满足时间条件才执行下面的逻辑
-    filename = generate_chart()
-    if filename:
-        img_url = upload_to_imgbb(filename)
-        if img_url:
-            send_wxpusher_image(img_url, "每日图表: 恒生科技趋势")
+if __name__ == "__main__":
+    # 【核心修改】时间锁逻辑：如果现在的小时数小于 15 (比如 14点)，说明是盘中，直接退出，不发图
+    if not is_chart_time(clock.now_cn()):
+        sys.exit(0) # 正常退出，不报错
+
+    # 只有满足时间条件才执行下面的逻辑
+    with run_session("chart_monitor"):
+        run_chart()
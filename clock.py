@@ -0,0 +1,24 @@
+import datetime
+
+import pytz
+
+TZ_CN = pytz.timezone('Asia/Shanghai')
+
+# run_all 在一次运行开始时固定北京时间，各任务据此判断盘中/收盘，不会因任务先后跨过 15:00 而口径不一
+_frozen = None
+
+
+def now_cn():
+    return _frozen if _frozen is not None else datetime.datetime.now(TZ_CN)
+
+
+def freeze(value=None):
+    """固定当前北京时间并返回；value 为 None 时取此刻"""
+    global _frozen
+    _frozen = value if value is not None else datetime.datetime.now(TZ_CN)
+    return _frozen
+
+
+def unfreeze():
+    global _frozen
+    _frozen = None
@@ -0,0 +1,313 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+import numpy as np
+import pandas as pd
+
+from akshare_replay import ak
+from env_config import get_env_float, get_env_int, get_env_str
+from history_cache import load_history, records_to_frame
+from http_client import retry_call
+from instrumentation import count, record_stage
+
+# ================= 配置区域 =================
+DATA_SOURCE_ORDER = get_env_str("DATA_SOURCE_ORDER", "tencent,eastmoney,sina")
+HEDGE_DELAY = get_env_float("DATA_SOURCE_HEDGE_DELAY", 3.0)  # 首选源超过该秒数未返回则并发启动下一个源
+SOURCE_TIMEOUT = get_env_float("DATA_SOURCE_TIMEOUT", 60.0)  # 整轮竞速的最长等待时间
+CACHE_MAX_STALE_DAYS = get_env_int("CACHE_MAX_STALE_DAYS", 4)
+CACHE_RACE_DELAY = get_env_float("DATA_SOURCE_CACHE_DELAY", 15.0)  # 竞速开始该秒数后本地缓存加入竞速
+SOURCE_PRIOR_LATENCY = get_env_float("DATA_SOURCE_PRIOR_LATENCY", HEDGE_DELAY)  # 尚无成功记录的源按此延迟估分
+DATA_SOURCE_ROUNDS = get_env_int("DATA_SOURCE_ROUNDS", 2)  # 所有源都失败时整轮重试的次数
+LATENCY_EWMA_ALPHA = 0.3
+
+
+# ================= 数据源 =================
+# 每个数据源: fetch(symbol, start_date, end_date) -> 按日期升序的 DataFrame[date(datetime64), close(float)]
+# symbol 统一为带交易所前缀的代码 (sh510880)，日期为 YYYYMMDD 字符串，价格统一为前复权
+class HistorySource:
+    """
+    可参与竞速的历史数据源。network=True 的源计入延迟 / 错误率统计并按得分排序；
+    本地缓存 (network=False) 不计分，在竞速进行 CACHE_RACE_DELAY 秒后或网络源全部失败时加入。
+    """
+
+    def __init__(self, name, fetch, network=True):
+        self.name = name
+        self.fetch = fetch
+        self.network = network
+
+    def __repr__(self):
+        return f"<HistorySource {self.name}>"
+
+
+def normalize_history(df, date_col, close_col):
+    out = pd.DataFrame({
+        'date': pd.to_datetime(df[date_col]),
+        'close': pd.to_numeric(df[close_col], errors='coerce'),
+    })
+    return out.dropna(subset=['close']).sort_values('date').reset_index(drop=True)
+
+
+def fetch_tencent(symbol, start_date, end_date):
+    df = ak.stock_zh_a_hist_tx(symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq")
+    return normalize_history(df, 'date', 'close')
+
+
+def fetch_eastmoney(symbol, start_date, end_date):
+    df = ak.fund_etf_hist_em(symbol=symbol[2:], period="daily", start_date=start_date,
+                             end_date=end_date, adjust="qfq")
+    return normalize_history(df, '日期', '收盘')
+
+
+def fetch_sina(symbol, start_date, end_date):
+    df = ak.stock_zh_a_daily(symbol=symbol, start_date=start_date, end_date=end_date, adjust="qfq")
+    return normalize_history(df, 'date', 'close')
+
+
+NETWORK_SOURCES = {
+    'tencent': HistorySource('tencent', fetch_tencent),
+    'eastmoney': HistorySource('eastmoney', fetch_eastmoney),
+    'sina': HistorySource('sina', fetch_sina),
+}
+CACHE_SOURCE_NAME = 'cache'
+
+
+def fetch_local_cache(symbol, start_date, end_date, cache_dir):
+    """本地缓存：只在缓存足够新 (距 end_date 不超过 CACHE_MAX_STALE_DAYS 天) 时可用"""
+    records, meta = load_history(cache_dir, symbol, "qfq")
+    if records is None or len(records) == 0:
+        raise ValueError("本地缓存为空")
+    end = np.datetime64(pd.to_datetime(end_date).date())
+    if (end - records['date'][-1]) > np.timedelta64(CACHE_MAX_STALE_DAYS, 'D'):
+        raise ValueError(f"本地缓存过旧 (截至 {records['date'][-1]})")
+    return records_to_frame(records[records['date'] >= np.datetime64(pd.to_datetime(start_date).date())])
+
+
+def local_cache_source(cache_dir):
+    return HistorySource(
+        CACHE_SOURCE_NAME,
+        lambda symbol, start_date, end_date: fetch_local_cache(symbol, start_date, end_date, cache_dir),
+        network=False,
+    )
+
+
+def is_valid_history(df):
+    return df is not None and len(df) > 0 and df['close'].notna().any()
+
+
+# ================= 数据源统计 =================
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def load_stats(path):
+    if not path or not os.path.exists(path):
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+        with _stats_lock:
+            for name, entry in loaded.items():
+                _stats.setdefault(name, entry)
+    except Exception as e:
+        print(f"⚠️ 数据源统计读取失败: {e}")
+
+
+def save_stats(path):
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with _stats_lock:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(_stats, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠️ 数据源统计保存失败: {e}")
+
+
+def _error_rate(entry):
+    # 旧版统计文件只有累计次数
+    if 'error_rate' in entry:
+        return entry['error_rate']
+    return entry['errors'] / max(entry['calls'], 1)
+
+
+def record_result(name, latency, ok):
+    with _stats_lock:
+        entry = _stats.setdefault(name, {'calls': 0, 'errors': 0, 'latency': None})
+        entry['error_rate'] = (1 - LATENCY_EWMA_ALPHA) * _error_rate(entry) + LATENCY_EWMA_ALPHA * (0.0 if ok else 1.0)
+        entry['calls'] += 1
+        if not ok:
+            entry['errors'] += 1
+        elif entry['latency'] is None:
+            entry['latency'] = latency
+        else:
+            entry['latency'] = (1 - LATENCY_EWMA_ALPHA) * entry['latency'] + LATENCY_EWMA_ALPHA * latency
+
+
+def source_score(name):
+    """
+    越小越优先：平滑延迟按错误率加罚。尚无成功记录的源按 SOURCE_PRIOR_LATENCY 估分，
+    不会因为一次失败就永远排在最后；错误率为指数平滑值，恢复后的源会逐步回到前面。
+    """
+    with _stats_lock:
+        entry = _stats.get(name)
+    if not entry:
+        return SOURCE_PRIOR_LATENCY
+    latency = SOURCE_PRIOR_LATENCY if entry['latency'] is None else entry['latency']
+    return latency * (1 + 4 * _error_rate(entry))
+
+
+def ordered_sources(prefer=None):
+    """按得分排序的网络数据源；prefer (该代码缓存数据的来源) 固定排在最前"""
+    configured = [name.strip() for name in DATA_SOURCE_ORDER.split(",") if name.strip() in NETWORK_SOURCES]
+    # sorted 是稳定排序，统计不足时保持配置顺序
+    names = sorted(configured, key=source_score)
+    if prefer in names:
+        names.remove(prefer)
+        names.insert(0, prefer)
+    return [NETWORK_SOURCES[name] for name in names]
+
+
+def stats_summary():
+    with _stats_lock:
+        return {name: dict(entry) for name, entry in _stats.items()}
+
+
+# ================= 对冲请求 =================
+def _timed_fetch(source, symbol, start_date, end_date):
+    start = time.perf_counter()
+    try:
+        df = source.fetch(symbol, start_date, end_date)
+        if not is_valid_history(df):
+            raise ValueError("返回数据为空")
+    except Exception:
+        if source.network:
+            record_result(source.name, time.perf_counter() - start, False)
+        record_stage(f"source.{source.name}", time.perf_counter() - start)
+        count(f"source_errors.{source.name}")
+        raise
+    if source.network:
+        record_result(source.name, time.perf_counter() - start, True)
+        count("history_bytes", int(df.memory_usage(index=False).sum()))
+    record_stage(f"source.{source.name}", time.perf_counter() - start, len(df))
+    return df
+
+
+def _start_daemon(func, *args):
+    """
+    在守护线程中运行 func，返回对应的 Future。
+    akshare 请求没有超时参数；线程池的工作线程会在解释器退出时被等待，卡住的源会拖住进程，因此改用守护线程。
+    """
+    future = Future()
+    future.set_running_or_notify_cancel()
+
+    def run():
+        try:
+            future.set_result(func(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=f"source-{args[0].name}", daemon=True).start()
+    return future
+
+
+def race_sources(symbol, start_date, end_date, sources=None, hedge_delay=None, fallback=None, fallback_delay=None):
+    """
+    按优先级启动首选源；若它在 hedge_delay 秒内未返回 (或已失败) 则启动下一个源，取第一个有效结果。
+    fallback (本地缓存) 在竞速开始 fallback_delay 秒后、或网络源全部失败时加入竞速。
+    全部失败时抛出 RuntimeError。返回 (DataFrame, 源名称)。
+    """
+    sources = list(ordered_sources() if sources is None else sources)
+    hedge_delay = HEDGE_DELAY if hedge_delay is None else hedge_delay
+    fallback_delay = CACHE_RACE_DELAY if fallback_delay is None else fallback_delay
+    if not sources and fallback is None:
+        raise RuntimeError("没有可用的数据源")
+
+    running = {}
+    errors = []
+    started = time.monotonic()
+    deadline = started + SOURCE_TIMEOUT
+    next_hedge = started
+
+    def launch(source):
+        print(f"📡 [{source.name}] 请求历史数据: {symbol}, start={start_date}, end={end_date}")
+        running[_start_daemon(_timed_fetch, source, symbol, start_date, end_date)] = source.name
+
+    def launch_next():
+        nonlocal fallback, next_hedge
+        if sources:
+            launch(sources.pop(0))
+            next_hedge = time.monotonic() + hedge_delay
+        else:
+            launch(fallback)
+            fallback = None
+
+    launch_next()
+    while running or sources or fallback is not None:
+        if not running:
+            launch_next()  # 已启动的源全部失败，立即启动下一个 (网络源用完后是本地缓存)
+            continue
+        now = time.monotonic()
+        if fallback is not None and now - started >= fallback_delay:
+            print(f"⏳ {fallback_delay:.1f}s 内网络源未返回，本地缓存加入竞速")
+            launch(fallback)
+            fallback = None
+            continue
+        remaining = deadline - now
+        if remaining <= 0:
+            # 仍在运行的源线程是守护线程，放弃等待即可，不会拖住进程退出
+            errors.append("竞速超时")
+            break
+        timeout = remaining
+        if sources:
+            timeout = min(timeout, max(0.0, next_hedge - now))
+        if fallback is not None:
+            timeout = min(timeout, max(0.0, started + fallback_delay - now))
+        done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+        for future in done:
+            name = running.pop(future)
+            try:
+                return future.result(), name
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+                print(f"❌ [{name}] 获取失败: {e}")
+
+        if sources and running and time.monotonic() >= next_hedge:
+            print(f"⏳ {hedge_delay:.1f}s 内未返回，对冲启动下一个数据源")
+            launch_next()
+
+    raise RuntimeError("; ".join(errors) or "全部数据源失败")
+
+
+def fetch_history(symbol, start_date, end_date, cache_dir=None, stats_path=None, prefer=None):
+    """
+    对冲请求各网络数据源获取前复权历史；传入 cache_dir 时本地缓存也作为一个竞速源 (见 race_sources)。
+    prefer 为优先请求的源 (该代码缓存数据的来源，不同源的前复权价格口径不同)。
+    stats_path 用于跨运行持久化各源的延迟/错误率统计，影响下次的请求顺序。
+    返回 (DataFrame[date, close], 源名称)，全部失败时返回 (None, None)。
+    """
+    load_stats(stats_path)
+    fallback = local_cache_source(cache_dir) if cache_dir is not None else None
+    try:
+        df, name = retry_call(
+            lambda: race_sources(symbol, start_date, end_date, ordered_sources(prefer), fallback=fallback),
+            "历史数据源竞速",
+            retries=DATA_SOURCE_ROUNDS,
+            retry_on=(RuntimeError,),
+        )
+        if name == CACHE_SOURCE_NAME:
+            print(f"♻️ 使用本地缓存数据 (截至 {df['date'].iloc[-1]:%Y-%m-%d})")
+        else:
+            print(f"✅ [{name}] 历史数据 {len(df)} 行")
+        return df, name
+    except Exception as e:
+        print(f"❌ 历史数据源全部失败: {e}")
+        return None, None
+    finally:
+        save_stats(stats_path)
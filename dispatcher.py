@@ -0,0 +1,263 @@
+import asyncio
+import datetime
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from env_config import get_env_float, get_env_int, get_env_str
+from instrumentation import count
+
+# ================= 配置区域 =================
+DISPATCH_ENABLED = get_env_str("DISPATCH_ENABLED", "1") != "0"  # 0 时各处直接同步推送
+OUTBOX_PATH = get_env_str("OUTBOX_PATH", os.path.join(get_env_str("STATE_DIR", ".etf_state"), "outbox.sqlite"))
+DISPATCH_COALESCE_SECONDS = get_env_float("DISPATCH_COALESCE_SECONDS", 300.0)  # 同一窗口内的消息合并为一条
+DISPATCH_DEDUP_HOURS = get_env_float("DISPATCH_DEDUP_HOURS", 24.0)  # 相同内容在该时间内只推送一次 (跨运行)
+DISPATCH_RATE_PER_MINUTE = get_env_float("DISPATCH_RATE_PER_MINUTE", 30.0)  # 令牌桶速率
+DISPATCH_BURST = get_env_int("DISPATCH_BURST", 5)  # 令牌桶容量
+DISPATCH_CONCURRENCY = get_env_int("DISPATCH_CONCURRENCY", 4)
+DISPATCH_MAX_ATTEMPTS = get_env_int("DISPATCH_MAX_ATTEMPTS", 5)  # 超过后标记为 failed，不再重试
+# 以这些前缀开头的标题 (报警类) 不参与去重：故障持续时每次运行都要提醒，即使内容不变
+DISPATCH_NO_DEDUP_PREFIXES = tuple(
+    prefix.strip() for prefix in get_env_str("DISPATCH_NO_DEDUP_PREFIXES", "报警").split(",") if prefix.strip()
+)
+
+# 同一进程内多个任务并发 flush 时串行执行，避免同一条待发消息被两次取出发送
+_flush_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    summary TEXT NOT NULL,
+    content TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    sent_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, created_at);
+CREATE TABLE IF NOT EXISTS sent_hashes (
+    content_hash TEXT PRIMARY KEY,
+    sent_at REAL NOT NULL
+);
+"""
+
+
+def connect(path=None):
+    path = OUTBOX_PATH if path is None else path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def content_hash(summary, content):
+    return hashlib.sha1(f"{summary}\n{content}".encode("utf-8")).hexdigest()
+
+
+# ================= 发件箱 =================
+def enqueue(summary, content, path=None, now=None):
+    """
+    消息先写入持久化发件箱再由 flush 发送；进程在发送前崩溃时，下次运行的 flush 会补发。
+    返回消息 id。
+    """
+    conn = connect(path)
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO outbox (created_at, summary, content, content_hash) VALUES (?, ?, ?, ?)",
+                (time.time() if now is None else now, summary, content, content_hash(summary, content)),
+            )
+        count("outbox_enqueued")
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def pending_messages(conn):
+    rows = conn.execute(
+        "SELECT id, created_at, summary, content, content_hash, attempts FROM outbox "
+        "WHERE status = 'pending' ORDER BY created_at, id"
+    ).fetchall()
+    keys = ('id', 'created_at', 'summary', 'content', 'content_hash', 'attempts')
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def is_dedup_exempt(summary):
+    return bool(DISPATCH_NO_DEDUP_PREFIXES) and summary.startswith(DISPATCH_NO_DEDUP_PREFIXES)
+
+
+def suppress_duplicates(conn, messages, now, dedup_hours):
+    """
+    去掉 dedup_hours 内已发送过的内容以及本批内重复的内容，被去掉的消息标记为 duplicate。
+    报警类标题 (DISPATCH_NO_DEDUP_PREFIXES) 不去重。
+    """
+    cutoff = now - dedup_hours * 3600
+    conn.execute("DELETE FROM sent_hashes WHERE sent_at < ?", (cutoff,))
+    seen = {row[0] for row in conn.execute("SELECT content_hash FROM sent_hashes")}
+    unique, duplicates = [], []
+    for message in messages:
+        if is_dedup_exempt(message['summary']):
+            unique.append(message)
+        elif message['content_hash'] in seen:
+            duplicates.append(message['id'])
+        else:
+            seen.add(message['content_hash'])
+            unique.append(message)
+    if duplicates:
+        conn.executemany("UPDATE outbox SET status = 'duplicate' WHERE id = ?", [(i,) for i in duplicates])
+        count("outbox_duplicates", len(duplicates))
+        print(f"🔁 跳过 {len(duplicates)} 条重复消息")
+    return unique
+
+
+def coalesce(messages, window_seconds, now=None):
+    """
+    按创建时间所在的窗口分组，同一窗口的多条消息合并为一条。
+    传入 now 时只返回已经结束的窗口 (窗口内可能还会有新消息)。
+    返回 [{'ids', 'summary', 'content', 'hashes'}]。
+    """
+    groups = {}
+    for message in messages:
+        window = int(message['created_at'] // window_seconds) if window_seconds > 0 else message['id']
+        groups.setdefault(window, []).append(message)
+
+    batches = []
+    for window, group in groups.items():
+        if now is not None and window_seconds > 0 and (window + 1) * window_seconds > now:
+            continue
+        if len(group) == 1:
+            summary, content = group[0]['summary'], group[0]['content']
+        else:
+            summary = f"{group[0]['summary']} 等 {len(group)} 条消息"
+            content = "<br><hr>".join(message['content'] for message in group)
+        batches.append({
+            'ids': [message['id'] for message in group],
+            'summary': summary,
+            'content': content,
+            'hashes': [message['content_hash'] for message in group],
+        })
+    return batches
+
+
+# ================= 异步发送 =================
+class TokenBucket:
+    """令牌桶限速：容量 capacity，每秒补充 rate 个令牌；acquire 在令牌不足时异步等待"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def _deliver(batch, send, bucket, semaphore):
+    async with semaphore:
+        await bucket.acquire()
+        try:
+            # send 为阻塞的 HTTP 调用 (notifier)，放到线程里执行，不阻塞事件循环
+            ok = await asyncio.to_thread(send, batch['summary'], batch['content'])
+            return batch, bool(ok), None if ok else "推送失败"
+        except Exception as e:
+            return batch, False, str(e)
+
+
+async def flush_async(send, path=None, closed_windows_only=False, coalesce_seconds=None, dedup_hours=None,
+                      rate_per_minute=None, burst=None, concurrency=None):
+    """
+    发送发件箱中的待发消息：去重 -> 按窗口合并 -> 令牌桶限速并发发送。
+    成功的消息标记为 sent 并记录内容哈希；失败的累加重试次数，留待下次 flush。
+    返回 {'sent', 'failed', 'duplicate', 'deferred'} 消息条数。
+    """
+    coalesce_seconds = DISPATCH_COALESCE_SECONDS if coalesce_seconds is None else coalesce_seconds
+    dedup_hours = DISPATCH_DEDUP_HOURS if dedup_hours is None else dedup_hours
+    rate_per_minute = DISPATCH_RATE_PER_MINUTE if rate_per_minute is None else rate_per_minute
+    burst = DISPATCH_BURST if burst is None else burst
+    concurrency = DISPATCH_CONCURRENCY if concurrency is None else concurrency
+
+    now = time.time()
+    conn = connect(path)
+    try:
+        with conn:
+            messages = pending_messages(conn)
+            unique = suppress_duplicates(conn, messages, now, dedup_hours)
+        batches = coalesce(unique, coalesce_seconds, now if closed_windows_only else None)
+        stats = {
+            'sent': 0,
+            'failed': 0,
+            'duplicate': len(messages) - len(unique),
+            'deferred': len(unique) - sum(len(batch['ids']) for batch in batches),
+        }
+        if not batches:
+            return stats
+
+        bucket = TokenBucket(rate_per_minute / 60.0, burst)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        outcomes = await asyncio.gather(*(_deliver(batch, send, bucket, semaphore) for batch in batches))
+
+        sent_at = time.time()
+        with conn:
+            for batch, ok, error in outcomes:
+                if ok:
+                    conn.executemany("UPDATE outbox SET status = 'sent', attempts = attempts + 1, sent_at = ? "
+                                     "WHERE id = ?", [(sent_at, i) for i in batch['ids']])
+                    conn.executemany("INSERT OR REPLACE INTO sent_hashes (content_hash, sent_at) VALUES (?, ?)",
+                                     [(h, sent_at) for h in batch['hashes']])
+                    stats['sent'] += len(batch['ids'])
+                else:
+                    conn.executemany(
+                        "UPDATE outbox SET attempts = attempts + 1, last_error = ?, "
+                        "status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE status END WHERE id = ?",
+                        [(error, DISPATCH_MAX_ATTEMPTS, i) for i in batch['ids']],
+                    )
+                    stats['failed'] += len(batch['ids'])
+        count("outbox_sent", stats['sent'])
+        count("outbox_failed", stats['failed'])
+        return stats
+    finally:
+        conn.close()
+
+
+def flush(send, path=None, closed_windows_only=False, **options):
+    """flush_async 的同步入口"""
+    with _flush_lock:
+        stats = asyncio.run(flush_async(send, path, closed_windows_only, **options))
+    if stats['sent'] or stats['failed']:
+        print(f"📮 推送队列: 已发送 {stats['sent']} 条, 失败 {stats['failed']} 条 (下次运行重试), "
+              f"重复 {stats['duplicate']} 条, 等待合并 {stats['deferred']} 条")
+    return stats
+
+
+def outbox_status(path=None):
+    conn = connect(path)
+    try:
+        return dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    # 手动补发积压的消息: python dispatcher.py
+    from notifier import send_wxpusher_message
+
+    WXPUSHER_TOKEN = os.environ.get('WXPUSHER_TOKEN', '')
+    WXPUSHER_UID = os.environ.get('WXPUSHER_UID', '')
+    print(f"发件箱状态 ({datetime.datetime.now():%Y-%m-%d %H:%M:%S}): {outbox_status()}")
+    flush(lambda summary, content: send_wxpusher_message(WXPUSHER_TOKEN, WXPUSHER_UID, summary, content))
+    print(f"发件箱状态: {outbox_status()}")
@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from env_config import get_env_float, get_env_int
+
+# 本地假服务：模拟 WxPusher / ImgBB，用于离线验证推送链路、超时与重试
+# 用法: python fake_notify_server.py，然后设置
+#   WXPUSHER_API_URL=http://127.0.0.1:8765/api/send/message
+#   IMGBB_API_URL=http://127.0.0.1:8765/1/upload
+FAKE_PORT = get_env_int("FAKE_NOTIFY_PORT", 8765)
+FAKE_FAIL_FIRST = get_env_int("FAKE_NOTIFY_FAIL_FIRST", 0)  # 前 N 个请求返回 503
+FAKE_DELAY = get_env_float("FAKE_NOTIFY_DELAY", 0.0)  # 每个请求的响应延迟 (秒)
+
+
+def make_handler(received, fail_first, delay):
+    counter = {'requests': 0}
+    lock = threading.Lock()
+
+    class FakeNotifyHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            with lock:
+                counter['requests'] += 1
+                attempt = counter['requests']
+            if delay:
+                time.sleep(delay)
+            if attempt <= fail_first:
+                self._reply(503, {'code': 503, 'msg': 'fake outage'})
+                return
+
+            record = {'path': self.path, 'bytes': len(body), 'time': time.time()}
+            if self.path.startswith("/api/send/message"):
+                record['json'] = json.loads(body.decode("utf-8"))
+                received.append(record)
+                self._reply(200, {'code': 1000, 'msg': '处理成功', 'success': True})
+            elif self.path.startswith("/1/upload"):
+                received.append(record)
+                url = f"http://127.0.0.1:{self.server.server_address[1]}/fake/{len(received)}.png"
+                self._reply(200, {'success': True, 'data': {'url': url}})
+            else:
+                self._reply(404, {'code': 404, 'msg': 'not found'})
+
+    return FakeNotifyHandler
+
+
+def start_fake_server(port=0, fail_first=0, delay=0.0):
+    """在后台线程启动假服务，返回 (server, base_url, received 请求列表)；port=0 自动分配端口"""
+    received = []
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(received, fail_first, delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", received
+
+
+if __name__ == "__main__":
+    server, base_url, received = start_fake_server(FAKE_PORT, FAKE_FAIL_FIRST, FAKE_DELAY)
+    print(f"假推送服务已启动: {base_url}")
+    print(f"WXPUSHER_API_URL={base_url}/api/send/message")
+    print(f"IMGBB_API_URL={base_url}/1/upload")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(f"共收到 {len(received)} 个请求")
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+HISTORY_DTYPE = np.dtype([('date', 'datetime64[D]'), ('close', 'f8')])
+CHECKSUM_DECIMALS = 4
+
+
+def _key(symbol, adjust):
+    return f"{symbol}_{adjust or 'none'}"
+
+
+def cache_paths(cache_dir, symbol, adjust):
+    base = os.path.join(cache_dir, _key(symbol, adjust))
+    return f"{base}.npy", f"{base}.json"
+
+
+def frame_to_records(df):
+    records = np.empty(len(df), dtype=HISTORY_DTYPE)
+    records['date'] = pd.to_datetime(df['date']).to_numpy(dtype='datetime64[D]')
+    records['close'] = pd.to_numeric(df['close'], errors='coerce').to_numpy(dtype=float)
+    return records
+
+
+def records_to_frame(records):
+    return pd.DataFrame({
+        'date': np.asarray(records['date']).astype('datetime64[ns]'),
+        'close': np.asarray(records['close'], dtype=float),
+    })
+
+
+def clean_records(records):
+    """去掉无效收盘价，按日期排序并去重 (同一日期保留最后一条)；已经有序且干净时原样返回"""
+    dates = np.asarray(records['date'])
+    valid = np.isfinite(records['close'])
+    if valid.all() and (len(dates) < 2 or (dates[1:] > dates[:-1]).all()):
+        return records
+    records = records[valid]
+    records = records[np.argsort(records['date'], kind='stable')]
+    keep = np.append(records['date'][1:] != records['date'][:-1], True)
+    return records[keep]
+
+
+def overlap_checksum(records):
+    """对重叠窗口的 (日期, 收盘价) 计算校验和，价格取固定小数位避免浮点噪声"""
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(records['date']).view(np.int64).tobytes())
+    digest.update(np.round(np.asarray(records['close'], dtype=float), CHECKSUM_DECIMALS).tobytes())
+    return digest.hexdigest()
+
+
+def load_history(cache_dir, symbol, adjust):
+    """读取缓存，返回 (内存映射的记录数组, 元数据)；不存在或损坏时返回 (None, None)"""
+    data_path, meta_path = cache_paths(cache_dir, symbol, adjust)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None, None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get('version') != CACHE_VERSION:
+            return None, None
+        records = np.load(data_path, mmap_mode='r')
+        if records.dtype != HISTORY_DTYPE or len(records) != meta.get('rows'):
+            return None, None
+        return records, meta
+    except Exception as e:
+        print(f"⚠️ 历史缓存读取失败 {data_path}: {e}")
+        return None, None
+
+
+def save_history(cache_dir, symbol, adjust, records, start_date, source=None):
+    """source 记录数据来自哪个数据源，增量更新时优先请求同一个源 (各源的复权价格口径不同)"""
+    os.makedirs(cache_dir, exist_ok=True)
+    data_path, meta_path = cache_paths(cache_dir, symbol, adjust)
+    tmp_data = f"{data_path}.tmp.npy"
+    np.save(tmp_data, np.ascontiguousarray(records, dtype=HISTORY_DTYPE))
+    os.replace(tmp_data, data_path)
+    meta = {
+        'version': CACHE_VERSION,
+        'symbol': symbol,
+        'adjust': adjust,
+        'start_date': start_date,
+        'rows': int(len(records)),
+        'last_date': str(records['date'][-1]) if len(records) else None,
+        'source': source,
+    }
+    tmp_meta = f"{meta_path}.tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_meta, meta_path)
+
+
+def splice_delta(cached, fetched):
+    """
+    把增量数据拼接到缓存尾部。
+    重叠窗口 (缓存最后日期之前的增量行) 校验和不一致说明复权序列被改写，返回 None 由调用方全量重取。
+    """
+    if len(cached) == 0 or len(fetched) == 0:
+        return None
+    last_cached = cached['date'][-1]
+    overlap = fetched[fetched['date'] <= last_cached]
+    if len(overlap) == 0:
+        return None
+    start = np.searchsorted(cached['date'], overlap['date'][0])
+    cached_overlap = cached[start:]
+    if len(cached_overlap) != len(overlap) or overlap_checksum(cached_overlap) != overlap_checksum(overlap):
+        return None
+    tail = fetched[fetched['date'] > last_cached]
+    return np.concatenate([np.asarray(cached), tail])
+
+
+class HistoryStore:
+    """
+    按日期升序、无重复的收盘价序列，底层是预留容量的 HISTORY_DTYPE 数组。
+    追加新K线或覆盖最后一根K线都是 O(1) (容量不足时倍增)，不需要 concat + 全量排序去重。
+    """
+
+    def __init__(self, records, validate=True):
+        records = clean_records(records) if validate else records
+        self._length = len(records)
+        self._buffer = np.empty(max(2 * self._length, 16), dtype=HISTORY_DTYPE)
+        self._buffer[:self._length] = records
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def records(self):
+        return self._buffer[:self._length]
+
+    @property
+    def last_date(self):
+        return self._buffer['date'][self._length - 1] if self._length else None
+
+    def upsert_last(self, date, close):
+        """date 等于最后一根K线的日期时覆盖收盘价，晚于它时追加；返回 "replace" 或 "append" """
+        date = np.datetime64(date, 'D')
+        if self._length and date == self.last_date:
+            self._buffer['close'][self._length - 1] = close
+            return "replace"
+        if self._length and date < self.last_date:
+            raise ValueError(f"K线日期 {date} 早于已有的最后日期 {self.last_date}")
+        if self._length == len(self._buffer):
+            grown = np.empty(2 * len(self._buffer), dtype=HISTORY_DTYPE)
+            grown[:self._length] = self._buffer[:self._length]
+            self._buffer = grown
+        self._buffer[self._length] = (date, close)
+        self._length += 1
+        return "append"
+
+    def to_frame(self):
+        return records_to_frame(self.records)
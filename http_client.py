@@ -0,0 +1,78 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from env_config import get_env_float, get_env_int
+from instrumentation import count
+
+HTTP_CONNECT_TIMEOUT = get_env_float("HTTP_CONNECT_TIMEOUT", 5.0)
+HTTP_READ_TIMEOUT = get_env_float("HTTP_READ_TIMEOUT", 20.0)
+HTTP_MAX_RETRIES = get_env_int("HTTP_MAX_RETRIES", 3)
+HTTP_BACKOFF_BASE = get_env_float("HTTP_BACKOFF_BASE", 1.0)
+HTTP_BACKOFF_MAX = get_env_float("HTTP_BACKOFF_MAX", 30.0)
+HTTP_POOL_SIZE = get_env_int("HTTP_POOL_SIZE", 16)
+
+DEFAULT_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+_session_lock = threading.Lock()
+_session = None
+
+
+class RetryableHTTPError(Exception):
+    """服务端暂时不可用 (5xx / 429)，值得重试"""
+
+
+# 非幂等 POST (推送消息等) 的可重试错误：连接失败时请求未送达、5xx / 429 时服务端明确未处理；
+# 读超时不在其中——服务端可能已经处理了请求，重试会造成重复推送
+POST_RETRY_ON = (requests.ConnectionError, RetryableHTTPError)
+
+
+def get_session():
+    """进程内共享的连接池会话"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+        return _session
+
+
+def backoff_delay(attempt, base=None, cap=None):
+    """指数退避 + 全抖动：第 attempt 次失败后等待 [0, min(cap, base * 2^attempt)] 秒"""
+    base = HTTP_BACKOFF_BASE if base is None else base
+    cap = HTTP_BACKOFF_MAX if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def retry_call(func, description, retries=None, retry_on=(requests.RequestException, RetryableHTTPError)):
+    """
+    调用 func()，遇到 retry_on 中的异常时按指数退避重试，最终失败时抛出最后一次异常。
+    retry_on=(Exception,) 可用于第三方接口 (如 akshare) 这类无法细分错误类型的调用。
+    """
+    retries = HTTP_MAX_RETRIES if retries is None else retries
+    for attempt in range(retries):
+        try:
+            return func()
+        except retry_on as e:
+            if attempt == retries - 1:
+                raise
+            delay = backoff_delay(attempt)
+            count("retries")
+            print(f"⚠️ {description} 失败 (第 {attempt + 1} 次): {e}，{delay:.1f}s 后重试")
+            time.sleep(delay)
+
+
+def request(method, url, timeout=None, **kwargs):
+    """带超时的单次请求；5xx / 429 转为 RetryableHTTPError 以便 retry_call 重试"""
+    response = get_session().request(method, url, timeout=timeout or DEFAULT_TIMEOUT, **kwargs)
+    count("http_requests")
+    count("http_bytes", len(response.content))
+    if response.status_code >= 500 or response.status_code == 429:
+        raise RetryableHTTPError(f"HTTP {response.status_code}: {response.text[:200]}")
+    return response
@@ -0,0 +1,201 @@
+import json
+import math
+import os
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from strategy_engine import ACTION_NAMES, OUTPUT_COLUMNS, run_ma250_engine
+
+STATE_VERSION = 1
+INDICATOR_COLUMNS = ('ema_fast', 'ema_slow', 'dif', 'dea', 'macd', 'ma250')
+
+
+def date_key(value):
+    """状态文件中的日期统一为 'YYYY-MM-DD' 字符串；字符串 (含盘中的 'YYYY-MM-DD HH:MM') 原样保留"""
+    if isinstance(value, str):
+        return value
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+
+def _to_builtin(value):
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return date_key(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _ema_step(prev, value, span):
+    # 与 pandas ewm(span, adjust=False).mean() 的递推公式保持一致
+    alpha = 2.0 / (span + 1.0)
+    old_wt = 1.0 - alpha
+    return (old_wt * prev + alpha * value) / (old_wt + alpha)
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except Exception as e:
+        print(f"⚠️ 状态文件读取失败，将全量重算: {e}")
+        return None
+    if state.get('version') != STATE_VERSION:
+        return None
+    return state
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _make_state(params, rows, row, ema_fast, ema_slow, dea, window):
+    return {
+        'version': STATE_VERSION,
+        'params': params,
+        'rows': rows,
+        'date': date_key(row['date']),
+        'ema_fast': float(ema_fast),
+        'ema_slow': float(ema_slow),
+        'dea': float(dea),
+        'ma_window': [float(v) for v in window],
+        'ma_sum': math.fsum(window),  # 每次确认时重新求和，避免浮点误差累积
+        'cash': float(row['cash']),
+        'shares': int(row['shares']),
+        'avg_cost': float(row['avg_cost']),
+        'last_row': {key: _to_builtin(value) for key, value in row.items()},
+    }
+
+
+def build_state(frame, params, commit_index):
+    """从全量计算结果中截取第 commit_index 行作为已确认状态"""
+    closes = frame['close'].to_numpy(dtype=float)
+    window = closes[max(0, commit_index + 1 - params['ma_period']):commit_index + 1]
+    row = frame.iloc[commit_index]
+    return _make_state(params, commit_index + 1, row, row['ema_fast'], row['ema_slow'], row['dea'], window)
+
+
+def advance_state(state, df, params):
+    """
+    从已确认状态推进到 df 的最后一根K线。
+    历史被改写 (例如除权后前复权价格整体变化) 或参数变更时返回 None，由调用方全量重算。
+    返回 (上一确认行 + 新增行 组成的 DataFrame, 新状态)。
+    """
+    if state is None or state.get('params') != params:
+        return None
+
+    rows = state['rows']
+    n = len(df)
+    if n <= rows or date_key(df['date'].iat[rows - 1]) != state['date']:
+        return None
+
+    closes = df['close'].to_numpy(dtype=float)
+    ma_period = params['ma_period']
+    window = deque(state['ma_window'], maxlen=ma_period)
+    if not np.allclose(closes[rows - len(window):rows], list(window), rtol=0.0, atol=1e-9):
+        return None
+
+    ema_fast = state['ema_fast']
+    ema_slow = state['ema_slow']
+    dea = state['dea']
+    ma_sum = state['ma_sum']
+
+    new_closes = closes[rows:]
+    columns = {name: np.empty(len(new_closes)) for name in INDICATOR_COLUMNS}
+    commit_offset = n - 2 - rows  # 最后一根可能是盘中实时价，只确认到倒数第二根
+    commit_snapshot = None
+
+    for i, price in enumerate(new_closes.tolist()):
+        ema_fast = _ema_step(ema_fast, price, params['fast'])
+        ema_slow = _ema_step(ema_slow, price, params['slow'])
+        dif = ema_fast - ema_slow
+        dea = _ema_step(dea, dif, params['signal'])
+
+        if len(window) == ma_period:
+            ma_sum -= window[0]
+        window.append(price)
+        ma_sum += price
+
+        columns['ema_fast'][i] = ema_fast
+        columns['ema_slow'][i] = ema_slow
+        columns['dif'][i] = dif
+        columns['dea'][i] = dea
+        columns['macd'][i] = (dif - dea) * 2
+        columns['ma250'][i] = ma_sum / ma_period if len(window) == ma_period else np.nan
+
+        if i == commit_offset:
+            commit_snapshot = (ema_fast, ema_slow, dea, list(window))
+
+    account, _ = run_ma250_engine(
+        new_closes, columns['ma250'], params['sell_target'], params['lot_size'],
+        state['cash'], state['shares'], state['avg_cost'],
+    )
+
+    tail = df.iloc[rows:][['date', 'close']].reset_index(drop=True)
+    for name in INDICATOR_COLUMNS:
+        tail[name] = columns[name]
+    tail['ma_action'] = ACTION_NAMES[account['ma_action']].tolist()
+    for name in OUTPUT_COLUMNS[1:]:
+        tail[name] = account[name]
+
+    head = pd.DataFrame([state['last_row']])
+    if pd.api.types.is_datetime64_any_dtype(tail['date']):
+        head['date'] = pd.to_datetime(head['date'])
+    frame = pd.concat([head, tail], ignore_index=True)
+
+    new_state = state
+    if commit_snapshot is not None:
+        new_state = _make_state(params, n - 1, tail.iloc[commit_offset], *commit_snapshot)
+    return frame, new_state
+
+
+def peek_bar(state, date, price):
+    """在已确认状态之上试算一根临时K线 (例如盘中最新价)，不修改状态，O(1)"""
+    params = state['params']
+    ma_period = params['ma_period']
+    ema_fast = _ema_step(state['ema_fast'], price, params['fast'])
+    ema_slow = _ema_step(state['ema_slow'], price, params['slow'])
+    dif = ema_fast - ema_slow
+    dea = _ema_step(state['dea'], dif, params['signal'])
+
+    window = state['ma_window']
+    if len(window) == ma_period:
+        ma250 = (state['ma_sum'] - window[0] + price) / ma_period
+    elif len(window) + 1 == ma_period:
+        ma250 = (state['ma_sum'] + price) / ma_period
+    else:
+        ma250 = float('nan')
+
+    account, _ = run_ma250_engine(
+        [price], [ma250], params['sell_target'], params['lot_size'],
+        state['cash'], state['shares'], state['avg_cost'],
+    )
+    row = {
+        'date': date,
+        'close': float(price),
+        'ema_fast': ema_fast,
+        'ema_slow': ema_slow,
+        'dif': dif,
+        'dea': dea,
+        'macd': (dif - dea) * 2,
+        'ma250': ma250,
+        'ma_action': ACTION_NAMES[account['ma_action'][0]],
+    }
+    for name in OUTPUT_COLUMNS[1:]:
+        row[name] = _to_builtin(account[name][0])
+    return row
+
+
+def commit_bar(state, date, price):
+    """把一根已收盘的K线并入已确认状态，返回新状态"""
+    row = peek_bar(state, date, price)
+    window = deque(state['ma_window'], maxlen=state['params']['ma_period'])
+    window.append(float(price))
+    return _make_state(state['params'], state['rows'] + 1, row, row['ema_fast'], row['ema_slow'], row['dea'], window)
@@ -0,0 +1,88 @@
+import numpy as np
+from scipy.signal import lfilter
+
+
+def _as_matrix(prices):
+    values = np.asarray(prices, dtype=np.float64)
+    return values.reshape(1, -1) if values.ndim == 1 else values
+
+
+def _ema_row_with_gaps(values, alpha):
+    """
+    含中间缺失值的单行 EMA，逐步复现 pandas ewm(adjust=False, ignore_na=False)：
+    缺失日输出沿用上一值，但旧值的权重仍按经过的天数衰减。
+    """
+    out = np.full(len(values), np.nan)
+    weighted = np.nan
+    old_weight = 1.0
+    for i, value in enumerate(values.tolist()):
+        if weighted == weighted:
+            old_weight *= 1.0 - alpha
+            if value == value:
+                weighted = (old_weight * weighted + alpha * value) / (old_weight + alpha)
+                old_weight = 1.0
+        elif value == value:
+            weighted = value
+        out[i] = weighted
+    return out
+
+
+def _ema_rows(matrix, span):
+    """
+    对 (标的 × 交易日) 矩阵的每一行计算 EMA，与 pandas ewm(span, adjust=False) 同口径。
+    开头的 NaN (上市较晚的标的) 先用首个有效值填充，算完再还原为 NaN；
+    首个有效值之后仍有 NaN 的行 (停牌、对齐后缺失的日期) 单独按 pandas 的缺失值规则逐步计算。
+    """
+    alpha = 2.0 / (span + 1.0)
+    valid = ~np.isnan(matrix)
+    first = valid.argmax(axis=1)
+    seed = matrix[np.arange(matrix.shape[0]), first]
+    leading = np.arange(matrix.shape[1]) < first[:, None]
+    gapped = (~valid & ~leading).any(axis=1) & valid.any(axis=1)
+
+    filled = np.where(leading | ~valid, seed[:, None], matrix)
+    zi = ((1.0 - alpha) * seed)[:, None]
+    out, _ = lfilter([alpha], [1.0, alpha - 1.0], filled, axis=1, zi=zi)
+    out[leading | ~valid.any(axis=1)[:, None]] = np.nan
+    for row in np.flatnonzero(gapped):
+        out[row] = _ema_row_with_gaps(matrix[row], alpha)
+    return out
+
+
+def ema_batch(prices, spans, series_ids=None, cache=None):
+    """
+    一次计算多组 span 的 EMA，返回 {span: 与输入同形状的数组}。
+    cache 为调用方持有的字典，按 (series_id, span) 记忆结果，重复的 span 不再重算；
+    series_id 须唯一标识一条价格序列，传入 cache 时必须提供 series_ids。
+    """
+    matrix = _as_matrix(prices)
+    squeeze = np.ndim(prices) == 1
+    if series_ids is None:
+        if cache is not None:
+            # 按行号缓存会把另一份矩阵的结果当成本矩阵的返回，复用缓存必须给出稳定的标识
+            raise ValueError("传入 cache 时必须同时提供 series_ids")
+        series_ids = list(range(matrix.shape[0]))
+    elif len(series_ids) != matrix.shape[0]:
+        raise ValueError(f"series_ids 数量 ({len(series_ids)}) 与行数 ({matrix.shape[0]}) 不一致")
+    cache = {} if cache is None else cache
+
+    results = {}
+    for span in dict.fromkeys(spans):
+        missing = [row for row, sid in enumerate(series_ids) if (sid, span) not in cache]
+        if missing:
+            computed = _ema_rows(matrix[missing], span)
+            for row, values in zip(missing, computed):
+                cache[(series_ids[row], span)] = values
+        stacked = np.vstack([cache[(sid, span)] for sid in series_ids])
+        results[span] = stacked[0] if squeeze else stacked
+    return results
+
+
+def macd_batch(prices, fast, slow, signal, series_ids=None, cache=None):
+    """返回 (dif, dea, macd)，输入可以是一维收盘价或 (标的 × 交易日) 矩阵，不修改输入"""
+    emas = ema_batch(prices, (fast, slow), series_ids=series_ids, cache=cache)
+    dif = emas[fast] - emas[slow]
+    dea = _ema_rows(_as_matrix(dif), signal)
+    if np.ndim(prices) == 1:
+        dea = dea[0]
+    return dif, dea, (dif - dea) * 2
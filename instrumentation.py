@@ -0,0 +1,212 @@
+import datetime
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from env_config import get_env_int, get_env_str
+
+# ================= 配置区域 =================
+RUN_REPORT_DIR = get_env_str("RUN_REPORT_DIR", ".etf_reports")  # 运行报告与性能分析产物的输出目录
+PROFILE_MODE = get_env_str("PROFILE_MODE", "").lower()  # 留空关闭；cprofile / tracemalloc / all
+PROFILE_TOP_N = get_env_int("PROFILE_TOP_N", 40)
+
+_lock = threading.Lock()
+_report = {'stages': {}, 'counters': {}}
+_thread_profiles = []  # 工作线程各自的 cProfile，stop_profiling 时并入主线程结果
+
+
+# ================= 阶段计时与计数 =================
+def reset():
+    with _lock:
+        _report['stages'] = {}
+        _report['counters'] = {}
+
+
+def record_stage(name, seconds, rows=None):
+    """同名阶段累加：多线程 / 多次调用时记录总耗时、调用次数和处理行数"""
+    with _lock:
+        entry = _report['stages'].setdefault(name, {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0})
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        entry['max_seconds'] = max(entry['max_seconds'], seconds)
+        if rows is not None:
+            entry['rows'] += int(rows)
+
+
+def count(name, value=1):
+    with _lock:
+        _report['counters'][name] = _report['counters'].get(name, 0) + value
+
+
+@contextmanager
+def stage(name, rows=None):
+    """
+    计时上下文：with stage("calculate_macd", rows=len(df)): ...
+    处理行数事先未知时可在块内赋值 info['rows']。出错的阶段同样计入耗时。
+    """
+    info = {'rows': rows}
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        record_stage(name, time.perf_counter() - start, info['rows'])
+
+
+def timed(name, rows=None):
+    """计时装饰器；rows 为可选的 rows(*args, **kwargs) -> 行数"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name, rows(*args, **kwargs) if rows is not None else None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def snapshot():
+    with _lock:
+        return {
+            'stages': {name: dict(entry) for name, entry in _report['stages'].items()},
+            'counters': dict(_report['counters']),
+        }
+
+
+def stages_since(before, names=None):
+    """before 之后新增的阶段耗时 (before 为 snapshot()['stages'])；names 限定只统计这些阶段"""
+    delta = {}
+    for name, entry in snapshot()['stages'].items():
+        if names is not None and name not in names:
+            continue
+        previous = before.get(name, {'calls': 0, 'seconds': 0.0, 'rows': 0})
+        if entry['calls'] > previous['calls']:
+            delta[name] = {
+                'calls': entry['calls'] - previous['calls'],
+                'seconds': entry['seconds'] - previous['seconds'],
+                'rows': entry['rows'] - previous['rows'],
+            }
+    return delta
+
+
+def format_timings(stages=None):
+    stages = snapshot()['stages'] if stages is None else stages
+    return ", ".join(f"{name} {entry['seconds']:.2f}s" for name, entry in stages.items())
+
+
+# ================= 性能分析 (可选) =================
+def start_profiling(mode):
+    profilers = {}
+    if mode in ("cprofile", "all"):
+        import cProfile
+        with _lock:
+            _thread_profiles.clear()
+        profilers['cprofile'] = cProfile.Profile()
+        profilers['cprofile'].enable()
+    if mode in ("tracemalloc", "all"):
+        import tracemalloc
+        tracemalloc.start(25)
+        profilers['tracemalloc'] = tracemalloc
+    return profilers
+
+
+@contextmanager
+def profile_thread(mode=None):
+    """
+    在工作线程内使用：cProfile 在 Python 3.12 之前只分析调用 enable 的线程，
+    开启 cprofile 时为本线程单独建一个分析器，结束后交给 stop_profiling 合并。
+    """
+    mode = PROFILE_MODE if mode is None else mode
+    if mode not in ("cprofile", "all") or sys.version_info >= (3, 12):
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        with _lock:
+            _thread_profiles.append(profiler)
+
+
+def stop_profiling(profilers, prefix):
+    """停止分析器并写出产物，返回 {产物类型: 路径} 和 tracemalloc 峰值内存"""
+    artifacts = {}
+    peak_bytes = None
+    if 'cprofile' in profilers:
+        import io
+        import pstats
+        profiler = profilers['cprofile']
+        profiler.disable()
+        text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=text)
+        with _lock:
+            for thread_profiler in _thread_profiles:
+                stats.add(thread_profiler)
+            _thread_profiles.clear()
+        artifacts['cprofile'] = f"{prefix}.prof"
+        stats.dump_stats(artifacts['cprofile'])
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        artifacts['cprofile_text'] = f"{prefix}_cprofile.txt"
+        with open(artifacts['cprofile_text'], "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+    if 'tracemalloc' in profilers:
+        tracemalloc = profilers['tracemalloc']
+        memory_snapshot = tracemalloc.take_snapshot()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        artifacts['tracemalloc'] = f"{prefix}_tracemalloc.txt"
+        with open(artifacts['tracemalloc'], "w", encoding="utf-8") as f:
+            f.write(f"peak: {peak_bytes / 1024 / 1024:.1f} MiB\n\n")
+            for stat in memory_snapshot.statistics("lineno")[:PROFILE_TOP_N]:
+                f.write(f"{stat}\n")
+    return artifacts, peak_bytes
+
+
+# ================= 运行报告 =================
+@contextmanager
+def run_session(name, report_dir=None, profile_mode=None):
+    """
+    包裹一次完整运行：清空计数、按 PROFILE_MODE 启动分析器，
+    结束时 (包括异常退出和 sys.exit) 写出 {report_dir}/{name}_report.json 及分析产物。
+    """
+    report_dir = RUN_REPORT_DIR if report_dir is None else report_dir
+    profile_mode = PROFILE_MODE if profile_mode is None else profile_mode
+    reset()
+    started_at = datetime.datetime.now().astimezone()
+    start = time.perf_counter()
+    profilers = start_profiling(profile_mode)
+    status = "ok"
+    try:
+        yield
+    except SystemExit as e:
+        status = "ok" if e.code in (None, 0) else "exit"
+        raise
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        total_seconds = time.perf_counter() - start
+        report = snapshot()
+        report.update({
+            'name': name,
+            'status': status,
+            'started_at': started_at.isoformat(),
+            'total_seconds': total_seconds,
+        })
+        try:
+            os.makedirs(report_dir, exist_ok=True)
+            artifacts, peak_bytes = stop_profiling(profilers, os.path.join(report_dir, name))
+            report['profile_artifacts'] = artifacts
+            report['peak_memory_bytes'] = peak_bytes
+            report_path = os.path.join(report_dir, f"{name}_report.json")
+            with open(report_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"⏱️ 总耗时 {total_seconds:.2f}s，各阶段: {format_timings(report['stages'])}")
+            print(f"📝 运行报告已写入 {report_path}")
+        except Exception as e:
+            print(f"⚠️ 运行报告写入失败: {e}")
@@ -0,0 +1,188 @@
+import csv
+import datetime
+import json
+import os
+import time
+
+import pandas as pd
+
+import clock
+import monitor
+import spot_quotes
+from env_config import get_env_float, get_env_str
+from indicator_state import build_state, commit_bar, peek_bar
+
+# ================= 配置区域 =================
+INTRADAY_POLL_SECONDS = get_env_float("INTRADAY_POLL_SECONDS", 60.0)
+INTRADAY_REPLAY_FILE = get_env_str("INTRADAY_REPLAY_FILE", "")  # 回放录制好的 tick (CSV: timestamp,price)
+INTRADAY_RECORD_FILE = get_env_str("INTRADAY_RECORD_FILE", "")  # 实盘轮询时把 tick 追加录制到该文件
+TRADING_SESSIONS = ((datetime.time(9, 30), datetime.time(11, 30)), (datetime.time(13, 0), datetime.time(15, 0)))
+
+
+# ================= tick 数据源 =================
+def in_trading_session(now_cn):
+    if now_cn.weekday() >= 5:
+        return False
+    return any(start <= now_cn.time() <= end for start, end in TRADING_SESSIONS)
+
+
+def poll_ticks(code, poll_seconds):
+    """实盘轮询：交易时段内按固定间隔读取最新价，收盘后结束"""
+    while True:
+        now_cn = clock.now_cn()
+        if now_cn.time() > TRADING_SESSIONS[-1][1] or now_cn.weekday() >= 5:
+            print("🕒 已收盘，结束盘中监控")
+            return
+        if in_trading_session(now_cn):
+            try:
+                price = spot_quotes.get_price(code, max_age=0)
+                if price is not None:
+                    yield now_cn, price
+            except Exception as e:
+                print(f"⚠️ 实时行情获取失败: {e}")
+        time.sleep(poll_seconds)
+
+
+def replay_ticks(path):
+    """离线回放：按文件顺序产出录制的 tick，不访问网络"""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            timestamp = datetime.datetime.fromisoformat(row['timestamp'])
+            if timestamp.tzinfo is None:
+                timestamp = clock.TZ_CN.localize(timestamp)
+            yield timestamp, float(row['price'])
+
+
+def record_ticks(ticks, path):
+    new_file = not os.path.exists(path)
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(['timestamp', 'price'])
+        for timestamp, price in ticks:
+            writer.writerow([timestamp.isoformat(), price])
+            f.flush()
+            yield timestamp, price
+
+
+# ================= 信号与去重 =================
+def detect_signals(prev_row, row, sell_target):
+    signals = []
+    if prev_row['dif'] < prev_row['dea'] and row['dif'] > row['dea']:
+        signals.append(('macd_gold', "MACD卖出", "MACD盘中金叉。"))
+    elif prev_row['dif'] > prev_row['dea'] and row['dif'] < row['dea']:
+        signals.append(('macd_death', "MACD买入", "MACD盘中死叉。"))
+    if row['ma_action'] == "buy":
+        signals.append(('ma_buy', "250日线买入", "盘中价格跌破250日线，满足买入条件。"))
+    elif row['ma_action'] == "sell":
+        signals.append(('ma_sell', f"{sell_target:.1%}止盈清仓", f"模拟持仓收益率达到 {sell_target:.2%}。"))
+    return signals
+
+
+def load_fired(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {tuple(item) for item in json.load(f)}
+
+
+def save_fired(path, fired):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(sorted(fired), f, ensure_ascii=False)
+
+
+def format_alert(code, row, signals):
+    title = f"【盘中实时】{code} " + " / ".join(signal[1] for signal in signals)
+    content = "<br>".join(signal[2] for signal in signals) + (
+        f"<br><hr>时间: {row['date']}<br>"
+        f"最新价: {row['close']:.4f}<br>"
+        f"DIF: {row['dif']:.4f} / DEA: {row['dea']:.4f}<br>"
+        f"250日线: {monitor.format_optional_price(row['ma250'])}<br>"
+        f"持仓份额: {int(row['shares'])}<br>"
+        f"模拟总资产: {row['portfolio_value']:.2f} 元"
+    )
+    return title, content
+
+
+# ================= 主循环 =================
+def initial_state(code, params, today, history=None):
+    """
+    用截至昨日的历史全量计算一次，作为盘中增量更新的起点。
+    history 为 DataFrame[date, close]，不传时走正常的历史获取 (回放时可配合 AKSHARE_REPLAY_MODE=replay)。
+    """
+    df = monitor.get_tencent_data_with_retry(code) if history is None else history
+    if df is None:
+        return None
+    df = df[pd.to_datetime(df['date']) < pd.Timestamp(today)].reset_index(drop=True)
+    if len(df) < params['slow'] + params['signal']:
+        print("数据量不足")
+        return None
+    frame = monitor.calculate_strategy_full(df, params)
+    return build_state(frame, params, len(frame) - 1)
+
+
+def run_intraday(code, ticks, notify=None, today=None, history=None):
+    """
+    消费 tick 流：每个 tick 只在已确认状态上 O(1) 试算当日临时K线；
+    跨日时把上一交易日最后一个 tick 并入已确认状态。同一交易日同类信号只推送一次。
+    传入 notify 时直接交给它推送，不读写全局发件箱。
+    """
+    use_outbox = notify is None
+    notify = notify or monitor.send_wxpusher
+    params = monitor.current_strategy_params(code)
+    today = today or clock.now_cn().strftime('%Y-%m-%d')
+    state = initial_state(code, params, today, history)
+    if state is None:
+        return None
+
+    fired_path = os.path.join(monitor.STATE_DIR, f"{code}_intraday_alerts.json")
+    fired = load_fired(fired_path)
+    bar_date, bar_price = None, None
+    sent = []
+    waiting = False
+
+    for timestamp, price in ticks:
+        tick_date = timestamp.strftime('%Y-%m-%d')
+        if bar_date is not None and tick_date != bar_date:
+            state = commit_bar(state, bar_date, bar_price)
+            fired = {key for key in fired if key[0] >= tick_date}
+        bar_date, bar_price = tick_date, price
+        if waiting and use_outbox:
+            # 合并窗口结束后立即发出，窗口内后续的信号并入同一条推送
+            stats = monitor.flush_notifications(closed_windows_only=True)
+            waiting = bool(stats and stats['deferred'])
+
+        row = peek_bar(state, timestamp.strftime('%Y-%m-%d %H:%M'), price)
+        signals = [s for s in detect_signals(state['last_row'], row, params['sell_target'])
+                   if (tick_date, s[0]) not in fired]
+        if not signals:
+            continue
+
+        title, content = format_alert(code, row, signals)
+        print(f"🚨 {title}")
+        notify(title, content)
+        sent.append(title)
+        waiting = True
+        fired.update((tick_date, s[0]) for s in signals)
+        save_fired(fired_path, fired)
+
+    if use_outbox:
+        monitor.flush_notifications()
+    return sent
+
+
+if __name__ == "__main__":
+    code = monitor.ETF_CODE
+    if INTRADAY_REPLAY_FILE:
+        print(f"▶️ 回放模式: {INTRADAY_REPLAY_FILE}")
+        ticks = replay_ticks(INTRADAY_REPLAY_FILE)
+        first_tick = next(replay_ticks(INTRADAY_REPLAY_FILE), None)
+        today = first_tick[0].strftime('%Y-%m-%d') if first_tick else None
+    else:
+        print(f"▶️ 盘中实时监控: {code}, 每 {INTRADAY_POLL_SECONDS:.0f}s 轮询一次")
+        ticks = poll_ticks(code, INTRADAY_POLL_SECONDS)
+        today = None
+    if INTRADAY_RECORD_FILE:
+        ticks = record_ticks(ticks, INTRADAY_RECORD_FILE)
+    run_intraday(code, ticks, today=today)
@@ -0,0 +1,47 @@
+import importlib
+import sys
+import threading
+
+
+class LazyModule:
+    """
+    首次访问属性时才真正 import 的模块代理。
+    akshare / matplotlib 等重量级依赖的导入耗时占每次运行的大头，只有真正用到时才付出这部分开销。
+    加锁保证多个线程同时首次访问时只导入一次。
+    """
+
+    def __init__(self, name, on_load=None):
+        self.__dict__['_name'] = name
+        self.__dict__['_on_load'] = on_load
+        self.__dict__['_module'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with self.__dict__['_lock']:
+                module = self.__dict__['_module']
+                if module is None:
+                    on_load = self.__dict__['_on_load']
+                    if on_load is not None:
+                        on_load()
+                    module = importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__['_module'] is not None else "not loaded"
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_module(name, on_load=None):
+    """返回模块代理；若模块已被导入则直接返回真实模块"""
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name, on_load)
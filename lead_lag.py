@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+from env_config import get_env_int
+
+# ================= 配置区域 =================
+LEAD_LAG_MIN_DAYS = get_env_int("LEAD_LAG_MIN_DAYS", 0)
+LEAD_LAG_MAX_DAYS = get_env_int("LEAD_LAG_MAX_DAYS", 365)
+LEAD_LAG_WINDOW = get_env_int("LEAD_LAG_WINDOW", 250)  # 滚动相关系数的窗口 (逐日序列的天数)
+LEAD_LAG_CHUNK = get_env_int("LEAD_LAG_CHUNK", 32)  # 每次计算的滞后个数，峰值内存约为 chunk × 日期数 × 若干个 float64
+
+
+def _window_sums(values, window):
+    """沿最后一维的滚动窗口求和 (累加和相减)，窗口内有 NaN 时结果为 NaN"""
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0), axis=-1)
+    counts = np.cumsum(valid, axis=-1)
+    sums[..., window:] = sums[..., window:] - sums[..., :-window]
+    counts[..., window:] = counts[..., window:] - counts[..., :-window]
+    sums[counts < window] = np.nan
+    return sums
+
+
+def rolling_lag_correlation(leader, follower, lags, window):
+    """
+    对每个滞后 L 计算 follower[t] 与 leader[t - L] 在截至 t 的 window 天窗口内的相关系数。
+    传入的滞后一次性构造成 (滞后 × 日期) 矩阵，用累加和求窗口内的一阶/二阶矩，不逐滞后重新对齐；
+    内存与 len(lags) × len(follower) 成正比，长序列请用 iter_lag_correlation 分块。
+    leader / follower 为同一逐日索引上的一维数组 (调用方负责去均值)；返回形状 (len(lags), len(follower)) 的矩阵。
+    """
+    leader = np.asarray(leader, dtype=np.float64)
+    follower = np.asarray(follower, dtype=np.float64)
+    lags = np.asarray(lags)
+
+    source = np.arange(len(follower))[None, :] - lags[:, None]
+    shifted = np.where(source >= 0, leader[np.clip(source, 0, None)], np.nan)
+    del source
+    both = ~np.isnan(shifted) & ~np.isnan(follower)
+    x = np.where(both, shifted, np.nan)
+    y = np.where(both, follower, np.nan)
+    del shifted, both
+
+    sx, sy = _window_sums(x, window), _window_sums(y, window)
+    sxx, syy, sxy = _window_sums(x * x, window), _window_sums(y * y, window), _window_sums(x * y, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = window * sxy - sx * sy
+        var = (window * sxx - sx * sx) * (window * syy - sy * sy)
+        return cov / np.sqrt(var)
+
+
+def iter_lag_correlation(leader, follower, lags, window, chunk=None):
+    """
+    按每块 chunk 个滞后依次产出 (该块的滞后, 相关系数矩阵)，峰值内存 O(chunk × 日期数)，与滞后总数无关。
+    先对整条序列去均值，避免累加和在长序列上损失精度 (各块使用同一均值，结果与一次性计算相同)。
+    """
+    chunk = LEAD_LAG_CHUNK if chunk is None else chunk
+    leader = np.asarray(leader, dtype=np.float64)
+    follower = np.asarray(follower, dtype=np.float64)
+    leader = leader - np.nanmean(leader)
+    follower = follower - np.nanmean(follower)
+    lags = np.asarray(lags)
+    for start in range(0, len(lags), max(1, chunk)):
+        block = lags[start:start + max(1, chunk)]
+        yield block, rolling_lag_correlation(leader, follower, block, window)
+
+
+def fit_ratio_factor(hstech, ratio_shifted):
+    """拟合图表右轴与左轴的比例 (ratio ≈ hstech × factor)：取窗口内 log(ratio / hstech) 的均值"""
+    log_gap = np.log(np.asarray(ratio_shifted, dtype=np.float64)) - np.log(np.asarray(hstech, dtype=np.float64))
+    return float(np.exp(np.nanmean(log_gap)))
+
+
+def analyze_lead_lag(hstech, ratio, min_lag=None, max_lag=None, window=None, fit_lag=None):
+    """
+    hstech / ratio 为同一逐日索引上的 Series (铜油比为领先序列)。
+    在对数价格上扫描滞后，返回当前最优滞后、相关系数、锚定比例 (按 fit_lag 拟合，缺省为最优滞后)，
+    以及最新日期的逐滞后相关系数和每个日期的最优滞后。
+    """
+    min_lag = LEAD_LAG_MIN_DAYS if min_lag is None else min_lag
+    max_lag = LEAD_LAG_MAX_DAYS if max_lag is None else max_lag
+    window = LEAD_LAG_WINDOW if window is None else window
+
+    lags = np.arange(min_lag, max_lag + 1)
+    log_hstech = np.log(hstech.to_numpy(dtype=float))
+    log_ratio = np.log(ratio.to_numpy(dtype=float))
+
+    # 分块扫描滞后，只保留每个日期的最优滞后 / 相关系数，以及每块最后一个有效日期上的逐滞后相关系数
+    dates = len(log_hstech)
+    best_corr_by_date = np.full(dates, -np.inf)
+    best_by_date = np.full(dates, np.nan)
+    columns = []
+    for block, corr in iter_lag_correlation(log_ratio, log_hstech, lags, window):
+        valid = ~np.isnan(corr)
+        has_valid = valid.any(axis=0)
+        block_best = np.argmax(np.where(valid, corr, -np.inf), axis=0)
+        block_corr = corr[block_best, np.arange(dates)]
+        better = has_valid & (block_corr > best_corr_by_date)
+        best_corr_by_date[better] = block_corr[better]
+        best_by_date[better] = block[block_best[better]]
+        available = np.flatnonzero(has_valid)
+        if len(available):
+            columns.append((available[-1], block, corr[:, available[-1]]))
+        del corr, valid
+
+    # 最新一天 hstech 可能尚未更新 (NaN)，取最后一个有相关系数的日期；
+    # 最后有效日期早于该日期的块在该日期上全为 NaN
+    if not columns:
+        return None
+    latest = max(column[0] for column in columns)
+    current = np.full(len(lags), np.nan)
+    for last_valid, block, values in columns:
+        if last_valid == latest:
+            current[block - min_lag] = values
+    best = int(np.nanargmax(current))
+    best_lag = int(lags[best])
+
+    fit_lag = best_lag if fit_lag is None else fit_lag
+    start = max(latest - window + 1, fit_lag)
+    ratio_values = ratio.to_numpy(dtype=float)
+    fit_ratio = ratio_values[start - fit_lag:latest + 1 - fit_lag]
+    factor = fit_ratio_factor(hstech.to_numpy(dtype=float)[start:latest + 1], fit_ratio)
+
+    return {
+        'date': hstech.index[latest],
+        'best_lag': best_lag,
+        'best_corr': float(current[best]),
+        'fit_lag': fit_lag,
+        'ratio_factor': factor,
+        'corr_by_lag': pd.Series(current, index=lags, name='corr'),
+        'best_lag_history': pd.Series(best_by_date, index=hstech.index, name='best_lag'),
+    }
+
+
+def format_summary(result, configured_lag):
+    configured = result['corr_by_lag'].get(configured_lag, np.nan)
+    return (f"当前最优滞后 {result['best_lag']} 天 (相关系数 {result['best_corr']:.3f})，"
+            f"配置滞后 {configured_lag} 天 (相关系数 {configured:.3f})，"
+            f"按 {result['fit_lag']} 天滞后拟合的锚定比例 {result['ratio_factor']:.5f}")
@@ -0,0 +1,200 @@
+import datetime
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+
+from env_config import get_env_str
+from strategy_engine import BOOL_COLUMNS, INT_COLUMNS, OUTPUT_COLUMNS
+
+# ================= 配置区域 =================
+LEDGER_PATH = get_env_str("LEDGER_PATH", os.path.join(get_env_str("STATE_DIR", ".etf_state"), "ledger.sqlite"))
+LEDGER_ENABLED = get_env_str("LEDGER_ENABLED", "1") != "0"
+
+# 每根K线记录的列：价格、指标与模拟账户 (与策略输出列一致)
+INDICATOR_COLUMNS = ('close', 'ema_fast', 'ema_slow', 'dif', 'dea', 'macd', 'ma250')
+SNAPSHOT_COLUMNS = INDICATOR_COLUMNS + OUTPUT_COLUMNS
+CLOSE_TOLERANCE = 1e-6  # 判断历史收盘价是否被改写的容差
+
+
+def _column_type(name):
+    if name == 'ma_action':
+        return "TEXT"
+    return "INTEGER" if name in BOOL_COLUMNS or name in INT_COLUMNS else "REAL"
+
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    codes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    code TEXT NOT NULL,
+    date TEXT NOT NULL,
+    {", ".join(f"{name} {_column_type(name)}" for name in SNAPSHOT_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_code_date ON snapshots (code, date, run_id);
+CREATE TABLE IF NOT EXISTS signals (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    code TEXT NOT NULL,
+    date TEXT NOT NULL,
+    signal TEXT NOT NULL,
+    close REAL
+);
+CREATE INDEX IF NOT EXISTS idx_signals_code_date ON signals (code, date);
+CREATE INDEX IF NOT EXISTS idx_signals_run ON signals (run_id);
+"""
+
+
+def connect(path=None):
+    path = LEDGER_PATH if path is None else path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# ================= 写入 (只追加) =================
+def _snapshot_rows(run_id, code, frame):
+    """策略结果逐行转成 snapshots 记录；日期统一为 'YYYY-MM-DD'"""
+    dates = pd.to_datetime(frame['date']).dt.strftime('%Y-%m-%d')
+    columns = [frame[name].tolist() if name in frame.columns else [None] * len(frame) for name in SNAPSHOT_COLUMNS]
+    for date, *values in zip(dates, *columns):
+        yield (run_id, code, date, *[int(v) if isinstance(v, bool) else v for v in values])
+
+
+def _history_rewritten(conn, code, frame, last_date):
+    """
+    前复权序列在除权后会整体改写：抽查账本中最后已记录日期之前的首尾两根K线，
+    收盘价与本次结果不一致说明历史已被改写。
+    """
+    dates = pd.to_datetime(frame['date']).dt.strftime('%Y-%m-%d')
+    earlier = dates < last_date
+    if not earlier.any():
+        return False
+    closes = dict(zip(dates[earlier], frame['close'][earlier]))
+    probes = sorted({dates[earlier].iloc[0], dates[earlier].iloc[-1]})
+    rows = conn.execute(
+        f"SELECT date, close FROM snapshots WHERE code = ? AND date IN ({', '.join('?' * len(probes))}) "
+        "ORDER BY run_id",
+        (code, *probes),
+    ).fetchall()
+    stored = dict(rows)  # 同一日期取最后一次运行的记录
+    return any(
+        not np.isclose(stored[date], closes[date], rtol=0, atol=CLOSE_TOLERANCE)
+        for date in probes if stored.get(date) is not None
+    )
+
+
+def _new_rows(conn, code, frame):
+    """
+    只保留账本中尚未记录的K线：最后一个已记录日期及之后 (该日可能从盘中价更新为收盘价)。
+    全量重算的运行会带回整段历史，早于该日期的行已在之前的运行中写过，不再重复写入；
+    但历史被复权改写时整段重写，查询按日期取最新一次运行，新旧价格口径不会混在一起。
+    """
+    last_date = conn.execute("SELECT MAX(date) FROM snapshots WHERE code = ?", (code,)).fetchone()[0]
+    if last_date is None:
+        return frame
+    if _history_rewritten(conn, code, frame, last_date):
+        print(f"♻️ {code} 历史价格已被改写 (复权调整)，账本重写该标的全部K线")
+        return frame
+    return frame[pd.to_datetime(frame['date']) >= pd.Timestamp(last_date)]
+
+
+def record_run(results, mode_name, path=None):
+    """
+    把一次运行的结果追加到账本：每个标的新增 / 更新的K线 (指标 + 模拟账户) 与触发的信号。
+    results 为 evaluate_strategy 的返回值列表 (需包含 frame)。返回 run_id。
+    """
+    placeholders = ", ".join("?" * (3 + len(SNAPSHOT_COLUMNS)))
+    insert_snapshot = f"INSERT INTO snapshots (run_id, code, date, {', '.join(SNAPSHOT_COLUMNS)}) VALUES ({placeholders})"
+    conn = connect(path)
+    try:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO runs (started_at, mode, codes) VALUES (?, ?, ?)",
+                (datetime.datetime.now().astimezone().isoformat(), mode_name, len(results)),
+            )
+            run_id = cursor.lastrowid
+            for result in results:
+                frame = _new_rows(conn, result['code'], result['frame'])
+                conn.executemany(insert_snapshot, _snapshot_rows(run_id, result['code'], frame))
+                conn.executemany(
+                    "INSERT INTO signals (run_id, code, date, signal, close) VALUES (?, ?, ?, ?, ?)",
+                    [(run_id, result['code'], result['date'], title, float(result['close']))
+                     for title in result['signal_titles']],
+                )
+        return run_id
+    finally:
+        conn.close()
+
+
+# ================= 查询 =================
+def _query(sql, params=(), path=None):
+    conn = connect(path)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+def last_signals(n=20, code=None, path=None):
+    """最近 n 条信号 (可按代码过滤)，新的在前"""
+    where = "WHERE s.code = ?" if code else ""
+    params = (code, n) if code else (n,)
+    return _query(
+        f"""SELECT s.code, s.date, s.signal, s.close, r.mode, r.started_at
+            FROM signals s JOIN runs r ON r.run_id = s.run_id
+            {where}
+            ORDER BY s.date DESC, s.run_id DESC
+            LIMIT ?""",
+        params, path,
+    )
+
+
+def equity_curve(code, start_date=None, end_date=None, path=None):
+    """模拟账户的逐日净值；同一日期被多次运行记录时 (盘中 + 收盘) 取最后一次"""
+    return _query(
+        """SELECT s.date, s.close, s.ma_action, s.shares, s.cash, s.portfolio_value
+           FROM snapshots s
+           JOIN (SELECT date, MAX(run_id) AS run_id FROM snapshots
+                 WHERE code = ? AND date >= ? AND date <= ? GROUP BY date) latest
+             ON s.date = latest.date AND s.run_id = latest.run_id
+           WHERE s.code = ?
+           ORDER BY s.date""",
+        (code, start_date or "0000-00-00", end_date or "9999-99-99", code), path,
+    )
+
+
+def latest_snapshot(code, path=None):
+    frame = _query(
+        "SELECT * FROM snapshots WHERE code = ? ORDER BY date DESC, run_id DESC LIMIT 1",
+        (code,), path,
+    )
+    return frame.iloc[0].to_dict() if len(frame) else None
+
+
+def recent_runs(n=10, path=None):
+    return _query("SELECT * FROM runs ORDER BY run_id DESC LIMIT ?", (n,), path)
+
+
+if __name__ == "__main__":
+    # 用法: python ledger.py signals [N] [CODE] | python ledger.py equity CODE | python ledger.py runs [N]
+    command = sys.argv[1] if len(sys.argv) > 1 else "signals"
+    pd.set_option('display.width', 200)
+    if command == "signals":
+        n = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+        print(last_signals(n, sys.argv[3] if len(sys.argv) > 3 else None).to_string(index=False))
+    elif command == "equity" and len(sys.argv) > 2:
+        print(equity_curve(sys.argv[2]).to_string(index=False))
+    elif command == "runs":
+        print(recent_runs(int(sys.argv[2]) if len(sys.argv) > 2 else 10).to_string(index=False))
+    else:
+        print("用法: python ledger.py signals [N] [CODE] | equity CODE | runs [N]")
+        sys.exit(1)
@@ -1,11 +1,19 @@
-import akshare as ak
+import numpy as np
 import pandas as pd
-import requests
-import datetime
+import json
 import os
-import pytz
-import time
+from concurrent.futures import ThreadPoolExecutor
+import clock
 from env_config import get_env_float, get_env_int, get_env_str
+from data_sources import CACHE_SOURCE_NAME, fetch_history
+from dispatcher import DISPATCH_ENABLED, enqueue, flush
+from history_cache import HistoryStore, clean_records, frame_to_records, load_history, save_history, splice_delta
+from indicator_state import advance_state, build_state, load_state, save_state
+from instrumentation import run_session, stage, timed
+from ledger import LEDGER_ENABLED, record_run
+from notifier import send_wxpusher_message
+from spot_quotes import get_quote, get_quote_index, to_exchange_symbol
+from strategy_engine import ACTION_NAMES, OUTPUT_COLUMNS, run_ma250_compact, run_ma250_engine, run_ma250_events
 
 # ================= 配置区域 =================
 WXPUSHER_TOKEN = os.environ.get('WXPUSHER_TOKEN', '')
@@ -21,105 +29,134 @@ INITIAL_CAPITAL = get_env_float("INITIAL_CAPITAL", 100000.0)
 LOT_SIZE = get_env_int("LOT_SIZE", 100)
 HISTORY_START_DATE = get_env_str("HISTORY_START_DATE", "20180101")
 TENCENT_MIN_START_DATE = "20230101"
+STATE_DIR = get_env_str("STATE_DIR", ".etf_state")
+INCREMENTAL_STATE = get_env_str("INCREMENTAL_STATE", "1") != "0"
+HISTORY_CACHE_DIR = get_env_str("HISTORY_CACHE_DIR", ".etf_cache")
+HISTORY_CACHE_OVERLAP_DAYS = get_env_int("HISTORY_CACHE_OVERLAP_DAYS", 20)
+ETF_WATCHLIST = get_env_str("ETF_WATCHLIST", "")
+WATCHLIST_MAX_WORKERS = max(1, get_env_int("WATCHLIST_MAX_WORKERS", 16))
 
 # ================= 核心函数 =================
+def deliver_wxpusher(summary, content):
+    return send_wxpusher_message(WXPUSHER_TOKEN, WXPUSHER_UID, summary, content)
+
 def send_wxpusher(title, content):
-    url = "http://wxpusher.zjiecode.com/api/send/message"
-    data = {
-        "appToken": WXPUSHER_TOKEN,
-        "content": f"<h1>{title}</h1><br>{content}",
-        "summary": title,
-        "contentType": 2,
-        "uids": [WXPUSHER_UID],
-    }
-    try:
-        requests.post(url, json=data)
-    except Exception as e:
-        print(f"推送错误: {e}")
+    """DISPATCH_ENABLED 时写入发件箱，由 flush_notifications 去重、合并、限速后发送"""
+    html = f"<h1>{title}</h1><br>{content}"
+    if DISPATCH_ENABLED:
+        enqueue(title, html)
+    else:
+        with stage("send_wxpusher"):
+            deliver_wxpusher(title, html)
+
+def flush_notifications(closed_windows_only=False):
+    if DISPATCH_ENABLED:
+        with stage("send_wxpusher"):
+            return flush(deliver_wxpusher, closed_windows_only=closed_windows_only)
 
 def to_tencent_symbol(code):
-    normalized = str(code).strip().lower()
-    if normalized.startswith(("sh", "sz")):
-        return normalized
-    return f"sh{normalized}" if normalized.startswith(("5", "6", "9")) else f"sz{normalized}"
+    return to_exchange_symbol(code)
 
 def normalize_yyyymmdd(value, default):
     digits_only = "".join(ch for ch in str(value).strip() if ch.isdigit())
     return digits_only if len(digits_only) == 8 else default
 
-def get_tencent_data_with_retry(code):
-    """使用腾讯财经接口获取前复权历史数据"""
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            tz_cn = pytz.timezone('Asia/Shanghai')
-            end_date = datetime.datetime.now(tz_cn).strftime("%Y%m%d")
-            start_date = normalize_yyyymmdd(HISTORY_START_DATE, TENCENT_MIN_START_DATE)
-            if start_date < TENCENT_MIN_START_DATE:
-                start_date = TENCENT_MIN_START_DATE
-            tencent_symbol = to_tencent_symbol(code)
-            print(
-                f"📡 正在从腾讯财经获取数据 (第 {attempt + 1} 次): "
-                f"{tencent_symbol}, start={start_date}, end={end_date}"
-            )
-            df = ak.stock_zh_a_hist_tx(
-                symbol=tencent_symbol,
-                start_date=start_date,
-                end_date=end_date,
-                adjust="qfq",
-            )
-            df = df[['date', 'close']].copy()
-            df['date'] = pd.to_datetime(df['date'])
-            df = df.sort_values('date')
-            df['date'] = df['date'].dt.strftime('%Y-%m-%d')
-            return df
-            
-        except Exception as e:
-            print(f"❌ 腾讯财经接口报错: {e}")
-            time.sleep(5) # 失败稍微歇一下
-    
-    return None
+def get_history_store(code):
+    """
+    获取前复权历史数据：本地缓存 + 只拉取缺失的尾部，网络请求在腾讯/东财/新浪之间对冲竞速。
+    只有新拉取的数据需要清洗校验 (缓存写入前已校验过)，返回 HistoryStore，失败时返回 None。
+    """
+    now_cn = clock.now_cn()
+    end_date = now_cn.strftime("%Y%m%d")
+    start_date = normalize_yyyymmdd(HISTORY_START_DATE, TENCENT_MIN_START_DATE)
+    if start_date < TENCENT_MIN_START_DATE:
+        start_date = TENCENT_MIN_START_DATE
+    tencent_symbol = to_tencent_symbol(code)
+
+    source_options = {
+        'cache_dir': HISTORY_CACHE_DIR,
+        'stats_path': os.path.join(STATE_DIR, "data_source_stats.json"),
+    }
+    records, meta = load_history(HISTORY_CACHE_DIR, tencent_symbol, "qfq")
+    # 缓存固定使用写入时的数据源：增量优先请求该源，换源时全量重取，避免拼接不同源的前复权价格
+    pinned = meta.get('source') if meta else None
+    merged, source = None, pinned
+    if records is not None and len(records) and meta.get('start_date') == start_date:
+        overlap_start = records['date'][-1] - np.timedelta64(HISTORY_CACHE_OVERLAP_DAYS, 'D')
+        df_delta, delta_source = fetch_history(tencent_symbol, str(overlap_start).replace('-', ''), end_date,
+                                               prefer=pinned, **source_options)
+        if df_delta is None:
+            return None
+        if pinned is not None and delta_source not in (pinned, CACHE_SOURCE_NAME):
+            print(f"⚠️ 增量数据来自 {delta_source}，与缓存的数据源 {pinned} 不同，全量重新获取")
+        else:
+            merged = splice_delta(records, clean_records(frame_to_records(df_delta)))
+            if merged is None:
+                print("⚠️ 缓存重叠窗口校验不一致 (前复权因子可能已变化)，全量重新获取")
+            else:
+                print(f"📦 命中本地缓存 {len(records)} 行，增量获取 {len(df_delta)} 行")
+                if pinned is None and delta_source != CACHE_SOURCE_NAME:
+                    source = delta_source  # 旧版缓存未记录来源，从本次起固定
+
+    if merged is None:
+        df_full, full_source = fetch_history(tencent_symbol, start_date, end_date, prefer=pinned, **source_options)
+        if df_full is None:
+            return None
+        merged = clean_records(frame_to_records(df_full))
+        if full_source != CACHE_SOURCE_NAME:
+            source = full_source
+
+    # 当日K线可能仍是盘中价格，只缓存已收盘的交易日
+    confirmed = merged[merged['date'] < np.datetime64(now_cn.date())]
+    try:
+        save_history(HISTORY_CACHE_DIR, tencent_symbol, "qfq", confirmed, start_date, source)
+    except Exception as e:
+        print(f"⚠️ 历史缓存写入失败: {e}")
+    return HistoryStore(merged, validate=False)
 
-def get_merged_data():
-    """获取数据流程"""
+def get_tencent_data_with_retry(code):
+    """获取前复权历史数据，返回 DataFrame[date(datetime64), close]，失败时返回 None"""
+    store = get_history_store(code)
+    return store.to_frame() if store is not None else None
+
+def get_merged_data(code=None, quotes=None):
+    """
+    获取数据流程。quotes 为本次运行已取得的行情索引 (多标的共用同一份快照)；
+    不传时按 TTL 从 spot_quotes 读取。
+    """
+    code = code or ETF_CODE
     try:
         # 1. 获取历史数据 (使用腾讯财经前复权)
-        df_hist = get_tencent_data_with_retry(ETF_CODE)
-        if df_hist is None:
+        with stage("history_fetch") as info:
+            store = get_history_store(code)
+            info['rows'] = len(store) if store is not None else 0
+        if store is None:
             return None
             
         # 2. 尝试获取实时数据 (使用新浪 ETF 实时行情，失败则只用历史)
         try:
-            df_spot = ak.fund_etf_category_sina(symbol="ETF基金")
-            target_code = to_tencent_symbol(ETF_CODE)
-            row = df_spot[df_spot['代码'].astype(str).str.strip().str.lower() == target_code]
-            if not row.empty:
-                current_price = pd.to_numeric(row.iloc[0]['最新价'], errors='coerce')
-                if pd.notna(current_price):
-                    current_price = float(current_price)
-                else:
+            with stage("spot_snapshot"):
+                quote = get_quote(code) if quotes is None else quotes.get(to_exchange_symbol(code))
+            if quote is not None:
+                current_price = quote['price']
+                if current_price is None:
                     raise ValueError("新浪实时行情未返回可用最新价")
-                tz_cn = pytz.timezone('Asia/Shanghai')
-                current_date = datetime.datetime.now(tz_cn).strftime('%Y-%m-%d')
-                
-                if df_hist.iloc[-1]['date'] != current_date:
+                current_date = clock.now_cn().date()
+
+                if store.upsert_last(current_date, current_price) == "append":
                     print(f"拼接实时数据: {current_date} 价格: {current_price}")
-                    new_row = pd.DataFrame({'date': [current_date], 'close': [current_price]})
-                    df_hist = pd.concat([df_hist, new_row], ignore_index=True)
                 else:
                     print("更新今日收盘价")
-                    df_hist.iloc[-1, df_hist.columns.get_loc('close')] = current_price
         except Exception:
             print("⚠️ 实时数据获取失败，将使用截止昨日的历史数据运行")
 
-        df_hist['close'] = pd.to_numeric(df_hist['close'], errors='coerce')
-        df_hist = df_hist.dropna(subset=['close'])
-        df_hist = df_hist.sort_values('date').drop_duplicates(subset='date', keep='last').reset_index(drop=True)
-        return df_hist
+        with stage("merge_history", rows=len(store)):
+            return store.to_frame()
     except Exception as e:
         print(f"数据处理总流程错误: {e}")
         return None
 
+@timed("calculate_macd", rows=lambda df, *args, **kwargs: len(df))
 def calculate_macd(df, fast_p, slow_p, signal_p):
     df['ema_fast'] = df['close'].ewm(span=fast_p, adjust=False).mean()
     df['ema_slow'] = df['close'].ewm(span=slow_p, adjust=False).mean()
@@ -128,7 +165,8 @@ def calculate_macd(df, fast_p, slow_p, signal_p):
     df['macd'] = (df['dif'] - df['dea']) * 2
     return df
 
-def calculate_ma250_strategy(df):
+def calculate_ma250_strategy_reference(df):
+    """逐行 iterrows 参考实现，仅用于校验 calculate_ma250_strategy 的输出"""
     df = df.copy()
     df['ma250'] = df['close'].rolling(window=MA_PERIOD).mean()
 
@@ -238,6 +276,116 @@ def calculate_ma250_strategy(df):
     df['portfolio_value'] = portfolio_value_values
     return df
 
+@timed("calculate_ma250_strategy", rows=lambda df, *args, **kwargs: len(df))
+def calculate_ma250_strategy(df, ma_period=None, sell_target=None, lot_size=None, initial_capital=None,
+                             compact=False):
+    """
+    250日线策略 (预分配数组 + 状态机内核)，输出列与参考实现一致；参数缺省时取全局配置。
+    compact=True 时返回紧凑账本 (见 strategy_engine.run_ma250_compact)，不复制输入的其他列。
+    """
+    ma_period = MA_PERIOD if ma_period is None else ma_period
+    sell_target = SELL_PROFIT_TARGET if sell_target is None else sell_target
+    lot_size = LOT_SIZE if lot_size is None else lot_size
+    initial_capital = INITIAL_CAPITAL if initial_capital is None else initial_capital
+
+    if compact:
+        close = df['close'].to_numpy(dtype=float)
+        ma250 = df['close'].rolling(window=ma_period).mean().to_numpy()
+        ledger = run_ma250_compact(close, ma250, sell_target, lot_size, initial_capital)
+        compact_df = pd.DataFrame({'close': close.astype(np.float32), 'ma250': ma250.astype(np.float32)},
+                                  index=df.index)
+        if 'date' in df.columns:
+            compact_df.insert(0, 'date', df['date'])
+        compact_df['ma_action'] = pd.Categorical.from_codes(ledger.pop('ma_action'), categories=list(ACTION_NAMES))
+        for name, values in ledger.items():
+            compact_df[name] = values
+        return compact_df
+
+    df = df.copy()
+    df['ma250'] = df['close'].rolling(window=ma_period).mean()
+
+    columns, _ = run_ma250_engine(
+        df['close'].to_numpy(dtype=float),
+        df['ma250'].to_numpy(dtype=float),
+        sell_target,
+        lot_size,
+        initial_capital,
+    )
+    df['ma_action'] = ACTION_NAMES[columns['ma_action']].tolist()
+    for name in OUTPUT_COLUMNS[1:]:
+        df[name] = columns[name]
+    return df
+
+def calculate_ma250_events(df, ma_period=None, sell_target=None, lot_size=None, initial_capital=None):
+    """只返回成交事件表和期末账户状态，适合长历史 × 多标的回放"""
+    ma_period = MA_PERIOD if ma_period is None else ma_period
+    sell_target = SELL_PROFIT_TARGET if sell_target is None else sell_target
+    lot_size = LOT_SIZE if lot_size is None else lot_size
+    initial_capital = INITIAL_CAPITAL if initial_capital is None else initial_capital
+
+    close = df['close'].to_numpy(dtype=float)
+    ma250 = df['close'].rolling(window=ma_period).mean().to_numpy()
+    events, final_state = run_ma250_events(close, ma250, sell_target, lot_size, initial_capital)
+
+    rows = events.pop('index')
+    events_df = pd.DataFrame({'close': close[rows]}, index=df.index[rows])
+    if 'date' in df.columns:
+        events_df.insert(0, 'date', df['date'].to_numpy()[rows])
+    events_df['ma_action'] = ACTION_NAMES[events.pop('ma_action').astype(np.int64)].tolist()
+    for name, values in events.items():
+        events_df[name] = values
+    return events_df, final_state
+
+def current_strategy_params(code, overrides=None):
+    params = {
+        'code': code,
+        'fast': FAST_PERIOD,
+        'slow': SLOW_PERIOD,
+        'signal': SIGNAL_PERIOD,
+        'ma_period': MA_PERIOD,
+        'sell_target': SELL_PROFIT_TARGET,
+        'lot_size': LOT_SIZE,
+        'initial_capital': INITIAL_CAPITAL,
+    }
+    if overrides:
+        params.update({key: value for key, value in overrides.items() if key in params})
+    return params
+
+def calculate_strategy_full(df, params):
+    df = calculate_macd(df, params['fast'], params['slow'], params['signal'])
+    return calculate_ma250_strategy(
+        df,
+        ma_period=params['ma_period'],
+        sell_target=params['sell_target'],
+        lot_size=params['lot_size'],
+        initial_capital=params['initial_capital'],
+    )
+
+def run_strategy_incremental(df, params):
+    """
+    基于持久化的指标/账户状态只推进最新K线；
+    状态缺失、参数变化或历史被改写 (如除权后前复权因子变化) 时全量重算。
+    """
+    code = params['code']
+    state_path = os.path.join(STATE_DIR, f"{code}_state.json")
+    with stage("advance_state"):
+        result = advance_state(load_state(state_path), df, params)
+    if result is not None:
+        frame, state = result
+        print(f"⚡ {code} 增量推进 {len(frame) - 1} 根K线 (已确认至 {state['date']})")
+    else:
+        print(f"♻️ {code} 指标状态不可用，全量重算")
+        frame = calculate_strategy_full(df, params)
+        state = build_state(frame, params, len(frame) - 2)
+    try:
+        save_state(state_path, state)
+    except Exception as e:
+        print(f"⚠️ 状态文件保存失败: {e}")
+    return frame
+
+def format_date(value):
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
 def format_optional_price(value):
     if value is None or pd.isna(value) or value <= 0:
         return "-"
@@ -251,108 +399,149 @@ def format_optional_pct(value):
 def bool_to_text(value):
     return "是" if bool(value) else "否"
 
+def get_mode(now_cn):
+    is_closing_mode = now_cn.hour >= 15
+    return is_closing_mode, "收盘确认" if is_closing_mode else "盘中预警"
+
+def evaluate_strategy(df, params, mode_name):
+    """计算指标并生成信号与消息正文；数据量不足时返回 None"""
+    if len(df) < params['slow'] + params['signal']:
+        print(f"{params['code']} 数据量不足")
+        return None
+
+    if INCREMENTAL_STATE:
+        df = run_strategy_incremental(df, params)
+    else:
+        df = calculate_strategy_full(df, params)
+
+    with stage("format_message"):
+        initial_capital = params['initial_capital']
+        sell_target = params['sell_target']
+        prev_day = df.iloc[-2]
+        curr_day = df.iloc[-1]
+        curr_date = format_date(curr_day['date'])
+
+        gold_cross = (prev_day['dif'] < prev_day['dea']) and (curr_day['dif'] > curr_day['dea'])
+        death_cross = (prev_day['dif'] > prev_day['dea']) and (curr_day['dif'] < curr_day['dea'])
+
+        macd_signal_text = "卖出信号 (金叉)" if gold_cross else "买入信号 (死叉)" if death_cross else "无信号"
+
+        ma_action = curr_day['ma_action']
+        ma_signal_text = "无动作"
+        if ma_action == "buy":
+            ma_signal_text = "买入信号 (低于250日线)"
+        elif ma_action == "sell":
+            ma_signal_text = "清仓信号 (收益达到7.5%)"
+        elif curr_day['has_position']:
+            ma_signal_text = "持仓中，等待止盈"
+        else:
+            ma_signal_text = "空仓，等待买点"
+
+        display_cost = curr_day['avg_cost_before'] if ma_action == "sell" else curr_day['avg_cost']
+        display_profit_rate = curr_day['profit_rate_before'] if ma_action == "sell" else (
+            curr_day['current_profit_rate'] if curr_day['has_position'] else None
+        )
+        display_target_sell_price = curr_day['target_sell_price_before'] if ma_action == "sell" else curr_day['current_target_sell_price']
+        position_status = "已清仓" if ma_action == "sell" else "持仓中" if curr_day['has_position'] else "空仓"
+
+        macd_info_msg = (f"<b>【MACD监控】</b><br>"
+                         f"模式: {mode_name}<br>"
+                         f"参考时间: {curr_date}<br>"
+                         f"当前价格: {curr_day['close']:.4f}<br>"
+                         f"当前DIF: {curr_day['dif']:.4f}<br>"
+                         f"当前DEA: {curr_day['dea']:.4f}<br>"
+                         f"MACD柱: {curr_day['macd']:.4f}<br>"
+                         f"当日信号: {macd_signal_text}")
+
+        ma_info_msg = (f"<b>【250日线仓位监控】</b><br>"
+                       f"模式: {mode_name}<br>"
+                       f"参考时间: {curr_date}<br>"
+                       f"当前价格: {curr_day['close']:.4f}<br>"
+                       f"250日线: {format_optional_price(curr_day['ma250'])}<br>"
+                       f"是否低于250日线: {bool_to_text(curr_day['below_ma250'])}<br>"
+                       f"买入条件满足: {bool_to_text(curr_day['buy_condition'])}<br>"
+                       f"7.5%清仓条件满足: {bool_to_text(curr_day['sell_condition'])}<br>"
+                       f"模拟账户初始资金: {initial_capital:,.0f} 元<br>"
+                       f"持仓状态: {position_status}<br>"
+                       f"持仓份额: {int(curr_day['shares'])}<br>"
+                       f"持仓成本价: {format_optional_price(display_cost)}<br>"
+                       f"当前收益率: {format_optional_pct(display_profit_rate)}<br>"
+                       f"目标清仓价: {format_optional_price(display_target_sell_price)}<br>"
+                       f"当日动作: {ma_signal_text}<br>"
+                       f"当次成交份额: {int(curr_day['trade_shares'])}<br>"
+                       f"当次成交金额: {curr_day['trade_value']:.2f} 元<br>"
+                       f"当次实现收益: {curr_day['realized_profit']:.2f} 元<br>"
+                       f"模拟现金: {curr_day['cash']:.2f} 元<br>"
+                       f"模拟总资产: {curr_day['portfolio_value']:.2f} 元")
+
+        signal_titles = []
+        signal_summaries = []
+
+        if gold_cross:
+            signal_titles.append("MACD卖出")
+            signal_summaries.append("<span style='color:orange'><b>MACD卖出信号</b></span><br>MACD发生金叉。")
+        elif death_cross:
+            signal_titles.append("MACD买入")
+            signal_summaries.append("<span style='color:red'><b>MACD买入信号</b></span><br>MACD发生死叉。")
+
+        if ma_action == "buy":
+            signal_titles.append("250日线买入")
+            signal_summaries.append(
+                f"<span style='color:red'><b>250日线买入信号</b></span><br>"
+                f"当前价格低于250日线，模拟账户按 {initial_capital:,.0f} 元全仓买入。"
+            )
+        elif ma_action == "sell":
+            signal_titles.append("7.5%止盈清仓")
+            signal_summaries.append(
+                f"<span style='color:orange'><b>250日线清仓信号</b></span><br>"
+                f"模拟持仓收益率达到 {sell_target:.2%}，执行清仓。"
+            )
+
+    return {
+        'code': params['code'],
+        'date': curr_date,
+        'close': curr_day['close'],
+        'signal_titles': signal_titles,
+        'signal_summaries': signal_summaries,
+        'macd_info_msg': macd_info_msg,
+        'ma_info_msg': ma_info_msg,
+        'frame': df,
+    }
+
+def save_to_ledger(results, mode_name):
+    """把本次计算结果追加到本地运行账本，失败不影响推送"""
+    if not LEDGER_ENABLED or not results:
+        return
+    try:
+        with stage("ledger_write"):
+            run_id = record_run(results, mode_name)
+        print(f"🗄️ 运行结果已写入账本 (run {run_id})")
+    except Exception as e:
+        print(f"⚠️ 运行账本写入失败: {e}")
+
 def check_strategy():
-    tz_cn = pytz.timezone('Asia/Shanghai')
-    now_cn = datetime.datetime.now(tz_cn)
+    now_cn = clock.now_cn()
     print(f"开始执行策略检查 (腾讯财经历史源): {now_cn}")
-    
-    is_closing_mode = now_cn.hour >= 15
-    mode_name = "收盘确认" if is_closing_mode else "盘中预警"
+
+    is_closing_mode, mode_name = get_mode(now_cn)
 
     df = get_merged_data()
     if df is None:
         send_wxpusher("报警: 数据获取失败", "腾讯财经历史接口和新浪实时接口均无法访问，请检查 GitHub 网络。")
         return
 
-    if len(df) < SLOW_PERIOD + SIGNAL_PERIOD:
-        print("数据量不足")
+    result = evaluate_strategy(df, current_strategy_params(ETF_CODE), mode_name)
+    if result is None:
         return
+    save_to_ledger([result], mode_name)
 
-    df = calculate_macd(df, FAST_PERIOD, SLOW_PERIOD, SIGNAL_PERIOD)
-    df = calculate_ma250_strategy(df)
-    
-    prev_day = df.iloc[-2]
-    curr_day = df.iloc[-1]
-    
-    gold_cross = (prev_day['dif'] < prev_day['dea']) and (curr_day['dif'] > curr_day['dea'])
-    death_cross = (prev_day['dif'] > prev_day['dea']) and (curr_day['dif'] < curr_day['dea'])
-
-    macd_signal_text = "卖出信号 (金叉)" if gold_cross else "买入信号 (死叉)" if death_cross else "无信号"
-
-    ma_action = curr_day['ma_action']
-    ma_signal_text = "无动作"
-    if ma_action == "buy":
-        ma_signal_text = "买入信号 (低于250日线)"
-    elif ma_action == "sell":
-        ma_signal_text = "清仓信号 (收益达到7.5%)"
-    elif curr_day['has_position']:
-        ma_signal_text = "持仓中，等待止盈"
-    else:
-        ma_signal_text = "空仓，等待买点"
-
-    display_cost = curr_day['avg_cost_before'] if ma_action == "sell" else curr_day['avg_cost']
-    display_profit_rate = curr_day['profit_rate_before'] if ma_action == "sell" else (
-        curr_day['current_profit_rate'] if curr_day['has_position'] else None
-    )
-    display_target_sell_price = curr_day['target_sell_price_before'] if ma_action == "sell" else curr_day['current_target_sell_price']
-    position_status = "已清仓" if ma_action == "sell" else "持仓中" if curr_day['has_position'] else "空仓"
-
-    macd_info_msg = (f"<b>【MACD监控】</b><br>"
-                     f"模式: {mode_name}<br>"
-                     f"参考时间: {curr_day['date']}<br>"
-                     f"当前价格: {curr_day['close']:.4f}<br>"
-                     f"当前DIF: {curr_day['dif']:.4f}<br>"
-                     f"当前DEA: {curr_day['dea']:.4f}<br>"
-                     f"MACD柱: {curr_day['macd']:.4f}<br>"
-                     f"当日信号: {macd_signal_text}")
-
-    ma_info_msg = (f"<b>【250日线仓位监控】</b><br>"
-                   f"模式: {mode_name}<br>"
-                   f"参考时间: {curr_day['date']}<br>"
-                   f"当前价格: {curr_day['close']:.4f}<br>"
-                   f"250日线: {format_optional_price(curr_day['ma250'])}<br>"
-                   f"是否低于250日线: {bool_to_text(curr_day['below_ma250'])}<br>"
-                   f"买入条件满足: {bool_to_text(curr_day['buy_condition'])}<br>"
-                   f"7.5%清仓条件满足: {bool_to_text(curr_day['sell_condition'])}<br>"
-                   f"模拟账户初始资金: {INITIAL_CAPITAL:,.0f} 元<br>"
-                   f"持仓状态: {position_status}<br>"
-                   f"持仓份额: {int(curr_day['shares'])}<br>"
-                   f"持仓成本价: {format_optional_price(display_cost)}<br>"
-                   f"当前收益率: {format_optional_pct(display_profit_rate)}<br>"
-                   f"目标清仓价: {format_optional_price(display_target_sell_price)}<br>"
-                   f"当日动作: {ma_signal_text}<br>"
-                   f"当次成交份额: {int(curr_day['trade_shares'])}<br>"
-                   f"当次成交金额: {curr_day['trade_value']:.2f} 元<br>"
-                   f"当次实现收益: {curr_day['realized_profit']:.2f} 元<br>"
-                   f"模拟现金: {curr_day['cash']:.2f} 元<br>"
-                   f"模拟总资产: {curr_day['portfolio_value']:.2f} 元")
-
+    macd_info_msg = result['macd_info_msg']
+    ma_info_msg = result['ma_info_msg']
+    signal_titles = result['signal_titles']
+    signal_summaries = result['signal_summaries']
     print(macd_info_msg.replace("<br>", "\n"))
     print(ma_info_msg.replace("<br>", "\n"))
 
-    signal_titles = []
-    signal_summaries = []
-
-    if gold_cross:
-        signal_titles.append("MACD卖出")
-        signal_summaries.append("<span style='color:orange'><b>MACD卖出信号</b></span><br>MACD发生金叉。")
-    elif death_cross:
-        signal_titles.append("MACD买入")
-        signal_summaries.append("<span style='color:red'><b>MACD买入信号</b></span><br>MACD发生死叉。")
-
-    if ma_action == "buy":
-        signal_titles.append("250日线买入")
-        signal_summaries.append(
-            f"<span style='color:red'><b>250日线买入信号</b></span><br>"
-            f"当前价格低于250日线，模拟账户按 {INITIAL_CAPITAL:,.0f} 元全仓买入。"
-        )
-    elif ma_action == "sell":
-        signal_titles.append("7.5%止盈清仓")
-        signal_summaries.append(
-            f"<span style='color:orange'><b>250日线清仓信号</b></span><br>"
-            f"模拟持仓收益率达到 {SELL_PROFIT_TARGET:.2%}，执行清仓。"
-        )
-
     if signal_titles:
         msg_title = f"【{mode_name}】" + " / ".join(signal_titles)
         msg_content = "<br><hr>".join(signal_summaries + [macd_info_msg, ma_info_msg])
@@ -364,5 +553,149 @@ def check_strategy():
             daily_content = f"今日无新交易信号。<br><hr>{macd_info_msg}<br><hr>{ma_info_msg}"
             send_wxpusher(daily_title, daily_content)
 
+# ================= 多标的自选模式 =================
+# 自选条目可覆盖的参数及其类型
+WATCHLIST_PARAM_TYPES = {
+    'fast': int,
+    'slow': int,
+    'signal': int,
+    'ma_period': int,
+    'sell_target': float,
+    'lot_size': int,
+    'initial_capital': float,
+}
+
+def parse_watchlist_entry(entry):
+    """单个自选条目 -> 策略参数；条目不合法时抛出 ValueError 说明原因"""
+    if isinstance(entry, dict):
+        overrides = dict(entry)
+        code = str(overrides.pop('code', '') or '').strip()
+    elif isinstance(entry, (str, int)) and not isinstance(entry, bool):
+        overrides = {}
+        code = str(entry).strip()
+    else:
+        raise ValueError("条目必须是代码字符串或带 code 的对象")
+    if not code:
+        raise ValueError("缺少 code")
+
+    unknown = sorted(set(overrides) - set(WATCHLIST_PARAM_TYPES))
+    if unknown:
+        raise ValueError(f"未知参数 {', '.join(unknown)} (可选: {', '.join(WATCHLIST_PARAM_TYPES)})")
+    for key, value in overrides.items():
+        cast = WATCHLIST_PARAM_TYPES[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0 \
+                or (cast is int and value != int(value)):
+            raise ValueError(f"参数 {key}={value!r} 必须是正{'整数' if cast is int else '数'}")
+        overrides[key] = cast(value)
+
+    params = current_strategy_params(code, overrides)
+    if params['fast'] >= params['slow']:
+        raise ValueError(f"fast ({params['fast']}) 必须小于 slow ({params['slow']})")
+    return params
+
+def load_watchlist(value):
+    """
+    解析 ETF_WATCHLIST：可以是 JSON 文件路径、JSON 字符串或逗号分隔的代码列表。
+    JSON 条目可以是代码字符串，或带独立参数的对象，例如
+    {"code": "159915", "fast": 12, "slow": 26, "signal": 9, "ma_period": 120, "sell_target": 0.05}
+    有不合法条目时抛出 ValueError，一次列出全部问题条目。
+    """
+    value = value.strip()
+    if os.path.isfile(value):
+        with open(value, "r", encoding="utf-8") as f:
+            value = f.read().strip()
+    if value.startswith("["):
+        entries = json.loads(value)
+    else:
+        entries = [item for item in value.split(",") if item.strip()]
+
+    watchlist = []
+    errors = []
+    for position, entry in enumerate(entries, start=1):
+        try:
+            watchlist.append(parse_watchlist_entry(entry))
+        except ValueError as e:
+            errors.append(f"第 {position} 项 {json.dumps(entry, ensure_ascii=False)}: {e}")
+    if errors:
+        raise ValueError("自选列表配置错误:\n" + "\n".join(errors))
+    return watchlist
+
+def check_watchlist(watchlist):
+    now_cn = clock.now_cn()
+    print(f"开始执行自选监控 ({len(watchlist)} 个标的, 并发 {WATCHLIST_MAX_WORKERS}): {now_cn}")
+
+    is_closing_mode, mode_name = get_mode(now_cn)
+    # 整个运行只取一次行情快照并传给各标的，所有标的的实时价来自同一时刻，
+    # 运行耗时超过 TTL 时也不会中途重新拉取
+    try:
+        quotes = get_quote_index()
+    except Exception as e:
+        print(f"⚠️ {e}，将只使用历史数据")
+        quotes = {}
+
+    with ThreadPoolExecutor(max_workers=WATCHLIST_MAX_WORKERS) as executor:
+        histories = list(executor.map(lambda params: get_merged_data(params['code'], quotes), watchlist))
+
+    results = []
+    failed_codes = []
+    for params, df in zip(watchlist, histories):
+        if df is None:
+            failed_codes.append(params['code'])
+            continue
+        try:
+            result = evaluate_strategy(df, params, mode_name)
+        except Exception as e:
+            print(f"❌ {params['code']} 策略计算失败: {e}")
+            failed_codes.append(params['code'])
+            continue
+        if result is not None:
+            results.append(result)
+
+    save_to_ledger(results, mode_name)
+
+    signaled = [r for r in results if r['signal_titles']]
+    quiet = [r for r in results if not r['signal_titles']]
+    print(f"信号标的 {len(signaled)} 个，无信号 {len(quiet)} 个，失败 {len(failed_codes)} 个")
+
+    if not signaled and not failed_codes and not is_closing_mode:
+        print("无新交易信号")
+        return
+
+    sections = []
+    for r in signaled:
+        sections.append(
+            f"<b>{r['code']}</b>: {' / '.join(r['signal_titles'])}<br>"
+            + "<br>".join(r['signal_summaries'])
+            + f"<br>{r['macd_info_msg']}<br>{r['ma_info_msg']}"
+        )
+    if quiet and (is_closing_mode or signaled):
+        sections.append("<b>无信号标的</b><br>" + "<br>".join(
+            f"{r['code']} ({r['date']}): {r['close']:.4f}" for r in quiet
+        ))
+    if failed_codes:
+        sections.append("<b>数据获取失败</b><br>" + ", ".join(failed_codes))
+
+    if signaled:
+        msg_title = f"【{mode_name}】自选监控: {len(signaled)} 个标的出现信号"
+    elif failed_codes and not results:
+        msg_title = "报警: 自选监控数据获取失败"
+    else:
+        msg_title = f"监控正常: 自选 {len(results)} 个标的"
+    send_wxpusher(msg_title, "<br><hr>".join(sections))
+
+def run_monitor():
+    if ETF_WATCHLIST:
+        try:
+            watchlist = load_watchlist(ETF_WATCHLIST)
+        except ValueError as e:
+            print(f"❌ {e}")
+            send_wxpusher("报警: 自选列表配置错误", str(e).replace("\n", "<br>"))
+        else:
+            check_watchlist(watchlist)
+    else:
+        check_strategy()
+    flush_notifications()
+
 if __name__ == "__main__":
-    check_strategy()
+    with run_session("monitor"):
+        run_monitor()
@@ -0,0 +1,92 @@
+import os
+import uuid
+
+from env_config import get_env_str
+from http_client import POST_RETRY_ON, request, retry_call
+
+WXPUSHER_API_URL = get_env_str("WXPUSHER_API_URL", "http://wxpusher.zjiecode.com/api/send/message")
+IMGBB_API_URL = get_env_str("IMGBB_API_URL", "https://api.imgbb.com/1/upload")
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def send_wxpusher_message(token, uid, summary, content):
+    """发送 WxPusher HTML 消息，成功返回 True；失败只打印日志，不抛异常"""
+    data = {
+        "appToken": token,
+        "content": content,
+        "summary": summary,
+        "contentType": 2,
+        "uids": [uid],
+    }
+    try:
+        response = retry_call(lambda: request("POST", WXPUSHER_API_URL, json=data), "WxPusher 推送",
+                              retry_on=POST_RETRY_ON)
+        result = response.json()
+        if result.get('code') != 1000:
+            print(f"推送错误: {result.get('msg', response.text)}")
+            return False
+        return True
+    except Exception as e:
+        print(f"推送错误: {e}")
+        return False
+
+
+class _MultipartBody:
+    """
+    流式 multipart/form-data 请求体：文件按块读取，不整体载入内存、不做 base64。
+    提供 __len__ 让 requests 只发送 Content-Length (不会再附加 Transfer-Encoding: chunked)；
+    每次迭代都从头生成，重试时可直接复用同一个对象。
+    """
+
+    def __init__(self, fields, file_field, file_path, content_type):
+        boundary = uuid.uuid4().hex
+        head = b""
+        for name, value in fields.items():
+            head += (
+                f"--{boundary}\r\n"
+                f"Content-Disposition: form-data; name=\"{name}\"\r\n\r\n"
+                f"{value}\r\n"
+            ).encode("utf-8")
+        head += (
+            f"--{boundary}\r\n"
+            f"Content-Disposition: form-data; name=\"{file_field}\"; filename=\"{os.path.basename(file_path)}\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode("utf-8")
+        self.head = head
+        self.tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+        self.file_path = file_path
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.length = len(self.head) + os.path.getsize(file_path) + len(self.tail)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        yield self.head
+        with open(self.file_path, "rb") as f:
+            while True:
+                chunk = f.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        yield self.tail
+
+
+def upload_to_imgbb(api_key, file_path, content_type="image/png"):
+    """流式上传图片到 ImgBB，成功返回图片 URL"""
+    body = _MultipartBody({"key": api_key}, "image", file_path, content_type)
+    headers = {"Content-Type": body.content_type}
+    try:
+        response = retry_call(
+            lambda: request("POST", IMGBB_API_URL, data=body, headers=headers),
+            "ImgBB 上传",
+            retry_on=POST_RETRY_ON,
+        )
+        json_res = response.json()
+        if response.status_code == 200 and json_res.get('success'):
+            return json_res['data']['url']
+        print(f"❌ ImgBB 上传失败: {response.text}")
+        return None
+    except Exception as e:
+        print(f"❌ 上传请求出错: {e}")
+        return None
@@ -0,0 +1,54 @@
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import clock
+from instrumentation import profile_thread, record_stage, run_session
+
+# 单进程编排：策略检查与图表在同一个解释器内并发运行，共用已导入的模块、
+# http_client 的连接池会话、spot_quotes / 历史缓存，以及同一个北京时间
+
+
+def run_job(name, func):
+    """运行单个任务并计时；任务异常只记录，不影响其他任务"""
+    start = time.perf_counter()
+    try:
+        with profile_thread():
+            func()
+        return True
+    except Exception:
+        print(f"❌ 任务 {name} 失败:\n{traceback.format_exc()}")
+        return False
+    finally:
+        record_stage(f"job.{name}", time.perf_counter() - start)
+
+
+def build_jobs(now_cn):
+    import monitor
+    import chart_monitor
+
+    jobs = {'monitor': monitor.run_monitor}
+    if chart_monitor.is_chart_time(now_cn):
+        jobs['chart_monitor'] = chart_monitor.run_chart
+    return jobs
+
+
+def main():
+    now_cn = clock.freeze()
+    print(f"开始运行 ({now_cn.strftime('%Y-%m-%d %H:%M:%S')} 北京时间)")
+    with run_session("run_all"):
+        jobs = build_jobs(now_cn)
+        with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            futures = {name: executor.submit(run_job, name, func) for name, func in jobs.items()}
+            results = {name: future.result() for name, future in futures.items()}
+
+    failed = [name for name, ok in results.items() if not ok]
+    if failed:
+        print(f"❌ 以下任务失败: {', '.join(failed)}")
+        sys.exit(1)
+    print(f"✅ 全部任务完成: {', '.join(results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+
+import monitor
+from env_config import get_env_int, get_env_str
+from history_cache import load_history, records_to_frame
+from indicators import macd_batch
+from strategy_engine import ACTION_BUY, ACTION_HOLD, ACTION_SELL, run_ma250_engine
+
+# ================= 配置区域 =================
+SIGNAL_LOOKBACK_DAYS = get_env_int("SIGNAL_LOOKBACK_DAYS", 5)  # 列出最近 N 个交易日内出现的信号
+SIGNAL_FORWARD_DAYS = get_env_int("SIGNAL_FORWARD_DAYS", 20)  # 统计信号出现后 N 个交易日的收益
+SIGNAL_STATS_OUTPUT = get_env_str("SIGNAL_STATS_OUTPUT", "")
+
+GOLD_CROSS = 1
+DEATH_CROSS = -1
+SIGNAL_LABELS = {
+    'gold_cross': "MACD金叉 (卖出)",
+    'death_cross': "MACD死叉 (买入)",
+    'ma_buy': "250日线买入",
+    'ma_sell': "止盈清仓",
+}
+
+
+# ================= 向量化扫描 =================
+def macd_crosses(dif, dea):
+    """
+    dif - dea 变号检测：+1 为金叉 (前一日 dif < dea 且当日 dif > dea)，-1 为死叉，其余为 0。
+    与 evaluate_strategy 的判定口径相同 (严格不等，含 NaN 的日期不算交叉)；支持一维或 (标的 × 交易日)。
+    """
+    spread = np.asarray(dif, dtype=np.float64) - np.asarray(dea, dtype=np.float64)
+    crosses = np.zeros(spread.shape, dtype=np.int8)
+    prev, curr = spread[..., :-1], spread[..., 1:]
+    crosses[..., 1:][(prev < 0) & (curr > 0)] = GOLD_CROSS
+    crosses[..., 1:][(prev > 0) & (curr < 0)] = DEATH_CROSS
+    return crosses
+
+
+def rolling_mean(prices, period):
+    """按行滚动均值，窗口内不足 period 个有效值时为 NaN (同 pandas rolling(period).mean())"""
+    matrix = np.asarray(prices, dtype=np.float64)
+    valid = ~np.isnan(matrix)
+    sums = np.cumsum(np.where(valid, matrix, 0.0), axis=-1)
+    counts = np.cumsum(valid, axis=-1)
+    sums[..., period:] = sums[..., period:] - sums[..., :-period]
+    counts[..., period:] = counts[..., period:] - counts[..., :-period]
+    out = sums / period
+    out[counts < period] = np.nan
+    return out
+
+
+def ma250_actions(close, ma, sell_target, lot_size, initial_capital):
+    """
+    250日线策略的逐日动作 (ACTION_HOLD / BUY / SELL)。
+    一维输入直接走 strategy_engine 内核；矩阵输入按交易日推进、每步对全部标的做向量运算，不逐标的循环。
+    """
+    close = np.asarray(close, dtype=np.float64)
+    ma = np.asarray(ma, dtype=np.float64)
+    if close.ndim == 1:
+        columns, _ = run_ma250_engine(close, ma, sell_target, lot_size, initial_capital)
+        return columns['ma_action']
+
+    codes, days = close.shape
+    actions = np.full((codes, days), ACTION_HOLD, dtype=np.int8)
+    cash = np.full(codes, float(initial_capital))
+    shares = np.zeros(codes, dtype=np.int64)
+    avg_cost = np.zeros(codes)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for day in range(days):
+            price = close[:, day]
+            has_position = shares > 0
+            below = price < ma[:, day]  # NaN 比较结果为 False
+
+            buy_shares = np.zeros(codes, dtype=np.int64)
+            buy = below & ~has_position
+            buy_shares[buy] = (cash[buy] / price[buy] / lot_size).astype(np.int64) * lot_size
+            buy &= buy_shares > 0
+            profit_rate = np.where(has_position & (avg_cost > 0), price / avg_cost - 1, 0.0)
+            sell = has_position & (profit_rate >= sell_target)
+
+            cash[buy] -= buy_shares[buy] * price[buy]
+            shares[buy] = buy_shares[buy]
+            avg_cost[buy] = price[buy]
+            cash[sell] += shares[sell] * price[sell]
+            shares[sell] = 0
+            avg_cost[sell] = 0.0
+
+            actions[buy, day] = ACTION_BUY
+            actions[sell, day] = ACTION_SELL
+    return actions
+
+
+def compact_rows(matrix):
+    """
+    把每行的有效值按原顺序挪到行首，使每个标的只在自己有K线的日期上计算。
+    返回 (压缩后的矩阵, 原列号矩阵, 有效值掩码)，配合 expand_rows 还原到共享日期轴。
+    """
+    missing = np.isnan(matrix)
+    order = np.argsort(missing, axis=1, kind='stable')
+    compacted = np.take_along_axis(matrix, order, axis=1)
+    counts = (~missing).sum(axis=1)
+    present = np.arange(matrix.shape[1]) < counts[:, None]
+    # 行尾空位用最后一个有效值填充，避免指标按缺失值逐行计算；这些位置在 expand_rows 时丢弃
+    last = compacted[np.arange(len(counts)), np.maximum(counts - 1, 0)]
+    compacted = np.where(present, compacted, last[:, None])
+    return compacted, order, present
+
+
+def expand_rows(values, order, present, fill):
+    out = np.full(values.shape, fill, dtype=values.dtype)
+    out[np.nonzero(present)[0], order[present]] = values[present]
+    return out
+
+
+def scan_signals(prices, params):
+    """
+    对一维收盘价或 (标的 × 交易日) 矩阵一次性算出全部历史信号。
+    params 同 monitor.current_strategy_params；返回 {dif, dea, ma250, macd_cross, ma_action}。
+    按日期对齐后某标的缺失的日期 (停牌、上市较晚) 不参与计算，结果与逐标的在自身日期上计算一致，
+    这些日期的指标为 NaN、没有信号。
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    if np.isnan(prices).any():
+        compacted, order, present = compact_rows(np.atleast_2d(prices))
+        scan = _scan(compacted, params)
+        fills = {'macd_cross': 0, 'ma_action': ACTION_HOLD}
+        return {
+            name: expand_rows(values, order, present, fills.get(name, np.nan)).reshape(prices.shape)
+            for name, values in scan.items()
+        }
+    return _scan(prices, params)
+
+
+def _scan(prices, params):
+    dif, dea, _ = macd_batch(prices, params['fast'], params['slow'], params['signal'])
+    ma250 = rolling_mean(prices, params['ma_period'])
+    return {
+        'dif': dif,
+        'dea': dea,
+        'ma250': ma250,
+        'macd_cross': macd_crosses(dif, dea),
+        'ma_action': ma250_actions(prices, ma250, params['sell_target'], params['lot_size'],
+                                   params['initial_capital']),
+    }
+
+
+def signal_masks(scan):
+    return {
+        'gold_cross': scan['macd_cross'] == GOLD_CROSS,
+        'death_cross': scan['macd_cross'] == DEATH_CROSS,
+        'ma_buy': scan['ma_action'] == ACTION_BUY,
+        'ma_sell': scan['ma_action'] == ACTION_SELL,
+    }
+
+
+def recent_signals(scan, codes, dates, lookback):
+    """最近 lookback 个交易日内出现的全部信号，返回按日期排序的 DataFrame[code, date, signal]"""
+    frames = []
+    for name, mask in signal_masks(scan).items():
+        rows, cols = np.nonzero(np.atleast_2d(mask)[:, -lookback:])
+        cols = cols + len(dates) - min(lookback, len(dates))
+        frames.append(pd.DataFrame({
+            'code': np.asarray(codes)[rows],
+            'date': np.asarray(dates)[cols],
+            'signal': SIGNAL_LABELS[name],
+        }))
+    events = pd.concat(frames, ignore_index=True)
+    return events.sort_values(['date', 'code'], kind='stable').reset_index(drop=True)
+
+
+def forward_returns(prices, horizon):
+    """每个交易日之后 horizon 个交易日的收益率，末尾不足 horizon 日时为 NaN"""
+    prices = np.atleast_2d(np.asarray(prices, dtype=np.float64))
+    out = np.full(prices.shape, np.nan)
+    if horizon < prices.shape[1]:
+        out[:, :-horizon] = prices[:, horizon:] / prices[:, :-horizon] - 1
+    return out
+
+
+def signal_statistics(scan, prices, codes, horizon):
+    """逐标的统计各类信号的历史次数及信号后 horizon 日的平均收益 / 胜率"""
+    returns = forward_returns(prices, horizon)
+    stats = pd.DataFrame({'code': list(codes)})
+    for name, mask in signal_masks(scan).items():
+        mask = np.atleast_2d(mask)
+        hits = np.where(mask, returns, np.nan)
+        counted = (mask & ~np.isnan(returns)).sum(axis=1)
+        stats[f'{name}_count'] = mask.sum(axis=1)
+        with np.errstate(invalid='ignore'):
+            stats[f'{name}_avg_return_{horizon}d'] = np.nansum(hits, axis=1) / counted
+            stats[f'{name}_win_rate_{horizon}d'] = (hits > 0).sum(axis=1) / counted
+    return stats
+
+
+# ================= 自选标的批量扫描 =================
+def load_price_matrix(codes):
+    """按日期对齐各标的收盘价，返回 (codes × days 矩阵, 日期)；上市前 / 缺失的日期为 NaN"""
+    series = {}
+    for code in codes:
+        records, _ = load_history(monitor.HISTORY_CACHE_DIR, monitor.to_tencent_symbol(code), "qfq")
+        df = records_to_frame(records) if records is not None and len(records) else monitor.get_tencent_data_with_retry(code)
+        if df is None:
+            print(f"❌ {code} 数据获取失败，跳过")
+            continue
+        series[code] = df.set_index('date')['close']
+    aligned = pd.concat(series, axis=1).sort_index()
+    return aligned.to_numpy().T, aligned.index, list(aligned.columns)
+
+
+if __name__ == "__main__":
+    watchlist = monitor.load_watchlist(monitor.ETF_WATCHLIST or monitor.ETF_CODE)
+    # 矩阵扫描使用同一组参数，取自选列表第一项 (未单独配置时即全局配置)
+    params = watchlist[0]
+    matrix, dates, codes = load_price_matrix([entry['code'] for entry in watchlist])
+    print(f"扫描 {len(codes)} 个标的 × {len(dates)} 个交易日")
+
+    scan = scan_signals(matrix, params)
+    events = recent_signals(scan, codes, dates.strftime('%Y-%m-%d'), SIGNAL_LOOKBACK_DAYS)
+    print(f"\n最近 {SIGNAL_LOOKBACK_DAYS} 个交易日的信号 ({len(events)} 条):")
+    print(events.to_string(index=False) if len(events) else "无")
+
+    stats = signal_statistics(scan, matrix, codes, SIGNAL_FORWARD_DAYS)
+    print(f"\n历史信号统计 (信号后 {SIGNAL_FORWARD_DAYS} 日):")
+    print(stats.to_string(index=False))
+    if SIGNAL_STATS_OUTPUT:
+        stats.to_csv(SIGNAL_STATS_OUTPUT, index=False)
+        print(f"统计结果已保存: {SIGNAL_STATS_OUTPUT}")
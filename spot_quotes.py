@@ -0,0 +1,94 @@
+import threading
+import time
+
+import pandas as pd
+
+from akshare_replay import ak
+from env_config import get_env_int
+
+SPOT_QUOTE_TTL = get_env_int("SPOT_QUOTE_TTL", 30)
+
+_lock = threading.Lock()
+_snapshot = {'index': {}, 'fetched_at': None, 'error': None}
+
+
+def to_exchange_symbol(code):
+    """510880 -> sh510880, 159915 -> sz159915；已带交易所前缀的代码原样返回 (小写)"""
+    normalized = str(code).strip().lower()
+    if normalized.startswith(("sh", "sz")):
+        return normalized
+    return f"sh{normalized}" if normalized.startswith(("5", "6", "9")) else f"sz{normalized}"
+
+
+def _optional_number(value):
+    return float(value) if pd.notna(value) else None
+
+
+def build_quote_index(df_spot):
+    """把 ETF 行情快照整理成 {交易所代码: 行情} 的哈希索引，代码列只归一化一次"""
+    symbols = [to_exchange_symbol(code) for code in df_spot['代码'].astype(str).tolist()]
+    prices = pd.to_numeric(df_spot['最新价'], errors='coerce').tolist()
+    names = df_spot['名称'].tolist() if '名称' in df_spot.columns else [None] * len(symbols)
+    if '成交量' in df_spot.columns:
+        volumes = pd.to_numeric(df_spot['成交量'], errors='coerce').tolist()
+    else:
+        volumes = [None] * len(symbols)
+
+    index = {}
+    for symbol, name, price, volume in zip(symbols, names, prices, volumes):
+        index[symbol] = {
+            'symbol': symbol,
+            'name': name,
+            'price': _optional_number(price),
+            'volume': _optional_number(volume),
+        }
+    return index
+
+
+# 实时快照数据源，按顺序回退：新浪 ETF 分类行情 -> 东方财富 ETF 行情
+SPOT_SOURCES = (
+    ('新浪', lambda: ak.fund_etf_category_sina(symbol="ETF基金")),
+    ('东方财富', lambda: ak.fund_etf_spot_em()),
+)
+
+
+def get_quote_index(max_age=None):
+    """
+    返回当前行情索引，超过 TTL 才重新拉取快照 (多线程共享同一份)。
+    拉取失败同样缓存 TTL 时长，避免并发标的反复请求已经失败的接口。
+    """
+    max_age = SPOT_QUOTE_TTL if max_age is None else max_age
+    with _lock:
+        fetched_at = _snapshot['fetched_at']
+        if fetched_at is None or time.monotonic() - fetched_at > max_age:
+            _snapshot['index'] = {}
+            _snapshot['error'] = None
+            errors = []
+            for name, loader in SPOT_SOURCES:
+                try:
+                    _snapshot['index'] = build_quote_index(loader())
+                    print(f"📈 {name}实时行情快照: {len(_snapshot['index'])} 只 ETF")
+                    break
+                except Exception as e:
+                    errors.append(f"{name}: {e}")
+            else:
+                _snapshot['error'] = "; ".join(errors)
+            _snapshot['fetched_at'] = time.monotonic()
+        if _snapshot['error'] is not None:
+            raise RuntimeError(f"实时行情获取失败: {_snapshot['error']}")
+        return _snapshot['index']
+
+
+def get_quote(code, max_age=None):
+    """O(1) 查询单个代码的实时行情，快照中不存在时返回 None"""
+    return get_quote_index(max_age).get(to_exchange_symbol(code))
+
+
+def get_price(code, max_age=None):
+    quote = get_quote(code, max_age)
+    return quote['price'] if quote is not None else None
+
+
+def invalidate():
+    with _lock:
+        _snapshot['fetched_at'] = None
@@ -0,0 +1,33 @@
+import time
+
+import pandas as pd
+
+import monitor
+from synthetic_data import SEED, synthetic_history
+
+
+ROWS = 3000
+
+
+print(f"1. 生成合成行情: {ROWS} 根K线 (seed={SEED})")
+df = synthetic_history(ROWS, SEED)
+
+print("2. 运行参考实现 (iterrows)...")
+t0 = time.perf_counter()
+expected = monitor.calculate_ma250_strategy_reference(df)
+t_reference = time.perf_counter() - t0
+
+print("3. 运行数组内核实现...")
+monitor.calculate_ma250_strategy(df.head(10))  # 预热 (numba 编译)
+t0 = time.perf_counter()
+actual = monitor.calculate_ma250_strategy(df)
+t_engine = time.perf_counter() - t0
+
+# 不一致时直接抛出 AssertionError，脚本以非零状态退出 (CI 中的回归测试见 tests/test_strategy_engine.py)
+pd.testing.assert_frame_equal(actual, expected)
+print("✅ 两种实现输出完全一致")
+
+trades = int((expected['ma_action'] != "hold").sum())
+print(f"\n4. 成交次数: {trades}")
+print(f"参考实现耗时: {t_reference * 1000:.1f} ms")
+print(f"内核实现耗时: {t_engine * 1000:.1f} ms (加速 {t_reference / max(t_engine, 1e-9):.1f}x)")
@@ -0,0 +1,239 @@
+import numpy as np
+import os
+
+# ================= 动作编码 =================
+ACTION_HOLD = 0
+ACTION_BUY = 1
+ACTION_SELL = 2
+ACTION_NAMES = np.array(["hold", "buy", "sell"], dtype=object)
+
+# 输出列顺序与参考实现 (monitor.calculate_ma250_strategy_reference) 保持一致
+BOOL_COLUMNS = (
+    'below_ma250', 'buy_condition', 'sell_condition', 'has_position_before', 'has_position',
+)
+INT_COLUMNS = ('trade_shares', 'shares')
+FLOAT_COLUMNS = (
+    'avg_cost_before', 'profit_rate_before', 'target_sell_price_before', 'trade_value',
+    'realized_profit', 'cash', 'avg_cost', 'current_profit_rate', 'current_target_sell_price',
+    'portfolio_value',
+)
+OUTPUT_COLUMNS = (
+    'ma_action', 'below_ma250', 'buy_condition', 'sell_condition', 'has_position_before',
+    'avg_cost_before', 'profit_rate_before', 'target_sell_price_before', 'trade_shares',
+    'trade_value', 'realized_profit', 'cash', 'shares', 'avg_cost', 'has_position',
+    'current_profit_rate', 'current_target_sell_price', 'portfolio_value',
+)
+
+
+def _ma250_kernel(close, ma, sell_target, lot_size, cash, shares, avg_cost,
+                  action, below, buy_flag, sell_flag, has_pos_before,
+                  avg_cost_before_out, profit_before_out, target_before_out,
+                  trade_shares_out, trade_value_out, realized_out,
+                  cash_out, shares_out, avg_cost_out, has_pos_out,
+                  profit_out, target_out, portfolio_out):
+    """250日线状态机内核：逐根推进模拟账户，结果写入预分配数组"""
+    for i in range(len(close)):
+        price = close[i]
+        ma_value = ma[i]
+
+        has_position_before = shares > 0
+        avg_cost_before = avg_cost if has_position_before else 0.0
+        below_ma250 = (ma_value == ma_value) and price < ma_value
+        profit_rate_before = (price / avg_cost_before - 1) if has_position_before and avg_cost_before > 0 else 0.0
+        target_sell_price_before = avg_cost_before * (1 + sell_target) if has_position_before else 0.0
+
+        buy_condition = below_ma250 and not has_position_before
+        sell_condition = has_position_before and profit_rate_before >= sell_target
+
+        act = ACTION_HOLD
+        trade_shares = 0
+        trade_value = 0.0
+        realized_profit = 0.0
+
+        if buy_condition:
+            buy_shares = int(cash / price / lot_size) * lot_size
+            if buy_shares > 0:
+                trade_shares = buy_shares
+                trade_value = buy_shares * price
+                cash -= trade_value
+                shares = buy_shares
+                avg_cost = price
+                act = ACTION_BUY
+            else:
+                buy_condition = False
+        elif sell_condition:
+            trade_shares = shares
+            trade_value = shares * price
+            realized_profit = (price - avg_cost_before) * shares
+            cash += trade_value
+            shares = 0
+            avg_cost = 0.0
+            act = ACTION_SELL
+
+        has_position = shares > 0
+        current_avg_cost = avg_cost if has_position else 0.0
+
+        action[i] = act
+        below[i] = below_ma250
+        buy_flag[i] = buy_condition
+        sell_flag[i] = sell_condition
+        has_pos_before[i] = has_position_before
+        avg_cost_before_out[i] = avg_cost_before
+        profit_before_out[i] = profit_rate_before
+        target_before_out[i] = target_sell_price_before
+        trade_shares_out[i] = trade_shares
+        trade_value_out[i] = trade_value
+        realized_out[i] = realized_profit
+        cash_out[i] = cash
+        shares_out[i] = shares
+        avg_cost_out[i] = current_avg_cost
+        has_pos_out[i] = has_position
+        profit_out[i] = (price / current_avg_cost - 1) if has_position and current_avg_cost > 0 else 0.0
+        target_out[i] = current_avg_cost * (1 + sell_target) if has_position else 0.0
+        portfolio_out[i] = cash + shares * price
+
+    return cash, shares, avg_cost
+
+
+_jit_kernel = None
+
+
+def _get_kernel():
+    """优先使用 numba 编译内核 (STRATEGY_JIT=0 可关闭)"""
+    global _jit_kernel
+    if _jit_kernel is None:
+        if os.environ.get("STRATEGY_JIT", "1") == "0":
+            return None
+        try:
+            # numba 为可选依赖且导入较慢，只在第一次运行内核时导入
+            from numba import njit
+        except ImportError:  # 未安装时退回纯 Python 内核
+            _jit_kernel = False
+        else:
+            _jit_kernel = njit(cache=True)(_ma250_kernel)
+    return _jit_kernel or None
+
+
+def run_ma250_engine(close, ma, sell_target, lot_size, cash, shares=0, avg_cost=0.0):
+    """
+    在收盘价/均线数组上运行250日线策略。
+    返回 (列名 -> 数组 的字典, (cash, shares, avg_cost) 期末账户状态)。
+    """
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    ma = np.ascontiguousarray(ma, dtype=np.float64)
+    n = len(close)
+
+    columns = {'ma_action': np.empty(n, dtype=np.int8)}
+    for name in BOOL_COLUMNS:
+        columns[name] = np.empty(n, dtype=np.bool_)
+    for name in INT_COLUMNS:
+        columns[name] = np.empty(n, dtype=np.int64)
+    for name in FLOAT_COLUMNS:
+        columns[name] = np.empty(n, dtype=np.float64)
+
+    outputs = [columns[name] for name in OUTPUT_COLUMNS]
+    kernel = _get_kernel()
+    if kernel is not None:
+        state = kernel(close, ma, float(sell_target), int(lot_size),
+                       float(cash), int(shares), float(avg_cost), *outputs)
+    else:
+        # 纯 Python 路径下按列表读取，避免逐元素构造 NumPy 标量
+        state = _ma250_kernel(close.tolist(), ma.tolist(), float(sell_target), int(lot_size),
+                              float(cash), int(shares), float(avg_cost), *outputs)
+    return columns, (float(state[0]), int(state[1]), float(state[2]))
+
+
+# ================= 紧凑 / 流式输出 =================
+FLAG_BELOW_MA250 = 1
+FLAG_BUY_CONDITION = 2
+FLAG_SELL_CONDITION = 4
+FLAG_HAS_POSITION = 8
+FLAG_COLUMNS = (
+    ('below_ma250', FLAG_BELOW_MA250),
+    ('buy_condition', FLAG_BUY_CONDITION),
+    ('sell_condition', FLAG_SELL_CONDITION),
+    ('has_position', FLAG_HAS_POSITION),
+)
+STREAM_CHUNK_ROWS = 65536
+
+
+def iter_ma250_chunks(close, ma, sell_target, lot_size, cash, shares=0, avg_cost=0.0,
+                      chunk_rows=STREAM_CHUNK_ROWS):
+    """分块运行内核并在块间传递账户状态，峰值内存只与块大小有关；逐块产出 (起始行, 列字典, 块末状态)"""
+    state = (cash, shares, avg_cost)
+    for start in range(0, len(close), chunk_rows):
+        stop = start + chunk_rows
+        columns, state = run_ma250_engine(close[start:stop], ma[start:stop], sell_target, lot_size, *state)
+        yield start, columns, state
+
+
+def pack_flags(columns):
+    flags = np.zeros(len(columns['ma_action']), dtype=np.uint8)
+    for name, bit in FLAG_COLUMNS:
+        flags |= columns[name].astype(np.uint8) * np.uint8(bit)
+    return flags
+
+
+def unpack_flags(flags):
+    """把位压缩的标志列还原为 {列名: bool 数组}"""
+    flags = np.asarray(flags, dtype=np.uint8)
+    return {name: (flags & bit) != 0 for name, bit in FLAG_COLUMNS}
+
+
+def run_ma250_compact(close, ma, sell_target, lot_size, cash, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    紧凑账本：动作为 int8 编码，四个布尔标志压进一个 uint8，价格类列用 float32，
+    资金类列保留 float64。可由其他列推出的 *_before / 收益率 / 目标价列不再存储。
+    """
+    n = len(close)
+    ledger = {
+        'ma_action': np.empty(n, dtype=np.int8),
+        'flags': np.empty(n, dtype=np.uint8),
+        'trade_shares': np.empty(n, dtype=np.int64),
+        'trade_value': np.empty(n, dtype=np.float64),
+        'realized_profit': np.empty(n, dtype=np.float64),
+        'cash': np.empty(n, dtype=np.float64),
+        'shares': np.empty(n, dtype=np.int64),
+        'avg_cost': np.empty(n, dtype=np.float32),
+        'portfolio_value': np.empty(n, dtype=np.float64),
+    }
+    for start, columns, _ in iter_ma250_chunks(close, ma, sell_target, lot_size, cash, chunk_rows=chunk_rows):
+        stop = start + len(columns['ma_action'])
+        ledger['flags'][start:stop] = pack_flags(columns)
+        for name in ledger:
+            if name != 'flags':
+                ledger[name][start:stop] = columns[name]
+    return ledger
+
+
+def run_ma250_events(close, ma, sell_target, lot_size, cash, chunk_rows=STREAM_CHUNK_ROWS):
+    """只保留成交事件和期末账户状态，不生成逐日账本"""
+    event_dtypes = {
+        'index': np.intp,
+        'ma_action': np.int8,
+        'trade_shares': np.int64,
+        'trade_value': np.float64,
+        'realized_profit': np.float64,
+        'cash': np.float64,
+        'shares': np.int64,
+    }
+    event_columns = tuple(event_dtypes)[1:]
+    events = {name: [] for name in event_dtypes}
+    state = (cash, 0, 0.0)
+    for start, columns, state in iter_ma250_chunks(close, ma, sell_target, lot_size, cash, chunk_rows=chunk_rows):
+        hits = np.flatnonzero(columns['ma_action'] != ACTION_HOLD)
+        events['index'].append(hits + start)
+        for name in event_columns:
+            events[name].append(columns[name][hits])
+
+    # 空输入时没有任何块，按列的类型返回空数组 (索引列必须是整数才能用于取行)
+    merged = {name: np.concatenate(parts) if parts else np.empty(0, dtype=event_dtypes[name])
+              for name, parts in events.items()}
+    final_close = float(close[-1]) if len(close) else 0.0
+    final_state = {
+        'cash': state[0],
+        'shares': state[1],
+        'avg_cost': state[2],
+        'portfolio_value': state[0] + state[1] * final_close,
+    }
+    return merged, final_state
@@ -0,0 +1,155 @@
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+import monitor
+from env_config import get_env_int, get_env_str
+from history_cache import load_history
+from indicators import macd_batch
+from signals import DEATH_CROSS, GOLD_CROSS, macd_crosses
+
+# ================= 配置区域 =================
+SWEEP_CODE = get_env_str("SWEEP_CODE", monitor.ETF_CODE)
+SWEEP_FAST = get_env_str("SWEEP_FAST", "12,20,26")
+SWEEP_SLOW = get_env_str("SWEEP_SLOW", "26,40,60")
+SWEEP_SIGNAL = get_env_str("SWEEP_SIGNAL", "9,15")
+SWEEP_MA = get_env_str("SWEEP_MA", "120,200,250")
+SWEEP_SELL_TARGET = get_env_str("SWEEP_SELL_TARGET", "0.05,0.075,0.1")
+SWEEP_LOT_SIZE = get_env_str("SWEEP_LOT_SIZE", str(monitor.LOT_SIZE))
+SWEEP_WORKERS = get_env_int("SWEEP_WORKERS", os.cpu_count() or 1)
+SWEEP_TOP_N = get_env_int("SWEEP_TOP_N", 20)
+SWEEP_OUTPUT = get_env_str("SWEEP_OUTPUT", "sweep_results.csv")
+SWEEP_MACD_OUTPUT = get_env_str("SWEEP_MACD_OUTPUT", "sweep_macd_crosses.csv")
+
+# 工作进程内通过共享内存访问收盘价，不再为每个任务序列化 DataFrame
+_worker = {}
+
+
+def parse_grid(value, cast):
+    return [cast(item.strip()) for item in str(value).split(",") if item.strip()]
+
+
+def build_grid():
+    """
+    策略参数网格 (ma_period, sell_target, lot_size)。MACD 参数不参与均线策略的交易，
+    不放进这张网格，否则同一策略结果会被重复计算 fast × slow × signal 次。
+    """
+    return [
+        {'ma_period': ma_period, 'sell_target': sell_target, 'lot_size': lot_size}
+        for ma_period, sell_target, lot_size in itertools.product(
+            parse_grid(SWEEP_MA, int),
+            parse_grid(SWEEP_SELL_TARGET, float),
+            parse_grid(SWEEP_LOT_SIZE, int),
+        )
+    ]
+
+
+def build_macd_grid():
+    return [
+        {'fast': fast, 'slow': slow, 'signal': signal}
+        for fast, slow, signal in itertools.product(
+            parse_grid(SWEEP_FAST, int),
+            parse_grid(SWEEP_SLOW, int),
+            parse_grid(SWEEP_SIGNAL, int),
+        )
+        if fast < slow
+    ]
+
+
+def load_closes(code):
+    """优先读取本地历史缓存，缓存缺失时走一次正常的腾讯财经获取 (会顺带写入缓存)"""
+    records, _ = load_history(monitor.HISTORY_CACHE_DIR, monitor.to_tencent_symbol(code), "qfq")
+    if records is not None and len(records):
+        return np.asarray(records['close'], dtype=float)
+    df = monitor.get_tencent_data_with_retry(code)
+    if df is None:
+        return None
+    return pd.to_numeric(df['close'], errors='coerce').dropna().to_numpy(dtype=float)
+
+
+def _attach(shm_name, length):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker['shm'] = shm
+    _worker['close'] = np.ndarray((length,), dtype=np.float64, buffer=shm.buf)
+
+
+def max_drawdown(values):
+    peaks = np.maximum.accumulate(values)
+    return float(np.max(1.0 - values / peaks)) if len(values) else 0.0
+
+
+def evaluate_combo(combo):
+    df = monitor.calculate_ma250_strategy(
+        pd.DataFrame({'close': _worker['close']}),
+        ma_period=combo['ma_period'],
+        sell_target=combo['sell_target'],
+        lot_size=combo['lot_size'],
+        initial_capital=monitor.INITIAL_CAPITAL,
+    )
+
+    portfolio = df['portfolio_value'].to_numpy()
+    result = dict(combo)
+    result['total_return'] = float(portfolio[-1] / monitor.INITIAL_CAPITAL - 1)
+    result['max_drawdown'] = max_drawdown(portfolio)
+    result['trades'] = int((df['ma_action'] != "hold").sum())
+    return result
+
+
+def count_macd_crosses(closes, macd_combos):
+    """
+    MACD 参数只影响交叉信号的次数，单独扫一遍：计算量远小于策略回测，在主进程内完成，
+    相同 span 的 EMA 通过缓存只计算一次。
+    """
+    cache = {}
+    rows = []
+    for combo in macd_combos:
+        dif, dea, _ = macd_batch(closes, combo['fast'], combo['slow'], combo['signal'],
+                                 series_ids=[SWEEP_CODE], cache=cache)
+        crosses = macd_crosses(dif, dea)
+        rows.append(dict(combo,
+                         gold_crosses=int(np.count_nonzero(crosses == GOLD_CROSS)),
+                         death_crosses=int(np.count_nonzero(crosses == DEATH_CROSS))))
+    return pd.DataFrame(rows, columns=['fast', 'slow', 'signal', 'gold_crosses', 'death_crosses'])
+
+
+def run_sweep(closes, combos, workers):
+    shm = shared_memory.SharedMemory(create=True, size=closes.nbytes)
+    try:
+        np.ndarray(closes.shape, dtype=np.float64, buffer=shm.buf)[:] = closes
+        chunksize = max(1, len(combos) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(shm.name, len(closes))) as executor:
+            results = list(executor.map(evaluate_combo, combos, chunksize=chunksize))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    table = pd.DataFrame(results)
+    return table.sort_values(['total_return', 'max_drawdown'], ascending=[False, True]).reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    combos = build_grid()
+    macd_combos = build_macd_grid()
+    print(f"开始参数扫描: {SWEEP_CODE}, {len(combos)} 组策略参数 + {len(macd_combos)} 组 MACD 参数, "
+          f"{SWEEP_WORKERS} 个进程")
+
+    closes = load_closes(SWEEP_CODE)
+    if closes is None or len(closes) == 0:
+        print("❌ 历史数据获取失败")
+    else:
+        closes = np.ascontiguousarray(closes, dtype=np.float64)
+        t0 = time.perf_counter()
+        table = run_sweep(closes, combos, SWEEP_WORKERS)
+        macd_table = count_macd_crosses(closes, macd_combos)
+        print(f"✅ 扫描完成: {len(closes)} 根K线, 耗时 {time.perf_counter() - t0:.2f} s")
+        print(table.head(SWEEP_TOP_N).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+        print(macd_table.to_string(index=False))
+        table.to_csv(SWEEP_OUTPUT, index=False)
+        macd_table.to_csv(SWEEP_MACD_OUTPUT, index=False)
+        print(f"完整结果已写入 {SWEEP_OUTPUT} (策略) 与 {SWEEP_MACD_OUTPUT} (MACD 交叉)")
@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+
+# 合成行情：几何随机游走收盘价，供 strategy_diagnostic、tests 与 benchmarks 共用，不访问网络
+SEED = 20240101
+
+
+def random_walk_closes(size, seed=SEED, drift=0.0002, volatility=0.012, start=3.0):
+    """几何随机游走收盘价 (保留三位小数)；size 为K线数，或 (标的数, K线数) 按行各自游走"""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(drift, volatility, size=size)
+    return np.round(start * np.exp(np.cumsum(returns, axis=-1)), 3)
+
+
+def synthetic_history(rows=3000, seed=SEED, start="2014-01-01", end=None, drift=0.0002, volatility=0.012,
+                      date_format="%Y-%m-%d"):
+    """
+    单个标的的日线 DataFrame (date, close)，日期为工作日：给定 end 时以 end 为最后一天，否则从 start 开始。
+    date_format 为 None 时 date 列保留 Timestamp。
+    """
+    dates = pd.bdate_range(end=end, periods=rows) if end is not None else pd.bdate_range(start=start, periods=rows)
+    if date_format is not None:
+        dates = dates.strftime(date_format)
+    return pd.DataFrame({'date': dates, 'close': random_walk_closes(rows, seed, drift, volatility)})
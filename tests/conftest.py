@@ -0,0 +1,51 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import http_client
+from akshare_replay import ak, save_fixture
+from fake_notify_server import start_fake_server
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "akshare")
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    """
+    启动本地假推送服务并返回启动函数：fake_server(fail_first=0, delay=0.0) -> (base_url, received)。
+    重试不等待退避，测试结束时关闭服务。
+    """
+    servers = []
+    monkeypatch.setattr(http_client, "backoff_delay", lambda attempt, base=None, cap=None: 0.0)
+
+    def start(fail_first=0, delay=0.0):
+        server, base_url, received = start_fake_server(0, fail_first, delay)
+        servers.append(server)
+        return base_url, received
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def akshare_replay(tmp_path):
+    """
+    把 tests/fixtures/akshare 下的 CSV (manifest.json 记录对应的 akshare 调用) 写成回放录制文件，
+    并把 akshare 代理切到 replay 模式：测试期间所有 akshare 调用只读录制数据，不访问网络。
+    录制数据以 CSV 提交，避免 pickle 与 pandas 版本绑定。
+    """
+    fixture_dir = str(tmp_path / "akshare")
+    with open(os.path.join(FIXTURE_DIR, "manifest.json"), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    for entry in manifest:
+        frame = pd.read_csv(os.path.join(FIXTURE_DIR, entry['file']), dtype={'代码': str})
+        save_fixture(fixture_dir, entry['func'], (), entry['kwargs'], frame)
+
+    mode, previous_dir = ak.mode, ak.__dict__['_fixture_dir']
+    ak.configure(mode="replay", fixture_dir=fixture_dir)
+    yield fixture_dir
+    ak.configure(mode=mode, fixture_dir=previous_dir)
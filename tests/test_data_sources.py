@@ -0,0 +1,93 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import clock
+import data_sources
+import monitor
+from data_sources import HistorySource
+from history_cache import frame_to_records, load_history, save_history
+
+
+def history(days=30, end="2025-06-30", scale=1.0):
+    dates = pd.bdate_range(end=end, periods=days)
+    return pd.DataFrame({'date': dates, 'close': np.round(np.linspace(3.0, 3.3, days) * scale, 3)})
+
+
+def source(name, df=None, delay=0.0, network=True):
+    def fetch(symbol, start_date, end_date):
+        time.sleep(delay)
+        if df is None:
+            raise IOError("down")
+        return df
+    return HistorySource(name, fetch, network=network)
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(data_sources, "_stats", {})
+
+
+def test_cache_joins_race_while_network_hangs():
+    start = time.perf_counter()
+    df, name = data_sources.race_sources(
+        "sh510880", "20250101", "20250630", [source('tencent', history(), delay=2.0)],
+        hedge_delay=5.0, fallback=source('cache', history(), network=False), fallback_delay=0.1,
+    )
+    assert name == 'cache' and len(df) == 30
+    assert time.perf_counter() - start < 1.0
+    assert 'cache' not in data_sources.stats_summary()
+
+
+def test_cache_races_immediately_once_network_sources_fail():
+    start = time.perf_counter()
+    _, name = data_sources.race_sources(
+        "sh510880", "20250101", "20250630", [source('tencent'), source('sina')],
+        hedge_delay=5.0, fallback=source('cache', history(), network=False), fallback_delay=30.0,
+    )
+    assert name == 'cache'
+    assert time.perf_counter() - start < 1.0
+
+
+def test_never_succeeded_source_is_not_ranked_last_forever(monkeypatch):
+    monkeypatch.setattr(data_sources, "DATA_SOURCE_ORDER", "tencent,eastmoney,sina")
+    monkeypatch.setattr(data_sources, "SOURCE_PRIOR_LATENCY", 3.0)
+    data_sources.record_result('tencent', 5.0, True)
+    data_sources.record_result('eastmoney', 1.0, False)
+    assert np.isfinite(data_sources.source_score('eastmoney'))
+    # 未请求过的 sina 按先验延迟排在慢的 tencent 之前；失败过一次的 eastmoney 排在后面但仍可恢复
+    assert [s.name for s in data_sources.ordered_sources()] == ['sina', 'tencent', 'eastmoney']
+    for _ in range(3):
+        data_sources.record_result('eastmoney', 1.0, True)
+    assert data_sources.ordered_sources()[0].name == 'eastmoney'
+    assert data_sources.ordered_sources(prefer='tencent')[0].name == 'tencent'
+
+
+def test_delta_from_another_source_triggers_full_refetch(tmp_path, monkeypatch):
+    monkeypatch.setattr(monitor, "HISTORY_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(monitor, "STATE_DIR", str(tmp_path))
+    start_date = monitor.normalize_yyyymmdd(monitor.HISTORY_START_DATE, monitor.TENCENT_MIN_START_DATE)
+    start_date = max(start_date, monitor.TENCENT_MIN_START_DATE)
+    save_history(str(tmp_path), "sh510880", "qfq", frame_to_records(history(end="2025-06-27")), start_date, 'tencent')
+
+    calls = []
+
+    def fake_fetch_history(symbol, start, end, cache_dir=None, stats_path=None, prefer=None):
+        calls.append((start, prefer))
+        # 东财的前复权价格与腾讯口径不同
+        return history(days=60, scale=1.01), 'eastmoney'
+
+    monkeypatch.setattr(monitor, "fetch_history", fake_fetch_history)
+    clock.freeze(clock.TZ_CN.localize(pd.Timestamp("2025-07-01 10:00").to_pydatetime()))
+    try:
+        store = monitor.get_history_store("510880")
+    finally:
+        clock.unfreeze()
+
+    assert [prefer for _, prefer in calls] == ['tencent', 'tencent']
+    assert calls[1][0] == start_date
+    np.testing.assert_allclose(store.to_frame()['close'], history(days=60, scale=1.01)['close'])
+    _, meta = load_history(str(tmp_path), "sh510880", "qfq")
+    assert meta['source'] == 'eastmoney'
@@ -0,0 +1,90 @@
+import time
+
+import dispatcher
+import http_client
+import notifier
+
+
+def flush(path, sent, **options):
+    return dispatcher.flush(lambda summary, content: sent.append(summary) or True, path, coalesce_seconds=0,
+                            **options)
+
+
+def test_repeated_content_is_suppressed(tmp_path):
+    path, sent = str(tmp_path / "outbox.sqlite"), []
+    dispatcher.enqueue("监控正常: 510880", "今日无新交易信号", path)
+    flush(path, sent)
+    dispatcher.enqueue("监控正常: 510880", "今日无新交易信号", path)
+    assert flush(path, sent)['duplicate'] == 1
+    assert sent == ["监控正常: 510880"]
+
+
+def test_alarms_are_never_deduplicated(tmp_path):
+    path, sent = str(tmp_path / "outbox.sqlite"), []
+    for _ in range(2):
+        dispatcher.enqueue("报警: 数据获取失败", "接口均无法访问", path)
+        flush(path, sent)
+    assert sent == ["报警: 数据获取失败"] * 2
+
+
+def test_failed_send_stays_pending(tmp_path):
+    path = str(tmp_path / "outbox.sqlite")
+    dispatcher.enqueue("报警: 数据获取失败", "接口均无法访问", path)
+    assert dispatcher.flush(lambda summary, content: False, path)['failed'] == 1
+    assert dispatcher.outbox_status(path) == {'pending': 1}
+    sent = []
+    assert flush(path, sent)['sent'] == 1
+
+
+# ===== 端到端：发件箱 -> notifier -> 本地假推送服务 =====
+def serve(fake_server, monkeypatch, fail_first=0):
+    base_url, received = fake_server(fail_first=fail_first)
+    monkeypatch.setattr(notifier, "WXPUSHER_API_URL", f"{base_url}/api/send/message")
+    monkeypatch.setattr(http_client, "HTTP_MAX_RETRIES", 3)
+    return received
+
+
+def push(summary, content):
+    return notifier.send_wxpusher_message("token", "uid", summary, content)
+
+
+def test_end_to_end_dedup_and_coalesce(tmp_path, fake_server, monkeypatch):
+    received = serve(fake_server, monkeypatch)
+    path = str(tmp_path / "outbox.sqlite")
+    window_start = (time.time() // 300) * 300
+    dispatcher.enqueue("监控正常: 510880", "今日无新交易信号", path, now=window_start + 1)
+    dispatcher.enqueue("【盘中预警】MACD买入", "MACD发生死叉。", path, now=window_start + 2)
+    dispatcher.enqueue("监控正常: 510880", "今日无新交易信号", path, now=window_start + 3)
+    stats = dispatcher.flush(push, path, coalesce_seconds=300)
+    assert stats == {'sent': 2, 'failed': 0, 'duplicate': 1, 'deferred': 0}
+    assert len(received) == 1
+    assert received[0]['json']['summary'] == "监控正常: 510880 等 2 条消息"
+    assert "MACD发生死叉。" in received[0]['json']['content']
+
+    dispatcher.enqueue("监控正常: 510880", "今日无新交易信号", path)
+    assert dispatcher.flush(push, path, coalesce_seconds=300)['duplicate'] == 1
+    assert len(received) == 1
+
+
+def test_end_to_end_rate_limit(tmp_path, fake_server, monkeypatch):
+    received = serve(fake_server, monkeypatch)
+    path = str(tmp_path / "outbox.sqlite")
+    for i in range(4):
+        dispatcher.enqueue(f"【盘中预警】{i}", f"消息 {i}", path)
+    stats = dispatcher.flush(push, path, coalesce_seconds=0, rate_per_minute=600, burst=1, concurrency=4)
+    assert stats['sent'] == 4
+    times = sorted(record['time'] for record in received)
+    assert len(times) == 4
+    # 每秒 10 个令牌、容量 1：并发 4 个发送仍按约 0.1s 的间隔到达
+    assert min(b - a for a, b in zip(times, times[1:])) > 0.05
+
+
+def test_end_to_end_outage_is_retried_on_next_flush(tmp_path, fake_server, monkeypatch):
+    received = serve(fake_server, monkeypatch, fail_first=3)
+    path = str(tmp_path / "outbox.sqlite")
+    dispatcher.enqueue("报警: 数据获取失败", "接口均无法访问", path)
+    assert dispatcher.flush(push, path, coalesce_seconds=0)['failed'] == 1
+    assert received == []
+    assert dispatcher.flush(push, path, coalesce_seconds=0)['sent'] == 1
+    assert len(received) == 1
+    assert dispatcher.outbox_status(path) == {'sent': 1}
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import ema_batch, macd_batch
+
+
+def pandas_ema(matrix, span):
+    return pd.DataFrame(matrix.T).ewm(span=span, adjust=False).mean().to_numpy().T
+
+
+def random_matrix(codes=4, days=400, seed=0):
+    rng = np.random.default_rng(seed)
+    return 50 + rng.normal(size=(codes, days)).cumsum(axis=1)
+
+
+def test_ema_matches_pandas_without_gaps():
+    matrix = random_matrix()
+    np.testing.assert_allclose(ema_batch(matrix, [12])[12], pandas_ema(matrix, 12), rtol=1e-12)
+
+
+def test_interior_nan_does_not_poison_rest_of_row():
+    matrix = random_matrix()
+    matrix[0, 100] = np.nan          # 单日缺失
+    matrix[1, :30] = np.nan          # 上市较晚
+    matrix[1, 200:205] = np.nan      # 连续停牌
+    matrix[2, -3:] = np.nan          # 尾部缺失
+    actual = ema_batch(matrix, [12])[12]
+    expected = pandas_ema(matrix, 12)
+    assert not np.isnan(actual[0, 101:]).any()
+    np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+    np.testing.assert_allclose(actual, expected, rtol=1e-12)
+
+
+def test_macd_with_gap_matches_pandas():
+    matrix = random_matrix(codes=1, days=300)[0]
+    matrix[150] = np.nan
+    dif, dea, _ = macd_batch(matrix, 12, 26, 9)
+    series = pd.Series(matrix)
+    expected_dif = series.ewm(span=12, adjust=False).mean() - series.ewm(span=26, adjust=False).mean()
+    np.testing.assert_allclose(dif, expected_dif.to_numpy(), rtol=1e-12)
+    np.testing.assert_allclose(dea, expected_dif.ewm(span=9, adjust=False).mean().to_numpy(), rtol=1e-12)
+
+
+def test_cache_requires_series_ids():
+    with pytest.raises(ValueError):
+        ema_batch(random_matrix(), [12], cache={})
+
+
+def test_cache_is_keyed_by_series_id():
+    cache = {}
+    first, second = random_matrix(codes=1, seed=1), random_matrix(codes=1, seed=2)
+    ema_batch(first, [12], series_ids=["a"], cache=cache)
+    np.testing.assert_allclose(ema_batch(second, [12], series_ids=["b"], cache=cache)[12], pandas_ema(second, 12))
@@ -0,0 +1,48 @@
+import csv
+
+import pytest
+
+import intraday_monitor
+import monitor
+from synthetic_data import synthetic_history
+
+CODE = "510880"
+
+
+def uptrend_history(last_date, rows=300):
+    return synthetic_history(rows, seed=8, end=last_date, drift=0.001, volatility=0.004, date_format=None)
+
+
+def write_ticks(path, ticks):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'price'])
+        writer.writerows(ticks)
+
+
+def test_replayed_ticks_alert_once_per_day_and_signal(tmp_path, monkeypatch):
+    history = uptrend_history("2024-03-01")
+    last_close = float(history['close'].iloc[-1])
+    # 3/4 盘中跌破250日线 (买入 + 死叉)，3/5 大幅反弹 (止盈 + 金叉)；每天的信号会被后续 tick 重复触发
+    ticks = [(f"2024-03-04T{hour}:00", round(last_close * 0.7, 3)) for hour in ("09:31", "10", "11", "14")]
+    ticks += [(f"2024-03-05T{hour}:00", round(last_close * 1.1, 3)) for hour in ("09:31", "10", "11", "14")]
+    replay_path = tmp_path / "ticks.csv"
+    write_ticks(replay_path, ticks)
+
+    monkeypatch.setattr(monitor, "STATE_DIR", str(tmp_path))
+    monkeypatch.setattr(monitor, "get_tencent_data_with_retry", lambda code: pytest.fail("不应访问历史接口"))
+    monkeypatch.setattr(monitor, "flush_notifications", lambda **kwargs: pytest.fail("不应发送全局发件箱"))
+    alerts = []
+    sent = intraday_monitor.run_intraday(
+        CODE, intraday_monitor.replay_ticks(str(replay_path)),
+        notify=lambda title, content: alerts.append(title), today="2024-03-04", history=history,
+    )
+
+    assert sent == alerts
+    assert len(alerts) == 2
+    day_signals = [(date, name)
+                   for date, title in zip(("2024-03-04", "2024-03-05"), alerts)
+                   for name in title.split(f"{CODE} ", 1)[1].split(" / ")]
+    assert len(day_signals) == len(set(day_signals))
+    assert ("2024-03-04", "250日线买入") in day_signals
+    assert any(date == "2024-03-05" and "止盈清仓" in name for date, name in day_signals)
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+import lead_lag
+
+
+def synthetic_pair(days, lag):
+    rng = np.random.default_rng(11)
+    index = pd.date_range("2018-01-01", periods=days, freq="D")
+    ratio = pd.Series(np.exp(rng.normal(0, 0.01, days).cumsum()), index=index)
+    hstech = pd.Series(np.exp(ratio.shift(lag).bfill().to_numpy() + rng.normal(0, 0.002, days).cumsum()), index=index)
+    hstech.iloc[-1] = np.nan
+    return hstech, ratio
+
+
+def test_chunked_scan_matches_single_block(monkeypatch):
+    hstech, ratio = synthetic_pair(1500, 30)
+    monkeypatch.setattr(lead_lag, "LEAD_LAG_CHUNK", 1000)
+    whole = lead_lag.analyze_lead_lag(hstech, ratio, 0, 120, 250)
+    monkeypatch.setattr(lead_lag, "LEAD_LAG_CHUNK", 7)
+    chunked = lead_lag.analyze_lead_lag(hstech, ratio, 0, 120, 250)
+
+    assert whole['best_lag'] == chunked['best_lag'] == 30
+    assert whole['date'] == chunked['date'] == hstech.index[-2]
+    np.testing.assert_allclose(whole['corr_by_lag'], chunked['corr_by_lag'], equal_nan=True)
+    np.testing.assert_array_equal(whole['best_lag_history'], chunked['best_lag_history'])
@@ -0,0 +1,45 @@
+import numpy as np
+
+import ledger
+import monitor
+from synthetic_data import synthetic_history
+
+
+def full_result(code, rows):
+    df = synthetic_history(rows, seed=3, start="2022-01-03", drift=0, volatility=0.01, date_format=None)
+    frame = monitor.calculate_strategy_full(df, monitor.current_strategy_params(code))
+    return {'code': code, 'frame': frame, 'date': frame['date'].iloc[-1].strftime('%Y-%m-%d'),
+            'close': frame['close'].iloc[-1], 'signal_titles': []}
+
+
+def snapshot_count(path):
+    conn = ledger.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_full_recompute_only_writes_new_rows(tmp_path):
+    path = str(tmp_path / "ledger.sqlite")
+    ledger.record_run([full_result("510880", 300)], "收盘确认", path)
+    assert snapshot_count(path) == 300
+    # 下一次全量重算带回整段历史 + 1 根新K线：只写最后已记录日期 (可能被改写) 和新K线
+    ledger.record_run([full_result("510880", 301)], "收盘确认", path)
+    assert snapshot_count(path) == 302
+    curve = ledger.equity_curve("510880", path=path)
+    assert len(curve) == 301
+
+
+def test_rewritten_history_supersedes_old_snapshots(tmp_path):
+    path = str(tmp_path / "ledger.sqlite")
+    ledger.record_run([full_result("510880", 300)], "收盘确认", path)
+    adjusted = full_result("510880", 301)
+    adjusted['frame'] = monitor.calculate_strategy_full(
+        adjusted['frame'][['date', 'close']].assign(close=lambda df: (df['close'] * 0.9).round(3)),
+        monitor.current_strategy_params("510880"),
+    )
+    ledger.record_run([adjusted], "收盘确认", path)
+    assert snapshot_count(path) == 300 + 301
+    curve = ledger.equity_curve("510880", path=path)
+    np.testing.assert_allclose(curve['close'].to_numpy(), adjusted['frame']['close'].to_numpy())
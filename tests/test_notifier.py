@@ -0,0 +1,48 @@
+import time
+
+import http_client
+import notifier
+
+
+def use_server(monkeypatch, base_url, retries=3):
+    monkeypatch.setattr(notifier, "WXPUSHER_API_URL", f"{base_url}/api/send/message")
+    monkeypatch.setattr(notifier, "IMGBB_API_URL", f"{base_url}/1/upload")
+    monkeypatch.setattr(http_client, "HTTP_MAX_RETRIES", retries)
+
+
+def test_message_is_retried_after_server_errors(fake_server, monkeypatch):
+    base_url, received = fake_server(fail_first=2)
+    use_server(monkeypatch, base_url)
+    assert notifier.send_wxpusher_message("token", "uid", "监控正常", "内容")
+    assert len(received) == 1
+    assert received[0]['json']['summary'] == "监控正常"
+
+
+def test_message_fails_after_retries_are_exhausted(fake_server, monkeypatch):
+    base_url, received = fake_server(fail_first=3)
+    use_server(monkeypatch, base_url)
+    assert not notifier.send_wxpusher_message("token", "uid", "监控正常", "内容")
+    assert received == []
+
+
+def test_read_timeout_is_not_retried(fake_server, monkeypatch):
+    # 服务端在超时之后仍会处理请求：重试会让同一条消息送达两次
+    base_url, received = fake_server(delay=0.5)
+    use_server(monkeypatch, base_url)
+    monkeypatch.setattr(http_client, "DEFAULT_TIMEOUT", (1.0, 0.2))
+    start = time.perf_counter()
+    assert not notifier.send_wxpusher_message("token", "uid", "监控正常", "内容")
+    assert time.perf_counter() - start < 0.5
+    time.sleep(0.8)
+    assert len(received) == 1
+
+
+def test_upload_body_is_resent_in_full_on_retry(fake_server, monkeypatch, tmp_path):
+    image = tmp_path / "chart.png"
+    image.write_bytes(b"\x89PNG" + bytes(range(256)) * 1024)
+    base_url, received = fake_server(fail_first=1)
+    use_server(monkeypatch, base_url)
+    url = notifier.upload_to_imgbb("key", str(image))
+    assert url == f"{base_url}/fake/1.png"
+    assert len(received) == 1
+    assert received[0]['bytes'] > image.stat().st_size
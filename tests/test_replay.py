@@ -0,0 +1,83 @@
+import datetime
+import os
+
+import pytest
+
+import chart_monitor
+import clock
+import dispatcher
+import ledger
+import monitor
+import spot_quotes
+
+# 录制数据截至 2025-06-30 (周一)，固定在次日收盘后运行
+RUN_AT = clock.TZ_CN.localize(datetime.datetime(2025, 7, 1, 15, 30))
+
+
+@pytest.fixture
+def offline_run(akshare_replay, tmp_path, monkeypatch):
+    monkeypatch.setattr(monitor, "STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setattr(monitor, "HISTORY_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(chart_monitor, "CHART_CACHE_DIR", str(tmp_path / "cache" / "chart"))
+    monkeypatch.setattr(dispatcher, "OUTBOX_PATH", str(tmp_path / "state" / "outbox.sqlite"))
+    monkeypatch.setattr(ledger, "LEDGER_PATH", str(tmp_path / "state" / "ledger.sqlite"))
+    monkeypatch.chdir(tmp_path)
+    spot_quotes.invalidate()
+    clock.freeze(RUN_AT)
+    yield tmp_path
+    clock.unfreeze()
+    spot_quotes.invalidate()
+
+
+def test_check_strategy_replays_offline(offline_run, monkeypatch):
+    sent = []
+    monkeypatch.setattr(monitor, "send_wxpusher", lambda title, content: sent.append((title, content)))
+    monitor.check_strategy()
+
+    assert len(sent) == 1
+    title, content = sent[0]
+    assert not title.startswith("报警")
+    assert "参考时间: 2025-07-01" in content
+    assert ledger.latest_snapshot(monitor.ETF_CODE)['date'] == "2025-07-01"
+
+
+def test_generate_chart_replays_offline(offline_run):
+    path = chart_monitor.generate_chart()
+    assert path is not None and os.path.getsize(path) > 0
+    assert chart_monitor._last_render.get('lead_lag_summary')
+
+
+def test_chart_timings_exclude_other_jobs(offline_run, capsys):
+    import instrumentation
+
+    instrumentation.record_stage("history_fetch", 9.0)  # run_all 下并发的策略检查
+    instrumentation.record_stage("render", 9.0)  # 同一进程里上一次出图
+    assert chart_monitor.generate_chart() is not None
+    line = next(l for l in capsys.readouterr().out.splitlines() if l.startswith("⏱️ 各阶段耗时"))
+    assert "history_fetch" not in line
+    assert "render 9." not in line and "render " in line
+
+
+def test_chart_push_flags_stale_data(offline_run, monkeypatch):
+    import notifier
+
+    assert chart_monitor.generate_chart() is not None  # 首次运行写入本地行情缓存
+    upstream = chart_monitor.fetch_upstream
+
+    def cad_down(symbol, type):
+        if symbol == "CAD":
+            raise IOError("上游不可用")
+        return upstream(symbol, type)
+
+    monkeypatch.setattr(chart_monitor, "fetch_upstream", cad_down)
+    assert chart_monitor.generate_chart() is not None
+    assert chart_monitor._last_render['stale'] == {"CAD": "2025-06-30"}
+
+    pushed = []
+    monkeypatch.setattr(notifier, "send_wxpusher_message",
+                        lambda token, uid, summary, content: pushed.append((summary, content)) or True)
+    chart_monitor.send_wxpusher_image("https://example.invalid/chart.png", "每日图表: 恒生科技趋势")
+    assert len(pushed) == 1
+    summary, content = pushed[0]
+    assert "部分数据未更新" in summary
+    assert "CAD 截至 2025-06-30" in content
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+import monitor
+from signals import DEATH_CROSS, GOLD_CROSS, scan_signals
+from synthetic_data import random_walk_closes
+
+PARAMS = {
+    'fast': 12, 'slow': 26, 'signal': 9, 'ma_period': 60,
+    'sell_target': 0.05, 'lot_size': 100, 'initial_capital': 100000.0,
+}
+
+
+def per_code_reference(closes):
+    """逐标的在自身日期上用 pandas / 参考实现计算，返回 (交叉, 动作) 两个一维数组"""
+    df = pd.DataFrame({'close': closes})
+    dif = df['close'].ewm(span=PARAMS['fast'], adjust=False).mean() - \
+        df['close'].ewm(span=PARAMS['slow'], adjust=False).mean()
+    dea = dif.ewm(span=PARAMS['signal'], adjust=False).mean()
+    spread = (dif - dea).to_numpy()
+    crosses = np.zeros(len(closes), dtype=np.int8)
+    crosses[1:][(spread[:-1] < 0) & (spread[1:] > 0)] = GOLD_CROSS
+    crosses[1:][(spread[:-1] > 0) & (spread[1:] < 0)] = DEATH_CROSS
+    strategy = monitor.calculate_ma250_strategy(df, ma_period=PARAMS['ma_period'], sell_target=PARAMS['sell_target'],
+                                                lot_size=PARAMS['lot_size'],
+                                                initial_capital=PARAMS['initial_capital'])
+    return crosses, strategy['ma_action'].to_numpy()
+
+
+def test_row_with_gap_matches_per_code_scan():
+    matrix = random_walk_closes((3, 600), seed=7, drift=0, volatility=0.015)
+    matrix[0, 100] = np.nan          # 单日缺失
+    matrix[1, :50] = np.nan          # 上市较晚
+    matrix[2, 300:310] = np.nan      # 连续停牌
+
+    scan = scan_signals(matrix, PARAMS)
+    names = np.array(["hold", "buy", "sell"], dtype=object)
+    for row in range(matrix.shape[0]):
+        present = ~np.isnan(matrix[row])
+        crosses, actions = per_code_reference(matrix[row][present])
+        np.testing.assert_array_equal(scan['macd_cross'][row][present], crosses)
+        np.testing.assert_array_equal(names[scan['ma_action'][row][present]], actions)
+        assert (scan['macd_cross'][row][~present] == 0).all()
+        assert np.isnan(scan['dif'][row][~present]).all()
+    assert np.count_nonzero(scan['macd_cross'][0][101:]) > 0
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import monitor
+import strategy_engine
+from synthetic_data import synthetic_history
+
+
+def run_with_kernel(monkeypatch, df, kernel):
+    monkeypatch.setattr(strategy_engine, "_get_kernel", lambda: kernel)
+    return monitor.calculate_ma250_strategy(df)
+
+
+def test_python_kernel_matches_reference(monkeypatch):
+    df = synthetic_history()
+    expected = monitor.calculate_ma250_strategy_reference(df)
+    pd.testing.assert_frame_equal(run_with_kernel(monkeypatch, df, None), expected)
+
+
+def test_numba_kernel_matches_reference(monkeypatch):
+    numba = pytest.importorskip("numba")
+    df = synthetic_history()
+    expected = monitor.calculate_ma250_strategy_reference(df)
+    kernel = numba.njit(strategy_engine._ma250_kernel)
+    pd.testing.assert_frame_equal(run_with_kernel(monkeypatch, df, kernel), expected)
+
+
+def test_compact_ledger_matches_full_frame():
+    df = synthetic_history()
+    full = monitor.calculate_ma250_strategy(df)
+    compact = monitor.calculate_ma250_strategy(df, compact=True)
+
+    assert (compact['ma_action'].astype(str) == full['ma_action']).all()
+    for name in ('trade_shares', 'shares'):
+        assert compact[name].dtype == np.int64
+        np.testing.assert_array_equal(compact[name], full[name])
+    for name in ('trade_value', 'realized_profit', 'cash', 'portfolio_value'):
+        np.testing.assert_array_equal(compact[name], full[name])
+    np.testing.assert_allclose(compact['avg_cost'], full['avg_cost'], rtol=1e-6)
+    flags = strategy_engine.unpack_flags(compact['flags'])
+    for name, values in flags.items():
+        np.testing.assert_array_equal(values, full[name])
+
+
+def test_events_match_full_frame():
+    df = synthetic_history()
+    full = monitor.calculate_ma250_strategy(df)
+    events, final_state = monitor.calculate_ma250_events(df)
+
+    trades = full[full['ma_action'] != "hold"]
+    assert len(trades) > 0
+    assert events.index.tolist() == trades.index.tolist()
+    assert events['ma_action'].tolist() == trades['ma_action'].tolist()
+    for name in ('date', 'close', 'trade_shares', 'trade_value', 'realized_profit', 'cash', 'shares'):
+        np.testing.assert_array_equal(events[name].to_numpy(), trades[name].to_numpy())
+    last = full.iloc[-1]
+    assert final_state['shares'] == last['shares']
+    assert final_state['cash'] == pytest.approx(last['cash'])
+    assert final_state['portfolio_value'] == pytest.approx(last['portfolio_value'])
+
+
+def test_events_on_empty_input():
+    events, final_state = monitor.calculate_ma250_events(synthetic_history().head(0))
+    assert len(events) == 0
+    assert final_state['shares'] == 0
+    assert final_state['portfolio_value'] == monitor.INITIAL_CAPITAL
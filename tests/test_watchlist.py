@@ -0,0 +1,58 @@
+import json
+
+import pandas as pd
+import pytest
+
+import clock
+import monitor
+from history_cache import HistoryStore, frame_to_records
+from synthetic_data import synthetic_history
+
+
+def test_load_watchlist_reports_every_bad_entry():
+    entries = [
+        "510880",
+        {"code": "159915", "ma_period": 120, "sell_target": 0.05},
+        {"fast": 12},
+        {"code": "512100", "sell_taget": 0.05},
+        {"code": "512880", "fast": 30, "slow": 26},
+        {"code": "588000", "lot_size": "100"},
+    ]
+    with pytest.raises(ValueError) as excinfo:
+        monitor.load_watchlist(json.dumps(entries))
+    message = str(excinfo.value)
+    assert "第 3 项" in message and "缺少 code" in message
+    assert "第 4 项" in message and "sell_taget" in message
+    assert "第 5 项" in message and "第 6 项" in message
+    assert "第 1 项" not in message and "第 2 项" not in message
+
+
+def test_load_watchlist_applies_overrides():
+    watchlist = monitor.load_watchlist('["510880", {"code": "159915", "ma_period": 120, "sell_target": 0.05}]')
+    assert [params['code'] for params in watchlist] == ["510880", "159915"]
+    assert watchlist[1]['ma_period'] == 120 and watchlist[1]['sell_target'] == 0.05
+    assert watchlist[0]['ma_period'] == monitor.MA_PERIOD
+
+
+def test_check_watchlist_takes_one_snapshot(monkeypatch):
+    history = synthetic_history(300, seed=5, start="2023-01-02", drift=0, volatility=0.01, date_format=None)
+    snapshots = []
+
+    def quote_index():
+        snapshots.append(1)
+        return {"sh510880": {'price': 3.5}, "sz159915": {'price': 2.5}}
+
+    monkeypatch.setattr(monitor, "get_quote_index", quote_index)
+    monkeypatch.setattr(monitor, "get_quote", lambda code: pytest.fail("不应按标的单独取行情"))
+    monkeypatch.setattr(monitor, "get_history_store",
+                        lambda code: HistoryStore(frame_to_records(history), validate=False))
+    monkeypatch.setattr(monitor, "save_to_ledger", lambda results, mode_name: None)
+    sent = []
+    monkeypatch.setattr(monitor, "send_wxpusher", lambda title, content: sent.append((title, content)))
+    clock.freeze(clock.TZ_CN.localize(pd.Timestamp("2024-03-04 15:10").to_pydatetime()))
+    try:
+        monitor.check_watchlist(monitor.load_watchlist("510880,159915,512880"))
+    finally:
+        clock.unfreeze()
+    assert len(snapshots) == 1
+    assert len(sent) == 1